@@ -0,0 +1,133 @@
+# ds-rpc-01/app/build_index.py
+"""Offline index builder: ingest the resources folder without the web app and
+write a snapshot that servers open read-only.
+
+Runs the same parsing, chunking and embedding as server startup, reports
+progress and throughput, and writes a versioned snapshot (vectors, chunk
+metadata, lexical index, sections, tables and ingestion manifest) with a
+SHA-256 per file:
+
+    python -m app.build_index --output ./index_snapshot
+    INDEX_SNAPSHOT_PATH=./index_snapshot uvicorn app.main:app
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+logger = logging.getLogger("build_index")
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build a vector index snapshot from the resources folder.")
+    parser.add_argument("--output", required=True, help="snapshot path; a symlink flipped atomically to the new build when it succeeds")
+    parser.add_argument("--resources", help="documents to index (default: RESOURCES_PATH)")
+    parser.add_argument("--workers", type=int, default=0, help="loader processes; 0 picks the default")
+    parser.add_argument("--quantization", choices=["none", "float16", "int8", "pq"],
+                        help="vector storage of the snapshot (default: VECTOR_INDEX_QUANTIZATION)")
+    return parser.parse_args(argv)
+
+
+def progress_reporter(start: float):
+    """Progress callback for ``RagService.on_ingest_progress`` that logs at most every PROGRESS_INTERVAL seconds."""
+    last = {"time": 0.0}
+
+    def report(files_done: int, files_total: int, chunks: int) -> None:
+        now = time.perf_counter()
+        if now - last["time"] < PROGRESS_INTERVAL and files_done < files_total:
+            return
+        last["time"] = now
+        elapsed = now - start
+        logger.info(
+            f"{files_done}/{files_total} files, {chunks} chunks embedded in {elapsed:.1f}s "
+            f"({files_done / elapsed:.1f} files/s, {chunks / elapsed:.1f} chunks/s)"
+        )
+
+    return report
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # Snapshots are NumPy indexes, memory-mapped by the servers; set before the app reads its configuration
+    os.environ["VECTOR_INDEX_BACKEND"] = "numpy"
+    if args.quantization:
+        os.environ["VECTOR_INDEX_QUANTIZATION"] = args.quantization
+
+    from app.config import EMBEDDING_PROVIDER, RESOURCES_PATH, LOADER_MAX_WORKERS, VECTOR_INDEX_QUANTIZATION
+    if EMBEDDING_PROVIDER == "openai" and not os.getenv("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY is required to embed with the OpenAI provider")
+        return 2
+    # The service module builds its chat client at import time; it is never called here
+    os.environ.setdefault("OPENAI_API_KEY", "offline-index-build")
+
+    from app.services.document_loader import DocumentLoader
+    from app.services.index_snapshot import write_snapshot_manifest, publish_snapshot
+    from app.services.rag_service import rag_service
+
+    output = Path(args.output).resolve()
+    staging = output.with_name(output.name + ".partial")
+    shutil.rmtree(staging, ignore_errors=True)
+
+    rag_service.document_loader = DocumentLoader(args.resources or RESOURCES_PATH, max_workers=args.workers or LOADER_MAX_WORKERS)
+    files = rag_service.document_loader.discover_files()
+    if not files:
+        logger.error(f"No documents found in {rag_service.document_loader.resources_path}")
+        return 1
+    logger.info(f"Building index snapshot of {len(files)} files into {output}")
+
+    start = time.perf_counter()
+    rag_service.on_ingest_progress = progress_reporter(start)
+    try:
+        asyncio.run(rag_service.initialize(str(staging), read_only=False))
+        chunks = rag_service.vector_store.document_count()
+        if len(rag_service.manifest.files) != len(files) or rag_service.manifest.chunk_count() != chunks:
+            logger.error(
+                f"Ingestion did not complete ({len(rag_service.manifest.files)} of {len(files)} files, "
+                f"{chunks} of {rag_service.manifest.chunk_count()} chunks); no snapshot written"
+            )
+            shutil.rmtree(staging, ignore_errors=True)
+            return 1
+        build_seconds = time.perf_counter() - start
+        # Leaves the table store a single file, without a write-ahead log next to it
+        rag_service.table_store.close()
+
+        snapshot = write_snapshot_manifest(str(staging), {
+            "embedding_model": rag_service.embeddings.model_name,
+            "index_backend": "numpy",
+            "quantization": VECTOR_INDEX_QUANTIZATION,
+            "source_files": len(files),
+            "chunks": chunks,
+            "sections": len(rag_service.vector_store.sections),
+            "build_seconds": round(build_seconds, 3),
+        })
+        published = publish_snapshot(str(staging), str(output))
+    finally:
+        asyncio.run(rag_service.cleanup())
+
+    total_seconds = time.perf_counter() - start
+    summary = {
+        "snapshot": str(output),
+        "published": published,
+        "files": len(files),
+        "chunks": chunks,
+        "bytes": sum(entry["bytes"] for entry in snapshot["files"].values()),
+        "build_seconds": round(build_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "chunks_per_second": round(chunks / build_seconds, 2),
+    }
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# ds-rpc-01/app/config.py
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ---------------------------
+# Ingestion & Vector Store
+# ---------------------------
+RESOURCES_PATH = os.getenv("RESOURCES_PATH", "./resources/data")
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma")
+INGESTION_MANIFEST_FILE = "ingestion_manifest.json"
+TABLE_STORE_FILE = "tables.sqlite3"
+LEXICAL_INDEX_FILE = "lexical_index.json.gz"
+SECTION_STORE_FILE = "sections.json.gz"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+# CSV files are read CSV_READ_BATCH_ROWS rows at a time and packed into chunks of at
+# most CSV_CHUNK_MAX_ROWS rows / CSV_CHUNK_MAX_TOKENS tokens
+CSV_READ_BATCH_ROWS = int(os.getenv("CSV_READ_BATCH_ROWS", "10000"))
+CSV_CHUNK_MAX_ROWS = int(os.getenv("CSV_CHUNK_MAX_ROWS", "25"))
+CSV_CHUNK_MAX_TOKENS = int(os.getenv("CSV_CHUNK_MAX_TOKENS", "800"))
+# Markdown is split along its headings: sections of up to SECTION_MAX_TOKENS are kept whole
+# in the section store and returned by searches, while the chunks of up to
+# SECTION_CHUNK_MAX_TOKENS inside them are what gets embedded
+SECTION_MAX_TOKENS = int(os.getenv("SECTION_MAX_TOKENS", "600"))
+SECTION_CHUNK_MAX_TOKENS = int(os.getenv("SECTION_CHUNK_MAX_TOKENS", "200"))
+# Return a matched chunk's whole section (deduplicated) instead of the chunk itself
+PARENT_RETRIEVAL_ENABLED = os.getenv("PARENT_RETRIEVAL_ENABLED", "true").lower() == "true"
+# Processes used to parse and split files; 0 picks min(4, CPU count), 1 loads in-process
+LOADER_MAX_WORKERS = int(os.getenv("LOADER_MAX_WORKERS", "0"))
+
+# ---------------------------
+# Multi-Worker Deployment
+# ---------------------------
+# Skip ingestion and only open the index already built in CHROMA_PERSIST_DIR
+INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "false").lower() == "true"
+# Held by the process that ingests, so concurrent workers build the index once
+INGESTION_LOCK_FILE = ".ingestion.lock"
+# SQLite file for rate limits and caches shared by all worker processes; empty keeps them per process
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")
+
+# ---------------------------
+# Index Snapshots
+# ---------------------------
+# Snapshot directory written by `python -m app.build_index`; when set, the server
+# serves it read-only (memory-mapped) instead of ingesting into CHROMA_PERSIST_DIR
+INDEX_SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT_PATH", "")
+# Check every snapshot file against its recorded SHA-256 before serving it
+INDEX_SNAPSHOT_VERIFY = os.getenv("INDEX_SNAPSHOT_VERIFY", "true").lower() == "true"
+SNAPSHOT_MANIFEST_FILE = "snapshot.json"
+# Snapshots and read-only workers serve an index built elsewhere and never ingest
+INDEX_WRITABLE = not (INDEX_READ_ONLY or INDEX_SNAPSHOT_PATH)
+
+# ---------------------------
+# Background Re-ingestion
+# ---------------------------
+# Records which index generation is live; generation N > 0 keeps its files under a ".gN" name
+INDEX_GENERATION_FILE = "index_generation.json"
+# Seconds between checks of the resources folder for changes; 0 disables the watcher
+REINGEST_POLL_SECONDS = float(os.getenv("REINGEST_POLL_SECONDS", "0"))
+# Roles allowed to trigger re-ingestion through the admin API
+ADMIN_ROLES = [role.strip() for role in os.getenv("ADMIN_ROLES", "c-level").split(",") if role.strip()]
+
+# ---------------------------
+# Vector Index
+# ---------------------------
+# "chroma" or "numpy" (in-process float32 matrix with exact cosine search, plus a
+# FAISS HNSW graph for collections of at least VECTOR_INDEX_ANN_THRESHOLD vectors)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "chroma").lower()
+VECTOR_INDEX_ANN_THRESHOLD = int(os.getenv("VECTOR_INDEX_ANN_THRESHOLD", "50000"))
+# NumPy backend storage: "none" (float32), "float16", "int8" (per-dimension scalar
+# quantization, usually the best trade) or "pq" (product quantization). Quantized
+# collections search compact codes in memory and leave the float32 vectors on disk.
+VECTOR_INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "none").lower()
+# Quantized searches re-rank the best k * VECTOR_INDEX_RESCORE_FACTOR candidates with
+# the float32 vectors (pq usually needs 16 or more); 0 returns the quantized ranking as it is
+VECTOR_INDEX_RESCORE_FACTOR = int(os.getenv("VECTOR_INDEX_RESCORE_FACTOR", "4"))
+# Bytes per vector for "pq" (0 = one per 8 dimensions), rounded down to a divisor of the dimension
+VECTOR_INDEX_PQ_SUBVECTORS = int(os.getenv("VECTOR_INDEX_PQ_SUBVECTORS", "0"))
+
+# ---------------------------
+# Retrieval Concurrency
+# ---------------------------
+VECTOR_SEARCH_MAX_WORKERS = int(os.getenv("VECTOR_SEARCH_MAX_WORKERS", "4"))
+MAX_CONCURRENT_RETRIEVALS = int(os.getenv("MAX_CONCURRENT_RETRIEVALS", "32"))
+
+# ---------------------------
+# Hybrid Retrieval
+# ---------------------------
+# Fuse BM25 and vector results; identifier lookups (e.g. FINEMP1000) are answered lexically without embedding
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# ---------------------------
+# Embedding Provider
+# ---------------------------
+# "openai" or "local" (a sentence-transformers model run on the CPU in this process)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "none", "int8" (PyTorch dynamic quantization) or "onnx" (ONNX Runtime; LOCAL_EMBEDDING_ONNX_FILE
+# selects an export inside the model repo, e.g. a pre-quantized onnx/model_qint8_avx2.onnx)
+LOCAL_EMBEDDING_QUANTIZATION = os.getenv("LOCAL_EMBEDDING_QUANTIZATION", "none").lower()
+LOCAL_EMBEDDING_ONNX_FILE = os.getenv("LOCAL_EMBEDDING_ONNX_FILE", "")
+# Intra-op threads for the model; 0 picks min(4, CPU count)
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+# Concurrent query embeddings are encoded together, up to this many per batch; queries
+# arriving while a batch is encoded join the next one, LOCAL_EMBEDDING_BATCH_WAIT_MS adds
+# an extra wait for more before encoding
+LOCAL_EMBEDDING_MAX_BATCH = int(os.getenv("LOCAL_EMBEDDING_MAX_BATCH", "32"))
+LOCAL_EMBEDDING_BATCH_WAIT_MS = float(os.getenv("LOCAL_EMBEDDING_BATCH_WAIT_MS", "0"))
+# Instruction prefixes for models trained with them (e.g. "query: " / "passage: " for E5)
+LOCAL_EMBEDDING_QUERY_PREFIX = os.getenv("LOCAL_EMBEDDING_QUERY_PREFIX", "")
+LOCAL_EMBEDDING_DOCUMENT_PREFIX = os.getenv("LOCAL_EMBEDDING_DOCUMENT_PREFIX", "")
+
+# ---------------------------
+# Embedding Cache
+# ---------------------------
+# Set EMBEDDING_CACHE_PATH to an empty string to disable the cache
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./chroma/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# ---------------------------
+# Answer Cache
+# ---------------------------
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # per role
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Cosine similarity above which a question reuses a cached answer; 1.0 disables the near-duplicate tier
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+# Concurrent identical questions from the same role share one in-flight computation
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+
+# ---------------------------
+# Batch Chat
+# ---------------------------
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "20"))
+# LLM calls of one batch request in flight at once
+CHAT_BATCH_LLM_CONCURRENCY = int(os.getenv("CHAT_BATCH_LLM_CONCURRENCY", "4"))
+
+# ---------------------------
+# Context Packing
+# ---------------------------
+# Token budget for retrieved context per model (longest matching prefix wins);
+# CONTEXT_TOKEN_BUDGET overrides it for every model
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-3.5-turbo": 3000,
+    "gpt-4o": 6000,
+    "gpt-4-turbo": 6000,
+    "gpt-4": 3000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+# Passages whose word sets overlap at least this much with a better-ranked passage are dropped
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.9"))
+
+# ---------------------------
+# Structured Table Queries
+# ---------------------------
+# Route aggregate/filter questions over CSV sources to SQL instead of vector search
+TABLE_QUERY_ENABLED = os.getenv("TABLE_QUERY_ENABLED", "true").lower() == "true"
+TABLE_QUERY_MAX_ROWS = int(os.getenv("TABLE_QUERY_MAX_ROWS", "50"))
+
+# ---------------------------
+# Audit Logging
+# ---------------------------
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "./logs/audit.jsonl")
+# Callers block (rather than drop records) once this many are waiting to be written
+AUDIT_QUEUE_MAX_RECORDS = int(os.getenv("AUDIT_QUEUE_MAX_RECORDS", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FSYNC_INTERVAL_SECONDS = float(os.getenv("AUDIT_FSYNC_INTERVAL_SECONDS", "1.0"))
+AUDIT_MAX_BYTES = int(os.getenv("AUDIT_MAX_BYTES", str(50 * 1024 * 1024)))
+AUDIT_BACKUP_COUNT = int(os.getenv("AUDIT_BACKUP_COUNT", "5"))
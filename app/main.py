@@ -1,11 +1,14 @@
 # ds-rpc-01/app/main.py
 
 import os
+import json
 import logging
 import uuid
 import time
+import asyncio
 from datetime import datetime
 import hashlib
+import hmac
 import binascii
 
 
@@ -17,9 +20,10 @@ from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from jose import JWTError, jwt
 
 
@@ -34,8 +38,22 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import custom schemas, services, and utilities
-from app.schemas.chat import HealthCheck, EnhancedChatRequest, EnhancedChatResponse
+from app.schemas.chat import (
+    HealthCheck, EnhancedChatRequest, EnhancedChatResponse, SourceDoc,
+    BatchChatRequest, BatchChatItem, BatchChatResponse
+)
 from app.services.rag_service import rag_service
+from app.config import CHROMA_PERSIST_DIR, SHARED_STATE_PATH, REINGEST_POLL_SECONDS, INDEX_SNAPSHOT_PATH, INDEX_WRITABLE, ADMIN_ROLES
+from app.utils.shared_state import open_shared_state, limit_storage_uri, SharedTTLCache
+from app.utils.metrics import metrics
+from app.utils.audit import (
+    audit_writer,
+    alog_authentication_success,
+    alog_authentication_failure,
+    alog_query,
+    alog_query_success,
+    alog_query_error,
+)
 
 # ---------------------------
 # Logging Configuration
@@ -49,8 +67,18 @@ logger = logging.getLogger(__name__)
 # ---------------------------
 # Initialize Rate Limiter & Cache
 # ---------------------------
-limiter = Limiter(key_func=get_remote_address)
-user_cache = TTLCache(maxsize=1000, ttl=300)  # 5 min cache for user info
+# With SHARED_STATE_PATH set, limits and password checks are shared by all worker processes
+shared_state = open_shared_state(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=limit_storage_uri(SHARED_STATE_PATH) if SHARED_STATE_PATH else "memory://"
+)
+# Decoding a JWT costs about as much as a shared-state read, so claims stay per process
+user_cache = TTLCache(maxsize=1000, ttl=300)  # 5 min cache of decoded JWT claims, keyed by token
+verified_password_cache = (
+    SharedTTLCache(shared_state, "verified_passwords", maxsize=1000, ttl=300) if shared_state
+    else TTLCache(maxsize=1000, ttl=300)
+)  # 5 min cache of successful password checks
 
 # ---------------------------
 # Security Configuration
@@ -60,9 +88,13 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 SALT_LENGTH = 16
 HASH_ITERATIONS = 100000
+USERS_FILE = os.getenv("USERS_FILE", os.path.join(os.path.dirname(__file__), "users.json"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
+# Keeps fire-and-forget tasks (e.g. admin-triggered re-ingestion) referenced until they finish
+background_tasks: set = set()
+
 # ---------------------------
 # Password Hashing Functions
 # ---------------------------
@@ -90,11 +122,36 @@ def verify_password(stored_password: str, provided_password: str) -> bool:
             HASH_ITERATIONS
         )
         # Convert both to hex for comparison
-        return binascii.hexlify(new_key).decode() == stored_key_hex
+        return hmac.compare_digest(binascii.hexlify(new_key).decode(), stored_key_hex)
     except Exception as e:
         logger.error(f"Password verification error: {e}")
         return False
 
+def _verification_key(stored_password: str, provided_password: str) -> str:
+    """Keyed digest identifying a successful (hash, password) pair without keeping the password"""
+    return hmac.new(
+        SECRET_KEY.encode('utf-8'),
+        f"{stored_password}:{provided_password}".encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+async def verify_password_async(stored_password: str, provided_password: str) -> bool:
+    """Verify a password in the threadpool, skipping PBKDF2 for recently verified pairs"""
+    cache_key = _verification_key(stored_password, provided_password)
+    if shared_state:
+        # Shared-cache reads and writes are SQLite calls that can wait on other workers
+        if await run_in_threadpool(verified_password_cache.__contains__, cache_key):
+            return True
+    elif cache_key in verified_password_cache:
+        return True
+    verified = await run_in_threadpool(verify_password, stored_password, provided_password)
+    if verified:
+        if shared_state:
+            await run_in_threadpool(verified_password_cache.__setitem__, cache_key, True)
+        else:
+            verified_password_cache[cache_key] = True
+    return verified
+
 # ---------------------------
 # User Database (Demo)
 # ---------------------------
@@ -105,73 +162,19 @@ class User(BaseModel):
     title: str
     department: str
     
-class SourceDoc(BaseModel):
-    filename: str
-    summary: Optional[str]
-
 class EnhancedChatResponse(BaseModel):
     response: str
     sources: List[SourceDoc]
+    query_id: str
+    processing_time_ms: int
 
-# Demo user database with hashed passwords
-users_db = {
-    "Peter": User(
-        username="Peter",
-        password_hash=hash_password("pete123"),
-        role="engineering",
-        title="Engineering Lead",
-        department="Engineering"
-    ),
-    "Tony": User(
-        username="Tony",
-        password_hash=hash_password("password123"),
-        role="engineering",
-        title="Senior Engineer",
-        department="Engineering"
-    ),
-    "Bruce": User(
-        username="Bruce",
-        password_hash=hash_password("securepass"),
-        role="marketing",
-        title="Marketing Director",
-        department="Marketing"
-    ),
-    "Sam": User(
-        username="Sam",
-        password_hash=hash_password("financepass"),
-        role="finance",
-        title="Finance Manager",
-        department="Finance"
-    ),
-    "Sid": User(
-        username="Sid",
-        password_hash=hash_password("sidpass123"),
-        role="marketing",
-        title="Marketing Specialist",
-        department="Marketing"
-    ),
-    "Natasha": User(
-        username="Natasha",
-        password_hash=hash_password("hrpass123"),
-        role="hr",
-        title="HR Director",
-        department="Human Resources"
-    ),
-    "Alex": User(
-        username="Alex",
-        password_hash=hash_password("ceopass"),
-        role="c-level",
-        title="Chief Executive Officer",
-        department="Executive"
-    ),
-    "John": User(
-        username="John",
-        password_hash=hash_password("employeepass"),
-        role="employee",
-        title="General Employee",
-        department="General"
-    )
-}
+# Demo user database, loaded from precomputed PBKDF2 hashes so importing the
+# app never pays the hashing cost. Use hash_password() to add new users.
+def load_users_db(users_file: str) -> dict:
+    with open(users_file, "r", encoding="utf-8") as f:
+        return {entry["username"]: User(**entry) for entry in json.load(f)}
+
+users_db = load_users_db(USERS_FILE)
 
 # ---------------------------
 # Security Functions
@@ -181,11 +184,11 @@ def get_user(username: str):
         return users_db[username]
     return None
 
-def authenticate_user(username: str, password: str):
+async def authenticate_user(username: str, password: str):
     user = get_user(username)
     if not user:
         return False
-    if not verify_password(user.password_hash, password):
+    if not await verify_password_async(user.password_hash, password):
         logger.warning(f"Password verification failed for user {username}")
         return False
     return user
@@ -206,13 +209,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    cached_claims = user_cache.get(token)
+    if cached_claims and cached_claims["exp"] > time.time():
+        username = cached_claims["sub"]
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        # Decoded claims are reused until the cache TTL or the token's own expiry, whichever is first
+        user_cache[token] = {"sub": username, "exp": payload.get("exp", 0)}
     
     user = get_user(username)
     if user is None:
@@ -236,13 +245,23 @@ async def lifespan(app: FastAPI):
         openai_api_key = os.getenv("OPENAI_API_KEY")
         if not openai_api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        await rag_service.initialize(openai_api_key)
+        if INDEX_SNAPSHOT_PATH:
+            await rag_service.initialize_from_snapshot(INDEX_SNAPSHOT_PATH)
+        else:
+            await rag_service.initialize(CHROMA_PERSIST_DIR)
         logger.info("✅ RAG service initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize RAG service: {e}")
+    watcher = None
+    if REINGEST_POLL_SECONDS > 0 and rag_service.initialized:
+        # Read-only workers only follow generations built elsewhere
+        watcher = asyncio.create_task(rag_service.watch_resources(REINGEST_POLL_SECONDS, build=INDEX_WRITABLE))
     yield
     logger.info("🛑 Shutting down application")
+    if watcher is not None:
+        watcher.cancel()
     await rag_service.cleanup()
+    await run_in_threadpool(audit_writer.close)
 
 # ---------------------------
 # FastAPI app setup
@@ -303,8 +322,9 @@ async def health_check():
 @app.post("/api/login")
 async def login_for_access_token(login_request: LoginRequest):
     """Authenticate user and return access token"""
-    user = authenticate_user(login_request.username, login_request.password)
+    user = await authenticate_user(login_request.username, login_request.password)
     if not user:
+        await alog_authentication_failure(login_request.username, "invalid username or password")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -318,6 +338,7 @@ async def login_for_access_token(login_request: LoginRequest):
     )
     
     logger.info(f"User {user.username} logged in successfully")
+    await alog_authentication_success(user.username, user.role)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -335,17 +356,188 @@ async def enhanced_chat_endpoint(
     user: User = Depends(get_current_user)
 ):
     """Process chat with RAG."""
-    rag_response = await rag_service.query(
-        question=chat_request.message,
-        user_role=user.role,
-        user_context={"username": user.username}
-    )
-    logger.info(f"User {user.username} queried: {chat_request.message}")
+    query_id = str(uuid.uuid4())
+    start_time = time.perf_counter()
+    await alog_query(user.username, chat_request.message, query_id, user.role)
+    try:
+        rag_response = await rag_service.query(
+            question=chat_request.message,
+            user_role=user.role,
+            user_context={"username": user.username}
+        )
+    except Exception as e:
+        await alog_query_error(user.username, query_id, str(e))
+        raise
+    processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+    if "error" in rag_response:
+        await alog_query_error(user.username, query_id, rag_response["error"])
+    else:
+        await alog_query_success(user.username, query_id, processing_time_ms, len(rag_response["sources"]))
+    logger.info(f"User {user.username} queried ({query_id}): {chat_request.message}")
     return EnhancedChatResponse(
         response=rag_response["response"],
-        sources=rag_response["sources"]
+        sources=rag_response["sources"],
+        query_id=query_id,
+        processing_time_ms=processing_time_ms
+    )
+
+@app.post("/api/chat/stream")
+@limiter.limit("30/minute")
+async def chat_stream_endpoint(
+    request: Request,
+    chat_request: EnhancedChatRequest,
+    user: User = Depends(get_current_user)
+):
+    """Stream a chat answer as Server-Sent Events: sources first, then tokens."""
+    # Checked up front: once the stream has started, the status code is already sent
+    if not rag_service.initialized:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="RAG service not initialized")
+    query_id = str(uuid.uuid4())
+    start_time = time.perf_counter()
+    logger.info(f"User {user.username} queried (stream {query_id}): {chat_request.message}")
+    await alog_query(user.username, chat_request.message, query_id, user.role)
+
+    async def event_stream():
+        events = rag_service.stream_query(
+            question=chat_request.message,
+            user_role=user.role,
+            user_context={"username": user.username}
+        )
+        sources_count = 0
+        error = "client disconnected"
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    logger.info(f"Client of {user.username} disconnected, stopping stream")
+                    break
+                if event["event"] == "sources":
+                    sources_count = len(event["data"])
+                elif event["event"] == "error":
+                    error = event["data"]
+                elif event["event"] == "done":
+                    error = None
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            await events.aclose()
+            if error:
+                await alog_query_error(user.username, query_id, error)
+            else:
+                await alog_query_success(user.username, query_id, int((time.perf_counter() - start_time) * 1000), sources_count)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.post("/api/chat/batch")
+@limiter.limit("10/minute")
+async def chat_batch_endpoint(
+    request: Request,
+    batch_request: BatchChatRequest,
+    user: User = Depends(get_current_user)
+):
+    """Answer several questions in one request.
+
+    Results come back in question order, or with ``"stream": true`` as
+    newline-delimited JSON items in completion order. A failed question is
+    reported in its item's ``error`` field without failing the batch.
+    """
+    if not rag_service.initialized:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="RAG service not initialized")
+    questions = batch_request.questions
+    start_time = time.perf_counter()
+    query_ids = [str(uuid.uuid4()) for _ in questions]
+    for question, query_id in zip(questions, query_ids):
+        await alog_query(user.username, question, query_id, user.role)
+    logger.info(f"User {user.username} sent a batch of {len(questions)} questions")
+
+    async def to_item(index: int, result: dict) -> BatchChatItem:
+        processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+        if "error" in result:
+            await alog_query_error(user.username, query_ids[index], result["error"])
+        else:
+            await alog_query_success(user.username, query_ids[index], processing_time_ms, len(result["sources"]))
+        return BatchChatItem(
+            index=index,
+            query_id=query_ids[index],
+            response=result["response"],
+            sources=result["sources"],
+            processing_time_ms=processing_time_ms,
+            error=result.get("error")
+        )
+
+    results = rag_service.query_batch(questions, user.role, user_context={"username": user.username})
+
+    if batch_request.stream:
+        async def item_stream():
+            answered = set()
+            try:
+                async for index, result in results:
+                    answered.add(index)
+                    yield (await to_item(index, result)).model_dump_json() + "\n"
+            finally:
+                await results.aclose()
+                for index in set(range(len(questions))) - answered:
+                    await alog_query_error(user.username, query_ids[index], "client disconnected")
+
+        return StreamingResponse(
+            item_stream(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    items: List[Optional[BatchChatItem]] = [None] * len(questions)
+    try:
+        async for index, result in results:
+            items[index] = await to_item(index, result)
+    finally:
+        await results.aclose()
+    return BatchChatResponse(results=items, processing_time_ms=int((time.perf_counter() - start_time) * 1000))
+
+@app.post("/api/admin/reingest", status_code=status.HTTP_202_ACCEPTED)
+async def reingest_endpoint(user: User = Depends(get_current_user)):
+    """Start picking up changes in the resources folder; queries are served throughout."""
+    if user.role not in ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to re-ingest documents")
+    if not rag_service.initialized:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="RAG service not initialized")
+    already_running = rag_service.reingest_status.get("state") == "running"
+    if not already_running:
+        task = asyncio.create_task(rag_service.reingest(build=INDEX_WRITABLE))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    logger.info(f"User {user.username} requested re-ingestion")
+    return {"status": "running" if already_running else "started", "generation": rag_service.vector_store.generation}
+
+@app.get("/api/admin/index")
+async def index_status_endpoint(user: User = Depends(get_current_user)):
+    """Live index generation, chunk count and the outcome of the last re-ingestion."""
+    if user.role not in ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view index status")
+    return {
+        "generation": rag_service.vector_store.generation,
+        "chunks": rag_service.vector_store.document_count(),
+        "reingest": rag_service.reingest_status,
+        "snapshot": rag_service.snapshot,
+    }
+
+@app.get("/api/metrics")
+async def metrics_endpoint(request: Request, format: Optional[str] = None, user: User = Depends(get_current_user)):
+    """Per-stage latency histograms and counters, as JSON or Prometheus text.
+
+    The counters are per role, so only ``ADMIN_ROLES`` may read them (scrapers
+    send an admin's bearer token). Prometheus text is returned for
+    ``?format=prometheus`` or when the client accepts ``text/plain`` (as
+    Prometheus scrapers do); JSON otherwise.
+    """
+    if user.role not in ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view metrics")
+    accept = request.headers.get("accept", "")
+    if format == "prometheus" or (format is None and ("text/plain" in accept or "openmetrics" in accept)):
+        return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+    return JSONResponse(metrics.to_json())
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     logger.warning(f"HTTP {exc.status_code}: {exc.detail} - {request.url}")
@@ -1,8 +1,10 @@
 # ds-rpc-01/app/schemas/chat.py
-from typing import List, Dict, Any
-from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 
+from app.config import CHAT_BATCH_MAX_QUESTIONS
+
 
 class SourceDocument(BaseModel):
     filename: str
@@ -25,6 +27,27 @@ class EnhancedChatRequest(BaseModel):
     timestamp: datetime = datetime.now()
     # Add other fields as needed
 
+class BatchChatRequest(BaseModel):
+    """Several questions answered in one request; ``stream`` returns results as they complete."""
+    questions: List[str] = Field(min_length=1, max_length=CHAT_BATCH_MAX_QUESTIONS)
+    stream: bool = False
+
+class SourceDoc(BaseModel):
+    filename: str
+    summary: Optional[str]
+
+class BatchChatItem(BaseModel):
+    index: int
+    query_id: str
+    response: str
+    sources: List[SourceDoc]
+    processing_time_ms: int
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
+    processing_time_ms: int
+
 class ChatRequest(BaseModel):
     """
     Defines the shape of a user's chat message request.
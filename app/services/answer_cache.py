@@ -0,0 +1,257 @@
+# ds-rpc-01/app/services/answer_cache.py
+
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"[\s?!.]+$", "", " ".join(question.lower().split()))
+
+
+@dataclass
+class CachedAnswer:
+    result: Dict[str, Any]
+    embedding: Optional[np.ndarray]
+    departments: Optional[List[str]]
+    generations: Dict[str, int]
+    created_at: float
+
+
+class AnswerCache:
+    """Per-role cache of RAG answers with an exact and a near-duplicate tier.
+
+    Entries never cross role boundaries: every role has its own LRU of answers.
+    An entry is only served while none of the departments it was answered from
+    has been re-ingested since, and while it is younger than ``ttl_seconds``.
+
+    With a ``shared`` state, exact-match answers and department generations
+    also live in that SQLite file, so every worker process serves (and
+    invalidates) the answers computed by the others. The near-duplicate tier
+    stays per process, as it searches an in-memory matrix. The ``a``-prefixed
+    methods run the shared-state reads and writes in a worker thread, so a
+    busy SQLite file never stalls the event loop.
+    """
+
+    def __init__(self, max_entries_per_role: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95,
+                 shared: Optional[SharedState] = None):
+        self.max_entries_per_role = max_entries_per_role
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.shared = shared
+        self._entries: Dict[str, "OrderedDict[str, CachedAnswer]"] = {}
+        self._matrices: Dict[str, Any] = {}
+        self._department_generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold < 1.0
+
+    def _snapshot(self, departments: Optional[List[str]]) -> Dict[str, int]:
+        if self.shared is not None:
+            keys = {dept: f"answer_generation:{dept}" for dept in (["*"] if departments is None else departments)}
+            counters = self.shared.counters(list(keys.values()))
+            return {dept: counters[key] for dept, key in keys.items()}
+        if departments is None:
+            return {"*": self._global_generation}
+        return {dept: self._department_generations.get(dept, 0) for dept in departments}
+
+    async def _asnapshot(self, departments: Optional[List[str]]) -> Dict[str, int]:
+        if self.shared is None:
+            return self._snapshot(departments)
+        return await asyncio.get_running_loop().run_in_executor(None, self._snapshot, departments)
+
+    def _is_valid(self, entry: CachedAnswer, generations: Optional[Dict[str, int]] = None) -> bool:
+        """``generations`` is the current snapshot of the entry's departments; read here when not given."""
+        if time.time() - entry.created_at > self.ttl_seconds:
+            return False
+        return entry.generations == (self._snapshot(entry.departments) if generations is None else generations)
+
+    def _drop(self, role: str, key: str, entry: Optional[CachedAnswer] = None) -> None:
+        """Forget ``key``; with ``entry``, only while that is still the answer cached under it."""
+        entries = self._entries.get(role, {})
+        if entry is None or entries.get(key) is entry:
+            entries.pop(key, None)
+            self._matrices.pop(role, None)
+
+    def lookup_exact(self, role: str, question: str) -> Optional[Dict[str, Any]]:
+        key = normalize_question(question)
+        return self._finish_exact(role, key, *self._read_exact(role, key, self._local(role, key)))
+
+    async def alookup_exact(self, role: str, question: str) -> Optional[Dict[str, Any]]:
+        key = normalize_question(question)
+        entry = self._local(role, key)
+        if self.shared is None:
+            found = self._read_exact(role, key, entry)
+        else:
+            found = await asyncio.get_running_loop().run_in_executor(None, self._read_exact, role, key, entry)
+        return self._finish_exact(role, key, *found)
+
+    def _local(self, role: str, key: str) -> Optional[CachedAnswer]:
+        entries = self._entries.get(role)
+        return entries.get(key) if entries else None
+
+    def _read_exact(self, role: str, key: str, entry: Optional[CachedAnswer]) -> Tuple[Optional[CachedAnswer], Optional[Dict[str, int]]]:
+        """Shared-state half of an exact lookup: the entry, loaded from another
+        worker when this process has none, and its departments' generations."""
+        if entry is None and self.shared is not None:
+            entry = self._load_shared(role, key)
+        if entry is None:
+            return None, None
+        return entry, self._snapshot(entry.departments)
+
+    def _finish_exact(self, role: str, key: str, entry: Optional[CachedAnswer], generations: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+        if entry is None:
+            return None
+        if not self._is_valid(entry, generations):
+            self._drop(role, key, entry)
+            return None
+        entries = self._entries.setdefault(role, OrderedDict())
+        if key not in entries:
+            self._insert(entries, key, entry)
+        entries.move_to_end(key)
+        self.stats["exact_hits"] += 1
+        return entry.result
+
+    def lookup_similar(self, role: str, embedding: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        """Return the answer whose question embedding is closest to ``embedding``, if close enough."""
+        match = self._nearest(role, embedding)
+        return self._finish_similar(role, match, self._snapshot(match[1].departments) if match else None)
+
+    async def alookup_similar(self, role: str, embedding: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        match = self._nearest(role, embedding)
+        return self._finish_similar(role, match, await self._asnapshot(match[1].departments) if match else None)
+
+    def _nearest(self, role: str, embedding: Optional[List[float]]) -> Optional[Tuple[str, CachedAnswer]]:
+        entries = self._entries.get(role)
+        if not entries or embedding is None or not self.semantic_enabled:
+            return None
+
+        if role not in self._matrices:
+            keys = [key for key, entry in entries.items() if entry.embedding is not None]
+            matrix = np.vstack([entries[key].embedding for key in keys]) if keys else None
+            self._matrices[role] = (keys, matrix)
+        keys, matrix = self._matrices[role]
+        if matrix is None:
+            return None
+
+        query = self._unit(embedding)
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            key = keys[best]
+            entry = entries.get(key)
+            if entry is not None:
+                return key, entry
+            self._drop(role, key)
+        return None
+
+    def _finish_similar(self, role: str, match: Optional[Tuple[str, CachedAnswer]], generations: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+        if match is not None:
+            key, entry = match
+            if self._is_valid(entry, generations):
+                if self._local(role, key) is entry:
+                    self._entries[role].move_to_end(key)
+                self.stats["semantic_hits"] += 1
+                return entry.result
+            self._drop(role, key, entry)
+
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, role: str, question: str, result: Dict[str, Any], embedding: Optional[List[float]] = None, departments: Optional[List[str]] = None) -> None:
+        key = normalize_question(question)
+        entry = self._store_local(role, key, result, embedding, departments, self._snapshot(departments))
+        if entry is not None:
+            self._store_shared(role, key, entry)
+
+    async def astore(self, role: str, question: str, result: Dict[str, Any], embedding: Optional[List[float]] = None, departments: Optional[List[str]] = None) -> None:
+        key = normalize_question(question)
+        entry = self._store_local(role, key, result, embedding, departments, await self._asnapshot(departments))
+        if entry is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._store_shared, role, key, entry)
+
+    def _store_local(self, role: str, key: str, result: Dict[str, Any], embedding: Optional[List[float]],
+                     departments: Optional[List[str]], generations: Dict[str, int]) -> Optional[CachedAnswer]:
+        """Cache an answer in this process; returns the entry when it should also go to shared state."""
+        entry = CachedAnswer(
+            result=result,
+            embedding=self._unit(embedding) if embedding is not None else None,
+            departments=sorted(departments) if departments is not None else None,
+            generations=generations,
+            created_at=time.time(),
+        )
+        self._insert(self._entries.setdefault(role, OrderedDict()), key, entry)
+        self._matrices.pop(role, None)
+        if self.shared is None or self._local(role, key) is not entry:
+            return None
+        return entry
+
+    def _store_shared(self, role: str, key: str, entry: CachedAnswer) -> None:
+        self.shared.set(
+            f"answers:{role}", key,
+            {"result": entry.result, "departments": entry.departments,
+             "generations": entry.generations, "created_at": entry.created_at},
+            ttl=self.ttl_seconds, max_entries=self.max_entries_per_role
+        )
+
+    def _insert(self, entries: "OrderedDict[str, CachedAnswer]", key: str, entry: CachedAnswer) -> None:
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries_per_role:
+            entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load_shared(self, role: str, key: str) -> Optional[CachedAnswer]:
+        """Read an exact-match answer stored by another worker."""
+        data = self.shared.get(f"answers:{role}", key) if self.max_entries_per_role > 0 else None
+        if data is None:
+            return None
+        return CachedAnswer(
+            result=data["result"],
+            embedding=None,
+            departments=data["departments"],
+            generations=data["generations"],
+            created_at=data["created_at"],
+        )
+
+    def invalidate_departments(self, departments: List[str]) -> None:
+        """Mark answers drawn from these departments as stale after re-ingestion."""
+        if not departments:
+            return
+        for dept in departments:
+            self._department_generations[dept] = self._department_generations.get(dept, 0) + 1
+        self._global_generation += 1
+        if self.shared is not None:
+            for dept in [*departments, "*"]:
+                self.shared.incr(f"answer_generation:{dept}")
+        self.stats["invalidations"] += 1
+        logger.info(f"Invalidated cached answers for departments: {', '.join(sorted(departments))}")
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._matrices = {}
+        if self.shared is not None:
+            self.shared.clear_prefix("answers:")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "entries": sum(len(entries) for entries in self._entries.values())}
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
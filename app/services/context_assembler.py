@@ -0,0 +1,195 @@
+# ds-rpc-01/app/services/context_assembler.py
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS, DEFAULT_CONTEXT_TOKEN_BUDGET
+from app.utils.tokens import count_tokens, get_encoding, CHARS_PER_TOKEN
+from app.services.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Shortest text overlap treated as the splitter's chunk overlap when chunks carry no offsets
+MIN_TEXT_OVERLAP = 20
+# Longest overlap searched for; the splitter's overlap is 50 characters
+MAX_TEXT_OVERLAP = 200
+# Chunks separated by at most this many characters (the whitespace the splitter drops) are adjacent
+MAX_ADJACENT_GAP = 4
+# A truncated block must keep at least this many tokens to be worth including
+MIN_BLOCK_TOKENS = 40
+
+
+@dataclass
+class ContextBlock:
+    """One or more retrieved chunks of the same file merged into a contiguous passage."""
+    text: str
+    documents: List[Any]
+    rank: int
+    start: Optional[int] = None
+    end: Optional[int] = None
+    terms: frozenset = field(default_factory=frozenset)
+
+
+def context_token_budget(model_name: str) -> int:
+    """Context token budget for a model: the override, else the longest matching prefix."""
+    if CONTEXT_TOKEN_BUDGET > 0:
+        return CONTEXT_TOKEN_BUDGET
+    matches = [prefix for prefix in CONTEXT_TOKEN_BUDGETS if model_name.startswith(prefix)]
+    return CONTEXT_TOKEN_BUDGETS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_TOKEN_BUDGET
+
+
+def _group_key(doc) -> Tuple[Any, ...]:
+    metadata = doc.metadata
+    return (metadata.get("file_path") or metadata.get("source"), metadata.get("page"))
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``, up to MAX_TEXT_OVERLAP."""
+    limit = min(len(left), len(right), MAX_TEXT_OVERLAP)
+    for size in range(limit, MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextAssembler:
+    """Builds the LLM context from retrieved chunks within a token budget.
+
+    Chunks of the same file (and page) that are adjacent or overlap are merged
+    into one passage, so the splitter's overlap is sent once. Passages that are
+    near-duplicates of a better-ranked one are dropped. The rest are packed in
+    relevance order until the budget is used up; the last passage that does not
+    fit is truncated if enough of it remains.
+    """
+
+    def __init__(self, token_budget: int, model_name: Optional[str] = None, duplicate_threshold: float = 0.9):
+        self.token_budget = token_budget
+        self.model_name = model_name
+        self.duplicate_threshold = duplicate_threshold
+
+    def assemble(self, documents: List[Any]) -> Tuple[str, List[Any]]:
+        """Return (context, documents that made it into the context) for documents in relevance order."""
+        blocks = self._merge(documents)
+        blocks = self._deduplicate(blocks)
+
+        parts: List[str] = []
+        used: List[Any] = []
+        remaining = self.token_budget
+        for block in blocks:
+            text = self._render(block)
+            tokens = count_tokens(text, self.model_name)
+            if tokens > remaining:
+                if remaining < MIN_BLOCK_TOKENS:
+                    continue
+                text = self._truncate(text, remaining)
+                tokens = remaining
+            parts.append(text)
+            used.extend(block.documents)
+            remaining -= tokens
+            if remaining < MIN_BLOCK_TOKENS:
+                break
+
+        logger.debug(
+            f"Packed {len(parts)} of {len(blocks)} passages from {len(documents)} chunks "
+            f"into {self.token_budget - remaining}/{self.token_budget} tokens"
+        )
+        return "\n\n".join(parts), used
+
+    def _merge(self, documents: List[Any]) -> List[ContextBlock]:
+        groups: Dict[Tuple[Any, ...], List[ContextBlock]] = {}
+        for rank, doc in enumerate(documents):
+            start = doc.metadata.get("start_index")
+            block = ContextBlock(
+                text=doc.page_content,
+                documents=[doc],
+                rank=rank,
+                start=start,
+                end=start + len(doc.page_content) if start is not None else None,
+            )
+            group = groups.setdefault(_group_key(doc), [])
+            for existing in group:
+                if self._try_merge(existing, block):
+                    block = None
+                    break
+            if block is not None:
+                group.append(block)
+
+        blocks = []
+        for group in groups.values():
+            # A merged block can now touch another block of the same group
+            merged = True
+            while merged and len(group) > 1:
+                merged = False
+                for i in range(len(group)):
+                    for j in range(len(group)):
+                        if i != j and self._try_merge(group[i], group[j]):
+                            del group[j]
+                            merged = True
+                            break
+                    if merged:
+                        break
+            blocks.extend(group)
+
+        for block in blocks:
+            block.terms = frozenset(tokenize(block.text))
+        return sorted(blocks, key=lambda block: block.rank)
+
+    @staticmethod
+    def _try_merge(block: ContextBlock, other: ContextBlock) -> bool:
+        """Merge ``other`` into ``block`` when they are adjacent or overlap."""
+        if block.start is not None and other.start is not None:
+            if other.start > block.end + MAX_ADJACENT_GAP or block.start > other.end + MAX_ADJACENT_GAP:
+                return False
+            first, second = (block, other) if block.start <= other.start else (other, block)
+            if second.start > first.end:
+                text = first.text + "\n" + second.text
+            elif second.end > first.end:
+                text = first.text + second.text[first.end - second.start:]
+            else:
+                text = first.text
+            start, end = first.start, max(first.end, second.end)
+        else:
+            if other.text in block.text:
+                text, start, end = block.text, block.start, block.end
+            elif block.text in other.text:
+                text, start, end = other.text, other.start, other.end
+            elif (overlap := _text_overlap(block.text, other.text)):
+                text, start, end = block.text + other.text[overlap:], None, None
+            elif (overlap := _text_overlap(other.text, block.text)):
+                text, start, end = other.text + block.text[overlap:], None, None
+            else:
+                return False
+        block.text = text
+        block.start, block.end = start, end
+        block.documents.extend(other.documents)
+        block.rank = min(block.rank, other.rank)
+        return True
+
+    def _deduplicate(self, blocks: List[ContextBlock]) -> List[ContextBlock]:
+        kept: List[ContextBlock] = []
+        for block in blocks:
+            if any(_jaccard(block.terms, other.terms) >= self.duplicate_threshold for other in kept):
+                continue
+            kept.append(block)
+        return kept
+
+    @staticmethod
+    def _render(block: ContextBlock) -> str:
+        metadata = block.documents[0].metadata
+        filename = metadata.get("filename") or metadata.get("source") or "unknown"
+        if metadata.get("section"):
+            return f"[Source: {filename} > {metadata['section']}]\n{block.text}"
+        return f"[Source: {filename}]\n{block.text}"
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        encoding = get_encoding(self.model_name)
+        if encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
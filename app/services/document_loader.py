@@ -2,63 +2,190 @@
 
 import os
 import logging
-from typing import List, Dict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterator, Tuple, Optional
 from pathlib import Path
 import pandas as pd
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain.schema import Document
+from app.config import (
+    CSV_READ_BATCH_ROWS,
+    CSV_CHUNK_MAX_ROWS,
+    CSV_CHUNK_MAX_TOKENS,
+    SECTION_MAX_TOKENS,
+    SECTION_CHUNK_MAX_TOKENS,
+)
+from app.services.markdown_splitter import MarkdownSectionSplitter, make_section_id
+from app.utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
+FILE_LOADERS = {
+    '.pdf': PyPDFLoader,
+    '.txt': TextLoader,
+    '.md': TextLoader,
+    '.docx': Docx2txtLoader,
+    '.doc': Docx2txtLoader
+}
+
+# Status of a part yielded by ``DocumentLoader.iter_loaded_files``: more parts
+# of the file follow, the file is complete, or reading it failed part-way
+FILE_PART = "part"
+FILE_COMPLETE = "complete"
+FILE_FAILED = "failed"
+
+# Loader owned by each worker process of the parallel pipeline
+_worker_loader: Optional["DocumentLoader"] = None
+
+
+def _init_worker(resources_path: str) -> None:
+    global _worker_loader
+    _worker_loader = DocumentLoader(resources_path, max_workers=1)
+
+
+def split_sections(docs: List[Document]) -> Tuple[List[Document], List[Document]]:
+    """Separate a file's loaded documents into (chunks to index, parent sections)."""
+    chunks, sections = [], []
+    for doc in docs:
+        (sections if doc.metadata.get("content_type") == "section" else chunks).append(doc)
+    return chunks, sections
+
+
+def _load_in_worker(file_path: str, department: str) -> Tuple[str, str, List[Document]]:
+    return file_path, department, _worker_loader.load_file(Path(file_path), department)
+
+
 class DocumentLoader:
-    def __init__(self, resources_path: str = "./resources/data"):
+    def __init__(self, resources_path: str = "./resources/data", max_workers: Optional[int] = None):
         self.resources_path = Path(resources_path)
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=300,
-            chunk_overlap=50
+            chunk_overlap=50,
+            add_start_index=True
+        )
+        self.markdown_splitter = MarkdownSectionSplitter(
+            section_max_tokens=SECTION_MAX_TOKENS,
+            chunk_max_tokens=SECTION_CHUNK_MAX_TOKENS
         )
 
     def load_all_documents(self) -> Dict[str, List[Document]]:
+        """Chunks to index per department; parent sections are left out."""
         department_docs = {}
+        for file_path, department, docs, status in self.iter_loaded_files(self.discover_files()):
+            docs, _ = split_sections(docs)
+            department_docs.setdefault(department, []).extend(docs)
+            if status == FILE_COMPLETE:
+                logger.info(f"Loaded {Path(file_path).name}")
+        return {department: docs for department, docs in department_docs.items() if docs}
+
+    def discover_files(self) -> Dict[str, str]:
+        """Map every file under the resources tree to the department it belongs to."""
+        files = {}
         for department_dir in self.resources_path.iterdir():
             if department_dir.is_dir():
-                department_name = department_dir.name
-                logger.info(f"Loading documents for {department_name}")
-                docs = self._load_department_documents(department_dir, department_name)
-                if docs:
-                    department_docs[department_name] = docs
-                    logger.info(f"Loaded {len(docs)} chunks for {department_name}")
-        return department_docs
-
-    def _load_department_documents(self, dept_path: Path, department: str) -> List[Document]:
-        documents = []
-        for file_path in dept_path.rglob("*"):
-            if file_path.is_file():
-                docs = self._load_single_file(file_path, department)
-                if docs:
-                    documents.extend(docs)
-                    logger.info(f"Loaded {file_path.name}: {len(docs)} chunks")
-        return documents
+                for file_path in department_dir.rglob("*"):
+                    if file_path.is_file():
+                        files[str(file_path)] = department_dir.name
+        return files
+
+    def load_file(self, file_path: Path, department: str) -> List[Document]:
+        """Load and split a single file for the given department.
+
+        Markdown files also yield their parent sections, marked with
+        ``content_type: "section"``; ``split_sections`` separates them. The
+        whole file is held in memory; ingestion reads parts with ``iter_file_parts``.
+        """
+        return [doc for part in self.iter_file_parts(Path(file_path), department) for doc in part]
+
+    def iter_file_parts(self, file_path: Path, department: str) -> Iterator[List[Document]]:
+        """Yield a file's documents in order: one part per CSV read batch, a single part for other files.
+
+        A CSV that cannot be read to the end raises after the parts read so far.
+        """
+        file_path = Path(file_path)
+        if file_path.suffix.lower() == '.csv':
+            yield from self._iter_csv_batches(file_path, department)
+        else:
+            yield self._load_single_file(file_path, department)
+
+    def iter_loaded_files(self, files: Dict[str, str]) -> Iterator[Tuple[str, str, List[Document], str]]:
+        """Parse and split files, yielding (path, department, chunks, status) parts as they are ready.
+
+        A file's parts come in order with status FILE_PART, and its last one has
+        FILE_COMPLETE, or FILE_FAILED if the file could not be read to the end. CSV
+        files are read in this process and yielded one read batch at a time, so
+        a large CSV is never held (or pickled between processes) whole. Other
+        files are parsed whole in a pool of ``max_workers`` processes with a
+        bounded number in flight, and yielded as one complete part.
+        """
+        streamed = [(path, dept) for path, dept in files.items() if Path(path).suffix.lower() == '.csv']
+        parsed = [(path, dept) for path, dept in files.items() if Path(path).suffix.lower() != '.csv']
+        if self.max_workers <= 1 or len(parsed) <= 1:
+            for file_path, department in parsed:
+                yield file_path, department, self._load_single_file(Path(file_path), department), FILE_COMPLETE
+            for file_path, department in streamed:
+                yield from self._iter_streamed_file(file_path, department)
+            return
+
+        max_in_flight = self.max_workers * 2
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(self.resources_path),)
+        ) as pool:
+            pending = set()
+            submitted = 0
+
+            def collect(timeout: Optional[float]) -> Iterator[Tuple[str, str, List[Document], str]]:
+                nonlocal pending, submitted
+                while len(pending) < max_in_flight and submitted < len(parsed):
+                    pending.add(pool.submit(_load_in_worker, *parsed[submitted]))
+                    submitted += 1
+                if pending:
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield (*future.result(), FILE_COMPLETE)
+
+            try:
+                # CSVs stream here while the pool parses the other files
+                for file_path, department in streamed:
+                    for part in self._iter_streamed_file(file_path, department):
+                        yield part
+                        yield from collect(timeout=0)
+                while pending or submitted < len(parsed):
+                    yield from collect(timeout=None)
+            finally:
+                # Don't parse files nobody will consume if the caller stops early
+                for future in pending:
+                    future.cancel()
+
+    def _iter_streamed_file(self, file_path: str, department: str) -> Iterator[Tuple[str, str, List[Document], str]]:
+        try:
+            for part in self.iter_file_parts(Path(file_path), department):
+                yield file_path, department, part, FILE_PART
+        except Exception as e:
+            # The parts already yielded are not the whole file; the caller must not record it as ingested
+            logger.error(f"Error processing CSV {file_path}: {e}")
+            yield file_path, department, [], FILE_FAILED
+            return
+        yield file_path, department, [], FILE_COMPLETE
 
     def _load_single_file(self, file_path: Path, department: str) -> List[Document]:
         extension = file_path.suffix.lower()
-        loader = {
-            '.pdf': PyPDFLoader,
-            '.txt': TextLoader,
-            '.md': TextLoader,
-            '.csv': self._load_csv_file,
-            '.docx': Docx2txtLoader,
-            '.doc': Docx2txtLoader
-        }.get(extension)
+        loader = FILE_LOADERS.get(extension)
 
         if loader:
             try:
-                if extension == '.csv':
-                    return loader(file_path, department)
                 raw_docs = loader(str(file_path)).load()
-                split_docs = self.text_splitter.split_documents(raw_docs)
+                if extension == '.md':
+                    split_docs = self._split_markdown(raw_docs, str(file_path))
+                else:
+                    split_docs = self.text_splitter.split_documents(raw_docs)
                 for doc in split_docs:
                     doc.metadata.update({
                         'department': department,
@@ -74,45 +201,112 @@ class DocumentLoader:
             logger.warning(f"Unsupported file type: {extension}")
             return []
 
-    def _load_csv_file(self, file_path: Path, department: str) -> List[Document]:
-        try:
-            df = pd.read_csv(file_path, low_memory=False)
-            documents = []
+    def _split_markdown(self, raw_docs: List[Document], file_path: str) -> List[Document]:
+        """Split along headings into sections and the small chunks inside them.
 
-            summary_text = (
-                f"CSV Summary for {file_path.name}:\n"
-                f"Number of rows: {len(df)}\n"
-                f"Columns: {', '.join(df.columns)}\n\n"
-            )
-            documents.append(Document(
-                page_content=summary_text,
+        Each chunk's ``parent_id`` is the ID of the section it came from.
+        """
+        documents = []
+        occurrences: Dict[str, int] = {}
+        for raw_doc in raw_docs:
+            for section in self.markdown_splitter.split(raw_doc.page_content):
+                occurrence = occurrences.get(section.text, 0)
+                occurrences[section.text] = occurrence + 1
+                section_id = make_section_id(file_path, section.text, occurrence)
+                positions = {} if section.start_index is None else {'start_index': section.start_index}
+                documents.append(Document(
+                    page_content=section.text,
+                    metadata={**raw_doc.metadata, **positions, 'content_type': 'section', 'section_id': section_id, 'section': section.title}
+                ))
+                for chunk in section.chunks:
+                    positions = {} if chunk.start_index is None else {'start_index': chunk.start_index}
+                    documents.append(Document(
+                        page_content=chunk.text,
+                        metadata={**raw_doc.metadata, **positions, 'parent_id': section_id, 'section': section.title}
+                    ))
+        return documents
+
+    def _iter_csv_batches(self, file_path: Path, department: str) -> Iterator[List[Document]]:
+        """Read a CSV in fixed-size row batches and pack rows into chunks, yielding the chunks of each batch.
+
+        Only ``CSV_READ_BATCH_ROWS`` rows are held as a DataFrame at a time. Each
+        chunk holds at most ``CSV_CHUNK_MAX_ROWS`` rows and ``CSV_CHUNK_MAX_TOKENS``
+        tokens, so chunk size no longer grows with the file. The last part ends
+        with a summary of the file.
+        """
+        base_metadata = {
+            'department': department,
+            'filename': file_path.name,
+            'file_path': str(file_path),
+            'file_type': '.csv'
+        }
+        header = None
+        header_tokens = 0
+        rows: List[str] = []
+        rows_tokens = 0
+        chunk_start = 0
+        total_rows = 0
+
+        def make_chunk() -> Document:
+            chunk_end = chunk_start + len(rows)
+            return Document(
+                page_content=f"Data Chunk (rows {chunk_start + 1}-{chunk_end}) from {file_path.name}:\n{header}\n" + "\n".join(rows),
                 metadata={
-                    'department': department,
-                    'filename': file_path.name,
-                    'file_path': str(file_path),
-                    'file_type': '.csv',
-                    'content_type': 'summary'
+                    **base_metadata,
+                    'content_type': 'data_chunk',
+                    'chunk_start': chunk_start,
+                    'chunk_end': chunk_end
                 }
-            ))
+            )
 
-            chunk_size = max(1, len(df) // 40)
-            for start in range(0, len(df), chunk_size):
-                end = start + chunk_size
-                chunk_df = df.iloc[start:end]
-                chunk_text = f"Data Chunk (rows {start + 1}-{end}) from {file_path.name}:\n{chunk_df.to_string(index=False)}"
-                documents.append(Document(
-                    page_content=chunk_text,
-                    metadata={
-                        'department': department,
-                        'filename': file_path.name,
-                        'file_path': str(file_path),
-                        'file_type': '.csv',
-                        'content_type': 'data_chunk',
-                        'chunk_start': start,
-                        'chunk_end': end
-                    }
-                ))
-            return documents
-        except Exception as e:
-            logger.error(f"Error processing CSV {file_path}: {e}")
-            return []
+        for frame in pd.read_csv(file_path, chunksize=CSV_READ_BATCH_ROWS, low_memory=False):
+            chunks = []
+            if header is None:
+                columns = [f"{column} ({_column_type(frame[column])})" for column in frame.columns]
+                header = " | ".join(columns)
+                header_tokens = count_tokens(header)
+
+            for row in _render_csv_rows(frame):
+                row_tokens = count_tokens(row) + 1
+                if rows and (len(rows) >= CSV_CHUNK_MAX_ROWS or header_tokens + rows_tokens + row_tokens > CSV_CHUNK_MAX_TOKENS):
+                    chunks.append(make_chunk())
+                    chunk_start += len(rows)
+                    rows, rows_tokens = [], 0
+                rows.append(row)
+                rows_tokens += row_tokens
+            total_rows += len(frame)
+            if chunks:
+                yield chunks
+
+        summary = Document(
+            page_content=(
+                f"CSV Summary for {file_path.name}:\n"
+                f"Number of rows: {total_rows}\n"
+                f"Columns: {header or ''}\n\n"
+            ),
+            metadata={**base_metadata, 'content_type': 'summary'}
+        )
+        yield [make_chunk(), summary] if rows else [summary]
+
+
+def _column_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "text"
+
+
+def _render_csv_rows(frame: pd.DataFrame) -> List[str]:
+    """Render each row as pipe-separated values, formatting columns by dtype."""
+    rendered = []
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_float_dtype(series):
+            values = series.map(lambda v: "" if pd.isna(v) else f"{v:.10g}")
+        else:
+            values = series.astype(str).where(series.notna(), "")
+        rendered.append(values)
+    return [" | ".join(values) for values in zip(*rendered)]
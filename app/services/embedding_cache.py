@@ -0,0 +1,216 @@
+# ds-rpc-01/app/services/embedding_cache.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+# A hit refreshes an entry's last access only if it is older than this, so most
+# hits are plain reads; eviction order is only this precise
+LRU_TOUCH_SECONDS = 3600
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that stores vectors in a local SQLite file.
+
+    Entries are keyed by model name plus the hash of the normalized text and
+    stored as float32 blobs. When the cache grows past ``max_entries`` the least
+    recently used entries are evicted; a hit marks an entry as used at most once
+    per LRU_TOUCH_SECONDS, so the read path rarely writes.
+    """
+
+    def __init__(self, underlying: Embeddings, cache_path: Optional[str], max_entries: int = 200000, model_name: Optional[str] = None):
+        self.underlying = underlying
+        self.model_name = model_name or getattr(underlying, "model", type(underlying).__name__)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._entry_count = 0
+        if cache_path:
+            self._open(cache_path)
+
+    def _open(self, cache_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+            self._conn.commit()
+            self._entry_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            logger.info(f"Embedding cache opened at {cache_path} with {self._entry_count} entries")
+        except sqlite3.Error as e:
+            logger.error(f"Error opening embedding cache {cache_path}, continuing without cache: {e}")
+            self._conn = None
+
+    def _key(self, text: str, kind: str) -> str:
+        # Queries and documents are namespaced apart for models that embed them asymmetrically
+        return hashlib.sha256(f"{self.model_name}\x00{kind}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        stale: List[str] = []
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[start:start + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, last_access in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    if last_access < now - LRU_TOUCH_SECONDS:
+                        stale.append(key)
+            if stale:
+                self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in stale])
+                self._conn.commit()
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in entries.items()]
+            )
+            self._entry_count += len(entries)
+            if self._entry_count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries down to 90% of the limit to amortize eviction."""
+        self._entry_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._entry_count - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._entry_count -= excess
+        logger.info(f"Evicted {excess} entries from the embedding cache")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._conn is None:
+            return self.underlying.embed_documents(texts)
+
+        keys = [self._key(text, "document") for text in texts]
+        cached = self._lookup(list(set(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self._conn is None:
+            return self.underlying.embed_query(text)
+
+        key = self._key(text, "query")
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._conn is None:
+            return await self.underlying.aembed_documents(texts)
+
+        loop = asyncio.get_running_loop()
+        keys = [self._key(text, "document") for text in texts]
+        cached = await loop.run_in_executor(None, self._lookup, list(set(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await loop.run_in_executor(None, self._store, computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async query embedding: SQLite I/O runs in a worker thread, misses use the async client."""
+        if self._conn is None:
+            return await self.underlying.aembed_query(text)
+
+        loop = asyncio.get_running_loop()
+        key = self._key(text, "query")
+        cached = await loop.run_in_executor(None, self._lookup, [key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = await self.underlying.aembed_query(text)
+        await loop.run_in_executor(None, self._store, {key: vector})
+        return vector
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries with one provider call for all cache misses.
+
+        Query and document embeddings are the same operation for symmetric
+        models such as OpenAI's, so misses go through ``aembed_documents``
+        (or the model's own ``aembed_queries`` when it has one) while results
+        are cached under the query namespace.
+        """
+        embed_queries = getattr(self.underlying, "aembed_queries", None) or self.underlying.aembed_documents
+        if self._conn is None:
+            return await embed_queries(texts)
+
+        loop = asyncio.get_running_loop()
+        keys = [self._key(text, "query") for text in texts]
+        cached = await loop.run_in_executor(None, self._lookup, list(set(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = await embed_queries(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await loop.run_in_executor(None, self._store, computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
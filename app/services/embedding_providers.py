@@ -0,0 +1,236 @@
+# ds-rpc-01/app/services/embedding_providers.py
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from app.config import (
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_QUANTIZATION,
+    LOCAL_EMBEDDING_ONNX_FILE,
+    LOCAL_EMBEDDING_THREADS,
+    LOCAL_EMBEDDING_MAX_BATCH,
+    LOCAL_EMBEDDING_BATCH_WAIT_MS,
+    LOCAL_EMBEDDING_QUERY_PREFIX,
+    LOCAL_EMBEDDING_DOCUMENT_PREFIX,
+)
+
+try:
+    import torch
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # only the OpenAI provider is available
+    torch = None
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8", "onnx")
+
+
+def create_embedding_model(provider: str, openai_api_key: Optional[str]) -> Embeddings:
+    """Embedding model for a provider name: ``"openai"`` or ``"local"``."""
+    if provider == "openai":
+        return OpenAIEmbeddings(api_key=openai_api_key)
+    if provider == "local":
+        return LocalEmbeddings(
+            model_name=LOCAL_EMBEDDING_MODEL,
+            quantization=LOCAL_EMBEDDING_QUANTIZATION,
+            onnx_file=LOCAL_EMBEDDING_ONNX_FILE or None,
+            num_threads=LOCAL_EMBEDDING_THREADS or min(4, os.cpu_count() or 1),
+            max_batch_size=LOCAL_EMBEDDING_MAX_BATCH,
+            batch_wait_ms=LOCAL_EMBEDDING_BATCH_WAIT_MS,
+            query_prefix=LOCAL_EMBEDDING_QUERY_PREFIX,
+            document_prefix=LOCAL_EMBEDDING_DOCUMENT_PREFIX,
+        )
+    raise ValueError(f"Unknown embedding provider: {provider}")
+
+
+class _EncodeJob:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run on the CPU in a dedicated worker thread.
+
+    Every encode runs on that one thread, so the event loop is never blocked
+    and the model's intra-op thread pool (``num_threads``) is the only one
+    competing for cores. Query embeddings are batched dynamically: queries
+    that arrive while a batch is being encoded (or within ``batch_wait_ms``
+    of the first one) go into the next batch, up to ``max_batch_size``.
+    Document batches are cut into pieces of the same size and queries are
+    served between pieces, so ingestion does not hold up searches.
+
+    ``quantization`` is ``"none"``, ``"int8"`` (PyTorch dynamic int8
+    quantization of the linear layers) or ``"onnx"`` (ONNX Runtime backend,
+    optionally a pre-quantized export given as ``onnx_file``).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        quantization: str = "none",
+        onnx_file: Optional[str] = None,
+        num_threads: int = 4,
+        max_batch_size: int = 32,
+        batch_wait_ms: float = 0.0,
+        query_prefix: str = "",
+        document_prefix: str = "",
+        encoder: Any = None,
+    ):
+        """``encoder`` replaces the sentence-transformers model (any object with
+        a compatible ``encode``); the dependency is only required without it."""
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown embedding quantization: {quantization}")
+        self.model = f"local:{model_name}" + (f":{quantization}" if quantization != "none" else "")
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self.stats = {"query_batches": 0, "queries": 0, "document_batches": 0, "documents": 0}
+        self._encoder = encoder or self._load_model(model_name, quantization, onnx_file, num_threads)
+
+        self._condition = threading.Condition()
+        self._queries: deque = deque()
+        self._documents: deque = deque()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="local-embeddings", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def _load_model(model_name: str, quantization: str, onnx_file: Optional[str], num_threads: int):
+        if SentenceTransformer is None:
+            raise RuntimeError("EMBEDDING_PROVIDER=local requires the sentence-transformers package")
+        torch.set_num_threads(num_threads)
+        start = time.perf_counter()
+        if quantization == "onnx":
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            session_options.inter_op_num_threads = 1
+            model_kwargs: Dict[str, Any] = {"session_options": session_options, "provider": "CPUExecutionProvider"}
+            if onnx_file:
+                model_kwargs["file_name"] = onnx_file
+            model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            model = SentenceTransformer(model_name, device="cpu")
+            model.eval()
+            if quantization == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info(
+            f"Loaded local embedding model {model_name} ({quantization}, {num_threads} threads) "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return model
+
+    # Embeddings interface ---------------------------------------------------
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit_queries([text])[0].result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit_queries([text])[0])
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries as queries (with the query prefix), batched together."""
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in self._submit_queries(texts))))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector for future in self._submit_documents(texts) for vector in future.result()]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = await asyncio.gather(*(asyncio.wrap_future(future) for future in self._submit_documents(texts)))
+        return [vector for batch in batches for vector in batch]
+
+    # Worker -----------------------------------------------------------------
+
+    def _submit_queries(self, texts: List[str]) -> List[Future]:
+        jobs = [_EncodeJob([self.query_prefix + text]) for text in texts]
+        with self._condition:
+            self._check_open()
+            self._queries.extend(jobs)
+            self._condition.notify()
+        return [job.future for job in jobs]
+
+    def _submit_documents(self, texts: List[str]) -> List[Future]:
+        jobs = [
+            _EncodeJob([self.document_prefix + text for text in texts[start:start + self.max_batch_size]])
+            for start in range(0, len(texts), self.max_batch_size)
+        ]
+        with self._condition:
+            self._check_open()
+            self._documents.extend(jobs)
+            self._condition.notify()
+        return [job.future for job in jobs]
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("Local embedding model is closed")
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not (self._queries or self._documents or self._closed):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                if self._queries:
+                    if self.batch_wait and len(self._queries) < self.max_batch_size:
+                        deadline = time.monotonic() + self.batch_wait
+                        while len(self._queries) < self.max_batch_size and (remaining := deadline - time.monotonic()) > 0:
+                            self._condition.wait(remaining)
+                    jobs = [self._queries.popleft() for _ in range(min(len(self._queries), self.max_batch_size))]
+                    kind = "query"
+                else:
+                    jobs = [self._documents.popleft()]
+                    kind = "document"
+            self._encode(jobs, kind)
+
+    def _encode(self, jobs: List[_EncodeJob], kind: str) -> None:
+        # Callers that gave up (e.g. a cancelled request) are skipped
+        jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        texts = [text for job in jobs for text in job.texts]
+        try:
+            vectors = self._encoder.encode(
+                texts,
+                batch_size=len(texts),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        except Exception as e:
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        self.stats[f"{kind}_batches"] += 1
+        self.stats["queries" if kind == "query" else "documents"] += len(texts)
+        offset = 0
+        for job in jobs:
+            batch = vectors[offset:offset + len(job.texts)].tolist()
+            job.future.set_result(batch if kind == "document" else batch[0])
+            offset += len(job.texts)
+
+    def close(self) -> None:
+        """Stop the worker; queued jobs fail with an error."""
+        with self._condition:
+            self._closed = True
+            pending = list(self._queries) + list(self._documents)
+            self._queries.clear()
+            self._documents.clear()
+            self._condition.notify_all()
+        for job in pending:
+            job.future.set_exception(RuntimeError("Local embedding model is closed"))
@@ -0,0 +1,111 @@
+# ds-rpc-01/app/services/index_snapshot.py
+
+import os
+import re
+import json
+import shutil
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any
+
+from app.config import SNAPSHOT_MANIFEST_FILE, INGESTION_LOCK_FILE
+from app.services.ingestion_manifest import file_content_hash
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+# Left behind by the build, never part of a snapshot
+EXCLUDED_FILES = {SNAPSHOT_MANIFEST_FILE, INGESTION_LOCK_FILE}
+
+
+class SnapshotError(ValueError):
+    """A snapshot is missing, of an unsupported version or does not match its checksums."""
+
+
+def write_snapshot_manifest(directory: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the size and SHA-256 of every file in ``directory`` next to ``info``.
+
+    ``info`` describes the build (embedding model, backend, chunk count, ...);
+    the manifest is written last, so a directory with one is complete.
+    """
+    root = Path(directory)
+    (root / INGESTION_LOCK_FILE).unlink(missing_ok=True)
+    files = {}
+    for path in sorted(root.rglob("*")):
+        relative = path.relative_to(root).as_posix()
+        if path.is_file() and relative not in EXCLUDED_FILES:
+            files[relative] = {"bytes": path.stat().st_size, "sha256": file_content_hash(path)}
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **info,
+        "files": files,
+    }
+    tmp_path = root / (SNAPSHOT_MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, root / SNAPSHOT_MANIFEST_FILE)
+    return manifest
+
+
+def read_snapshot_manifest(directory: str) -> Dict[str, Any]:
+    path = Path(directory) / SNAPSHOT_MANIFEST_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotError(f"{directory} is not an index snapshot (no {SNAPSHOT_MANIFEST_FILE})")
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Error reading {path}: {e}")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported index snapshot version {manifest.get('version')}")
+    return manifest
+
+
+def verify_snapshot(directory: str) -> Dict[str, Any]:
+    """Check every file of a snapshot against its recorded size and SHA-256; returns the manifest."""
+    manifest = read_snapshot_manifest(directory)
+    root = Path(directory)
+    for relative, entry in manifest["files"].items():
+        path = root / relative
+        if not path.is_file():
+            raise SnapshotError(f"Index snapshot file {relative} is missing")
+        if path.stat().st_size != entry["bytes"] or file_content_hash(path) != entry["sha256"]:
+            raise SnapshotError(f"Index snapshot file {relative} does not match its checksum")
+    logger.info(f"Verified index snapshot {directory} ({len(manifest['files'])} files)")
+    return manifest
+
+
+def publish_snapshot(staging_directory: str, directory: str) -> str:
+    """Publish a finished snapshot at ``directory`` by flipping a symlink; returns the snapshot's real path.
+
+    The snapshot is moved to ``<directory>.<timestamp>`` and ``directory``
+    becomes a symlink to it, swapped with one ``os.replace``, so the path
+    always names a complete snapshot. The version it replaces is kept for
+    servers that are still starting from it; older ones are deleted.
+    """
+    target = Path(os.path.abspath(directory))
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    version = target.with_name(f"{target.name}.{stamp}")
+    os.replace(staging_directory, version)
+
+    previous = target.resolve() if target.is_symlink() else None
+    if target.exists() and not target.is_symlink():
+        # A snapshot published as a plain directory: move it aside once; the path is briefly missing
+        logger.warning(f"Converting {target} to a symlink; it is missing until the link is in place")
+        previous = target.with_name(f"{target.name}.{stamp}-old")
+        os.replace(target, previous)
+        previous = previous.resolve()
+
+    link = target.with_name(f"{target.name}.{stamp}.link")
+    os.symlink(version.name, link, target_is_directory=True)
+    os.replace(link, target)
+
+    pattern = re.compile(re.escape(target.name) + r"\.\d{8}T\d{12}Z(-old)?$")
+    for path in target.parent.iterdir():
+        if pattern.match(path.name) and path.resolve() not in (version.resolve(), previous) and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+    return str(version)
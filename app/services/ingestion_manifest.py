@@ -0,0 +1,177 @@
+# ds-rpc-01/app/services/ingestion_manifest.py
+
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bumped when files are chunked differently, so existing indexes are rebuilt
+MANIFEST_VERSION = 2
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_content_hash(file_path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(file_path: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """Build a stable vector store ID for a chunk of a file.
+
+    Identical chunks inside one file are told apart by their occurrence count,
+    so unchanged chunks keep their ID when the rest of the file is edited.
+    """
+    return hashlib.sha256(f"{file_path}:{chunk_hash}:{occurrence}".encode("utf-8")).hexdigest()
+
+
+def assign_chunk_ids(documents: List[Any], file_path: str, occurrences: Optional[Dict[str, int]] = None) -> List[str]:
+    """Stamp each chunk with its content hash and stable ID, returning the IDs in order.
+
+    A chunk with a parent section gets a new ID when the section changes, so a
+    reused chunk never points at a section that is gone. A file read in parts
+    passes the same ``occurrences`` dict for each part, so the parts are
+    numbered as one file.
+    """
+    occurrences = {} if occurrences is None else occurrences
+    chunk_ids = []
+    for doc in documents:
+        chunk_hash = chunk_content_hash(doc.page_content)
+        parent_id = doc.metadata.get("parent_id")
+        key = f"{parent_id}/{chunk_hash}" if parent_id else chunk_hash
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        chunk_id = make_chunk_id(file_path, key, occurrence)
+        doc.metadata["chunk_hash"] = chunk_hash
+        doc.metadata["chunk_id"] = chunk_id
+        chunk_ids.append(chunk_id)
+    return chunk_ids
+
+
+@dataclass
+class ManifestDiff:
+    """Files that were added, modified, removed or left untouched since the last ingestion."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+
+class IngestionManifest:
+    """Records the content hash and chunk IDs of every ingested file, and the embedding model used.
+
+    The manifest lives next to the persisted vector stores so that a restart only
+    re-embeds files whose bytes changed. Without a path it is kept in memory only.
+    """
+
+    def __init__(self, manifest_path: Optional[str] = None):
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.embedding_model: Optional[str] = None
+
+    def load(self) -> None:
+        if not self.manifest_path or not self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                logger.warning(f"Ignoring ingestion manifest with unsupported version {data.get('version')}")
+                return
+            self.files = data.get("files", {})
+            self.embedding_model = data.get("embedding_model")
+            logger.info(f"Loaded ingestion manifest with {len(self.files)} files")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading ingestion manifest {self.manifest_path}: {e}")
+            self.files = {}
+
+    def save(self) -> None:
+        """Write the manifest atomically so a crash never leaves a torn file behind."""
+        if not self.manifest_path:
+            return
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(self.manifest_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "embedding_model": self.embedding_model, "files": self.files},
+                f, indent=1, sort_keys=True
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def reset(self) -> None:
+        self.files = {}
+
+    def copy(self, manifest_path: Optional[str] = None) -> "IngestionManifest":
+        """Independent copy of the recorded files, saved to ``manifest_path``."""
+        manifest = IngestionManifest(manifest_path)
+        manifest.embedding_model = self.embedding_model
+        manifest.files = {path: {**entry, "chunk_ids": list(entry.get("chunk_ids", []))} for path, entry in self.files.items()}
+        return manifest
+
+    def chunk_count(self) -> int:
+        return sum(len(entry.get("chunk_ids", [])) for entry in self.files.values())
+
+    def diff(self, current_files: Dict[str, str]) -> ManifestDiff:
+        """Compare files on disk (path -> department) against the manifest.
+
+        Files whose size and mtime are unchanged are not re-hashed; otherwise the
+        content hash decides, so a touched-but-identical file is not re-embedded.
+        """
+        result = ManifestDiff()
+        for path, department in current_files.items():
+            entry = self.files.get(path)
+            if entry is None:
+                result.added.append(path)
+                continue
+            if entry.get("department") != department:
+                result.modified.append(path)
+                continue
+            stat = os.stat(path)
+            if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+                result.unchanged.append(path)
+                continue
+            if file_content_hash(Path(path)) == entry.get("content_hash"):
+                # Content is identical; refresh the stat fields so the next diff is cheap
+                entry["size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                result.unchanged.append(path)
+            else:
+                result.modified.append(path)
+
+        result.removed = [path for path in self.files if path not in current_files]
+        return result
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(path)
+
+    def update(self, path: str, department: str, chunk_ids: List[str]) -> None:
+        stat = os.stat(path)
+        self.files[path] = {
+            "department": department,
+            "content_hash": file_content_hash(Path(path)),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunk_ids": chunk_ids,
+        }
+
+    def remove(self, path: str) -> None:
+        self.files.pop(path, None)
@@ -0,0 +1,194 @@
+# ds-rpc-01/app/services/lexical_index.py
+
+import os
+import re
+import gzip
+import json
+import math
+import heapq
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Mixed letter/digit codes such as employee IDs (FINEMP1000) or product codes (SKU-2041)
+IDENTIFIER_PATTERN = re.compile(r"\b(?=[A-Za-z0-9_-]*\d)(?=[A-Za-z0-9_-]*[A-Za-z])[A-Za-z0-9][A-Za-z0-9_-]{3,}\b")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or our "
+    "please show tell that the their there these this to us was we what when where which who why will "
+    "with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def find_identifiers(text: str) -> List[str]:
+    """Identifier-like tokens in a query, e.g. ``FINEMP1000``."""
+    return IDENTIFIER_PATTERN.findall(text)
+
+
+class LexicalIndex:
+    """BM25 inverted index over the same chunks as the vector stores.
+
+    Postings are partitioned by department so a search only ever scores chunks
+    of the departments a user may read; term statistics are computed over
+    those partitions as well. Each chunk keeps its text and metadata so lexical
+    hits can be returned without a round-trip to Chroma.
+    """
+
+    def __init__(self, index_path: Optional[str] = None):
+        self.index_path = Path(index_path) if index_path else None
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # department -> term -> {chunk_id: term frequency}
+            self._postings: Dict[str, Dict[str, Dict[str, int]]] = {}
+            # chunk_id -> {"department", "length", "text", "metadata"}
+            self._chunks: Dict[str, Dict[str, Any]] = {}
+            self._department_lengths: Dict[str, int] = {}
+            self._department_counts: Dict[str, int] = {}
+            self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, chunk_id: str, department: str, text: str, metadata: Dict[str, Any]) -> None:
+        with self._lock:
+            if chunk_id in self._chunks:
+                self._remove(chunk_id)
+            tokens = tokenize(text)
+            frequencies: Dict[str, int] = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            postings = self._postings.setdefault(department, {})
+            for token, frequency in frequencies.items():
+                postings.setdefault(token, {})[chunk_id] = frequency
+            self._chunks[chunk_id] = {"department": department, "length": len(tokens), "text": text, "metadata": metadata}
+            self._department_lengths[department] = self._department_lengths.get(department, 0) + len(tokens)
+            self._department_counts[department] = self._department_counts.get(department, 0) + 1
+            self.dirty = True
+
+    def add_many(self, entries: Iterable[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        with self._lock:
+            for chunk_id, department, text, metadata in entries:
+                self.add(chunk_id, department, text, metadata)
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self._chunks:
+                    self._remove(chunk_id)
+            self.dirty = True
+
+    def _remove(self, chunk_id: str) -> None:
+        chunk = self._chunks.pop(chunk_id)
+        department = chunk["department"]
+        postings = self._postings.get(department, {})
+        for token in set(tokenize(chunk["text"])):
+            documents = postings.get(token)
+            if documents is not None:
+                documents.pop(chunk_id, None)
+                if not documents:
+                    del postings[token]
+        self._department_lengths[department] -= chunk["length"]
+        self._department_counts[department] -= 1
+
+    def search(self, query: str, departments: List[str], k: int = 5, required_terms: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (chunk_id, BM25 score) pairs from the given departments.
+
+        With ``required_terms`` only chunks containing every one of those terms
+        are scored.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            partitions = [self._postings[dept] for dept in departments if dept in self._postings]
+            if not partitions:
+                return []
+            doc_count = sum(self._department_counts.get(dept, 0) for dept in departments)
+            total_length = sum(self._department_lengths.get(dept, 0) for dept in departments)
+            if not doc_count:
+                return []
+            average_length = total_length / doc_count or 1.0
+
+            allowed = None
+            if required_terms:
+                for term in dict.fromkeys(required_terms):
+                    matches = set()
+                    for postings in partitions:
+                        matches.update(postings.get(term, ()))
+                    allowed = matches if allowed is None else allowed & matches
+                    if not allowed:
+                        return []
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings_lists = [postings[term] for postings in partitions if term in postings]
+                document_frequency = sum(len(documents) for documents in postings_lists)
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                for documents in postings_lists:
+                    for chunk_id, frequency in documents.items():
+                        if allowed is not None and chunk_id not in allowed:
+                            continue
+                        length = self._chunks[chunk_id]["length"]
+                        denominator = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (BM25_K1 + 1) / denominator
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        return self._chunks.get(chunk_id)
+
+    def load(self) -> bool:
+        """Load the persisted index; returns False if there is none or it is unreadable."""
+        if not self.index_path or not self.index_path.exists():
+            return False
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != LEXICAL_INDEX_VERSION:
+                logger.warning(f"Ignoring lexical index with unsupported version {data.get('version')}")
+                return False
+            with self._lock:
+                self.reset()
+                for chunk_id, chunk in data["chunks"].items():
+                    self.add(chunk_id, chunk["department"], chunk["text"], chunk["metadata"])
+                self.dirty = False
+            logger.info(f"Loaded lexical index with {len(self._chunks)} chunks")
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error reading lexical index {self.index_path}: {e}")
+            self.reset()
+            return False
+
+    def save(self) -> None:
+        """Write the index atomically; postings are rebuilt from the chunk texts on load."""
+        if not self.index_path or not self.dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+        with self._lock:
+            chunks = {
+                chunk_id: {"department": chunk["department"], "text": chunk["text"], "metadata": chunk["metadata"]}
+                for chunk_id, chunk in self._chunks.items()
+            }
+            self.dirty = False
+        with open(tmp_path, "wb") as raw:
+            with gzip.open(raw, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump({"version": LEXICAL_INDEX_VERSION, "chunks": chunks}, f)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, self.index_path)
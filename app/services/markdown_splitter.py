@@ -0,0 +1,256 @@
+# ds-rpc-01/app/services/markdown_splitter.py
+
+import re
+import hashlib
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.utils.tokens import count_tokens, CHARS_PER_TOKEN
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+FENCE_PATTERN = re.compile(r"^[ \t]*(```|~~~)")
+TABLE_SEPARATOR_PATTERN = re.compile(r"^[ \t]*\|?[ \t]*:?-{3,}")
+BREADCRUMB_SEPARATOR = " > "
+
+
+@dataclass
+class _Atom:
+    """Smallest unit the splitter packs: a paragraph, a code block, a table row (or part of an oversized one).
+
+    ``start``/``end`` are character offsets into the source text. Table rows
+    other than the first carry the table's header, so a chunk starting in the
+    middle of a table can repeat it.
+    """
+    start: int
+    end: int
+    tokens: int
+    table_header: Optional[str] = None
+
+
+@dataclass
+class MarkdownChunk:
+    text: str
+    start_index: Optional[int]
+
+
+@dataclass
+class MarkdownSection:
+    """Content under one heading (or consecutive sibling headings) that fits the section budget, and its chunks."""
+    heading_path: List[str]
+    text: str
+    start_index: Optional[int]
+    chunks: List[MarkdownChunk] = field(default_factory=list)
+
+    @property
+    def title(self) -> str:
+        return BREADCRUMB_SEPARATOR.join(self.heading_path)
+
+
+def make_section_id(file_path: str, text: str, occurrence: int = 0) -> str:
+    """Stable ID of a section; identical sections inside one file are told apart by occurrence."""
+    return hashlib.sha256(f"section:{file_path}:{text}:{occurrence}".encode("utf-8")).hexdigest()[:32]
+
+
+class MarkdownSectionSplitter:
+    """Splits markdown along its headings into sections, and sections into small chunks.
+
+    A heading's content runs up to the next heading; content over
+    ``section_max_tokens`` is cut at paragraph, code block or table row
+    boundaries, and consecutive small subsections of the same parent heading
+    are joined into one section while they fit. Inside each section, chunks of up to ``chunk_max_tokens`` are
+    packed from the same units and prefixed with the heading path, so a chunk
+    of "2.3.2 API Gateway" still says which document and chapter it is from.
+    Tables are never cut mid-row, and a piece of a table that does not start
+    with its header gets the header repeated. Fenced code blocks are kept
+    intact and headings inside them are ignored.
+
+    Section texts are slices of the source, so their ``start_index`` is exact;
+    only pieces that repeat a table header have none.
+    """
+
+    def __init__(self, section_max_tokens: int, chunk_max_tokens: int):
+        self.section_max_tokens = section_max_tokens
+        self.chunk_max_tokens = chunk_max_tokens
+        self._oversize_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_max_tokens * CHARS_PER_TOKEN,
+            chunk_overlap=0,
+            add_start_index=True
+        )
+
+    def split(self, text: str) -> List[MarkdownSection]:
+        pieces = [
+            (heading_path, heading_span, group)
+            for heading_path, heading_span, atoms in self._parse(text)
+            for group in self._pack(atoms, self.section_max_tokens)
+        ]
+        sections = []
+        for run in self._merge_siblings(pieces):
+            section_text, start = self._render(text, [atom for _, _, group in run for atom in group])
+            section = MarkdownSection(
+                heading_path=_common_prefix([heading_path for heading_path, _, _ in run]),
+                text=section_text,
+                start_index=start
+            )
+            for heading_path, heading_span, group in run:
+                for chunk_group in self._pack(group, self.chunk_max_tokens):
+                    chunk_text, chunk_start = self._render(text, chunk_group)
+                    # The heading itself is in the breadcrumb already when the chunk starts with it
+                    starts_with_heading = heading_span is not None and chunk_group[0].start == heading_span[0]
+                    breadcrumb = BREADCRUMB_SEPARATOR.join(heading_path[:-1] if starts_with_heading else heading_path)
+                    section.chunks.append(MarkdownChunk(
+                        text=f"{breadcrumb}\n{chunk_text}" if breadcrumb else chunk_text,
+                        start_index=chunk_start
+                    ))
+            sections.append(section)
+        return sections
+
+    def _merge_siblings(self, pieces: List[tuple]) -> List[List[tuple]]:
+        """Join consecutive small sections under the same parent heading while they fit one section."""
+        runs: List[List[tuple]] = []
+        tokens = 0
+        for piece in pieces:
+            heading_path, _, group = piece
+            size = self._group_tokens(group)
+            if runs:
+                anchor = runs[-1][0][0]
+                parent = anchor[:max(len(anchor) - 1, 0)]
+                if tokens + size <= self.section_max_tokens and heading_path[:len(parent)] == parent:
+                    runs[-1].append(piece)
+                    tokens += size
+                    continue
+            runs.append([piece])
+            tokens = size
+        return runs
+
+    def _parse(self, text: str) -> List[Tuple[List[str], Optional[Tuple[int, int]], List[_Atom]]]:
+        """Group the source into (heading path, heading line span, atoms) per heading."""
+        sections = []
+        headings: List[Tuple[int, str]] = []
+        heading_span: Optional[Tuple[int, int]] = None
+        atoms: List[_Atom] = []
+        block_start = block_end = None
+        block_kind = None
+        fence = None
+        table_lines: List[Tuple[int, int]] = []
+
+        def close_block():
+            nonlocal block_start, block_end, block_kind, table_lines
+            if block_kind == "table":
+                atoms.extend(self._table_atoms(text, table_lines))
+            elif block_kind is not None:
+                atoms.extend(self._text_atoms(text, block_start, block_end))
+            block_start = block_end = block_kind = None
+            table_lines = []
+
+        def close_section():
+            nonlocal atoms
+            close_block()
+            # A heading directly followed by a subheading has no content of its own
+            if any(heading_span is None or atom.start >= heading_span[1] for atom in atoms):
+                sections.append(([title for _, title in headings], heading_span, atoms))
+            atoms = []
+
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            line_start, offset = offset, offset + len(line)
+            line_end = line_start + len(line.rstrip("\r\n"))
+            stripped = line.strip()
+
+            if fence is not None:
+                block_end = line_end
+                if stripped.startswith(fence):
+                    fence = None
+                    close_block()
+                continue
+            fence_match = FENCE_PATTERN.match(line)
+            if fence_match:
+                close_block()
+                fence = fence_match.group(1)
+                block_start, block_end, block_kind = line_start, line_end, "code"
+                continue
+
+            heading = HEADING_PATTERN.match(stripped)
+            if heading:
+                close_section()
+                level = len(heading.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, heading.group(2)))
+                heading_span = (line_start, line_end)
+                atoms.append(_Atom(line_start, line_end, count_tokens(stripped)))
+                continue
+
+            if not stripped:
+                close_block()
+                continue
+            kind = "table" if stripped.startswith("|") else "text"
+            if block_kind != kind:
+                close_block()
+                block_start, block_kind = line_start, kind
+            block_end = line_end
+            if kind == "table":
+                table_lines.append((line_start, line_end))
+
+        close_section()
+        return sections
+
+    def _text_atoms(self, text: str, start: int, end: int) -> List[_Atom]:
+        block = text[start:end]
+        tokens = count_tokens(block)
+        if tokens <= self.chunk_max_tokens:
+            return [_Atom(start, end, tokens)]
+        atoms = []
+        for piece in self._oversize_splitter.create_documents([block]):
+            piece_start = start + piece.metadata["start_index"]
+            atoms.append(_Atom(piece_start, piece_start + len(piece.page_content), count_tokens(piece.page_content)))
+        return atoms
+
+    @staticmethod
+    def _table_atoms(text: str, lines: List[Tuple[int, int]]) -> List[_Atom]:
+        """One atom per row; the header (and its separator line) stays with the first row."""
+        header_lines = 2 if len(lines) > 1 and TABLE_SEPARATOR_PATTERN.match(text[lines[1][0]:lines[1][1]]) else 1
+        first_end = lines[min(header_lines, len(lines) - 1)][1]
+        header = text[lines[0][0]:lines[header_lines - 1][1]]
+        atoms = [_Atom(lines[0][0], first_end, count_tokens(text[lines[0][0]:first_end]))]
+        for line_start, line_end in lines[header_lines + 1:]:
+            atoms.append(_Atom(line_start, line_end, count_tokens(text[line_start:line_end]) + 1, table_header=header))
+        return atoms
+
+    @staticmethod
+    def _group_tokens(atoms: List[_Atom]) -> int:
+        header = atoms[0].table_header
+        return sum(atom.tokens for atom in atoms) + (count_tokens(header) if header else 0)
+
+    @staticmethod
+    def _pack(atoms: List[_Atom], max_tokens: int) -> List[List[_Atom]]:
+        groups: List[List[_Atom]] = []
+        tokens = 0
+        for atom in atoms:
+            if groups and tokens + atom.tokens <= max_tokens:
+                groups[-1].append(atom)
+                tokens += atom.tokens
+            else:
+                groups.append([atom])
+                tokens = atom.tokens + (count_tokens(atom.table_header) if atom.table_header else 0)
+        return groups
+
+    @staticmethod
+    def _render(text: str, atoms: List[_Atom]) -> Tuple[str, Optional[int]]:
+        """Source slice covering the atoms, with the table header repeated when they start mid-table."""
+        body = text[atoms[0].start:atoms[-1].end]
+        if atoms[0].table_header:
+            return f"{atoms[0].table_header}\n{body}", None
+        return body, atoms[0].start
+
+
+
+def _common_prefix(paths: List[List[str]]) -> List[str]:
+    prefix = list(paths[0])
+    for path in paths[1:]:
+        size = 0
+        while size < min(len(prefix), len(path)) and prefix[size] == path[size]:
+            size += 1
+        prefix = prefix[:size]
+    return prefix
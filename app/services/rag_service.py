@@ -1,11 +1,49 @@
 # ds-rpc-01/app/services/rag_service.py
 
 import os
+import re
+import time
+import asyncio
 import logging
-from typing import Dict, Any, List
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+import contextlib
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple, Callable
+from langchain_openai import ChatOpenAI
 from . import document_loader
-from app.services.vector_store import VectorStoreService
+from app.services.vector_store import VectorStoreService, generation_file_name
+from app.services.ingestion_manifest import IngestionManifest, assign_chunk_ids
+from app.services.answer_cache import AnswerCache, normalize_question
+from app.services.table_store import TableStore, TABULAR_QUESTION_PATTERN, is_tabular_question
+from app.services.context_assembler import ContextAssembler, context_token_budget
+from app.services.index_snapshot import verify_snapshot, read_snapshot_manifest
+from app.utils.rbac import ROLE_DEPARTMENTS, access_index
+from app.utils.metrics import metrics, STAGE_LATENCY, QUERIES, ERRORS, TOKENS, CACHE_LOOKUPS
+from app.utils.tokens import count_tokens
+from app.utils.single_flight import SingleFlight
+from app.utils.shared_state import open_shared_state
+from app.utils.file_lock import FileLock
+from app.config import (
+    RESOURCES_PATH,
+    LOADER_MAX_WORKERS,
+    EMBEDDING_BATCH_SIZE,
+    INGESTION_MANIFEST_FILE,
+    TABLE_STORE_FILE,
+    TABLE_QUERY_ENABLED,
+    TABLE_QUERY_MAX_ROWS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    CONTEXT_DUPLICATE_THRESHOLD,
+    REQUEST_COALESCING_ENABLED,
+    CHAT_BATCH_LLM_CONCURRENCY,
+    INDEX_READ_ONLY,
+    EMBEDDING_PROVIDER,
+    INGESTION_LOCK_FILE,
+    SHARED_STATE_PATH,
+    INDEX_SNAPSHOT_VERIFY,
+    VECTOR_INDEX_QUANTIZATION,
+)
 
 # Set up logging
 logging.basicConfig(
@@ -14,96 +52,727 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Semaphore bounding LLM calls for the batch a computation belongs to; tasks inherit it
+_llm_slots: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("llm_slots", default=None)
+
 class RagService:
     """Retrieval-Augmented Generation (RAG) service for processing queries using OpenAI's language model."""
 
-    def __init__(self, model_name="gpt-3.5-turbo", temperature=0):
-        self.document_loader = document_loader.DocumentLoader()
+    def __init__(self, model_name="gpt-3.5-turbo", temperature=0, llm=None, embedding_model=None, index_backend: Optional[str] = None):
+        """``llm`` and ``embedding_model`` replace the OpenAI clients (e.g. for offline
+        benchmarks); the API key is only required for the ones not supplied."""
+        self.document_loader = document_loader.DocumentLoader(RESOURCES_PATH, max_workers=LOADER_MAX_WORKERS)
         self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        if not self.api_key and (llm is None or (embedding_model is None and EMBEDDING_PROVIDER == "openai")):
             raise RuntimeError("OPENAI_API_KEY environment variable not set")
         self.persist_directory = None
+        self.manifest = IngestionManifest()
+        self.table_store: Optional[TableStore] = None
+        # Build details of the snapshot being served (without its file list), if any
+        self.snapshot: Optional[Dict[str, Any]] = None
         self.initialized = False
         
         # Initialize the language model and embeddings
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
-        self.embeddings = OpenAIEmbeddings(api_key=self.api_key)
-        self.vector_store = VectorStoreService(openai_api_key=self.api_key)
+        self.llm = llm or ChatOpenAI(model=model_name, temperature=temperature)
+        self.vector_store = VectorStoreService(
+            openai_api_key=self.api_key,
+            embedding_model=embedding_model,
+            index_backend=index_backend
+        )
+        self.embeddings = self.vector_store.embeddings
+        self.answer_cache = AnswerCache(
+            max_entries_per_role=ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            shared=open_shared_state(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+        )
+        self.model_name = model_name
+        self.context_assembler = ContextAssembler(
+            token_budget=context_token_budget(model_name),
+            model_name=model_name,
+            duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD
+        )
+        self.inflight = SingleFlight()
+        self._reingest_lock = asyncio.Lock()
+        self.reingest_status: Dict[str, Any] = {"state": "idle"}
+        # Called with (files done, files to ingest, chunks embedded) after every embedding batch
+        self.on_ingest_progress: Optional[Callable[[int, int, int], None]] = None
+        metrics.register_collector("rag_service", self._collect_metrics)
+
+    async def initialize(self, persist_directory: str= None, read_only: bool = INDEX_READ_ONLY):
+        """Open the stores in ``persist_directory`` and bring them up to date.
 
-    async def initialize(self, persist_directory: str= None):
+        With several worker processes, the first one to take the ingestion lock
+        updates the index while the others wait, then find it current and only
+        open it. ``read_only`` skips ingestion altogether and serves the index
+        as it was built.
+        """
         self.persist_directory = persist_directory
+        self.vector_store.persist_directory = persist_directory
+        self.table_store = TableStore(
+            os.path.join(persist_directory, TABLE_STORE_FILE) if persist_directory else None
+        )
         self.initialized = True
-        await self.load_and_create_vector_stores()
+        if read_only:
+            self._load_live_manifest()
+            self._open_prebuilt_stores()
+            return
+
+        lock = FileLock(os.path.join(persist_directory, INGESTION_LOCK_FILE)) if persist_directory else None
+        if lock is not None:
+            await asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+        try:
+            # Read under the lock: another worker may just have updated the index
+            self._load_live_manifest()
+            await self.load_and_create_vector_stores()
+        finally:
+            if lock is not None:
+                lock.release()
+
+    async def initialize_from_snapshot(self, snapshot_path: str, verify: bool = INDEX_SNAPSHOT_VERIFY) -> Dict[str, Any]:
+        """Serve a snapshot written by the offline index builder (``python -m app.build_index``).
+
+        The snapshot is checked against its checksums (reading it once, so the
+        page cache is warm) and opened read-only with the NumPy backend, which
+        memory-maps the vectors; nothing is parsed or embedded. Returns the
+        snapshot manifest.
+        """
+        # Pin the version a published symlink points at now, so a rebuild cannot switch it mid-startup
+        snapshot_path = os.path.realpath(snapshot_path)
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, verify_snapshot if verify else read_snapshot_manifest, snapshot_path)
+        if snapshot.get("quantization", "none") != VECTOR_INDEX_QUANTIZATION:
+            logger.warning(
+                f"⚠️ The snapshot was quantized as {snapshot.get('quantization')}, not {VECTOR_INDEX_QUANTIZATION}; "
+                "each worker re-encodes the vectors in memory."
+            )
+        self.vector_store.index_backend = "numpy"
+        await self.initialize(snapshot_path, read_only=True)
+        self.snapshot = {key: value for key, value in snapshot.items() if key != "files"}
+        return snapshot
+
+    def _load_live_manifest(self) -> None:
+        """Select the live generation recorded on disk and load its manifest."""
+        self.vector_store.set_live_generation(self.vector_store.read_generation_pointer())
+        self.manifest = IngestionManifest(self._manifest_path(self.vector_store.generation))
+        self.manifest.load()
+
+    def _manifest_path(self, generation: int) -> Optional[str]:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, generation_file_name(INGESTION_MANIFEST_FILE, generation))
+
+    async def reingest(self, build: bool = True) -> Dict[str, Any]:
+        """Pick up changes in the resources folder without interrupting queries.
+
+        Changes are applied to a copy of the live index generation while
+        queries keep reading the live one; the copy is swapped in once it is
+        complete and persisted. A generation built by another worker process
+        is opened and swapped in instead. With ``build=False`` (read-only
+        workers) only the latter happens.
+        """
+        if not self.initialized:
+            raise RuntimeError("RAG service not initialized")
+        async with self._reingest_lock:
+            self.reingest_status = {**self.reingest_status, "state": "running"}
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(None, self._reingest, build)
+            except Exception as e:
+                logger.error(f"❌ Re-ingestion failed, still serving generation {self.vector_store.generation}: {e}")
+                result = {"state": "failed", "error": str(e)}
+            self.reingest_status = {
+                **result,
+                "generation": self.vector_store.generation,
+                "finished_at": time.time(),
+            }
+            return self.reingest_status
+
+    def _reingest(self, build: bool) -> Dict[str, Any]:
+        if self._follow_generation():
+            return {"state": "followed"}
+        if not build:
+            return {"state": "unchanged"}
+        # Cheap stat-based check first; the ingestion lock is only taken when something changed
+        if not self.manifest.diff(self.document_loader.discover_files()).has_changes:
+            return {"state": "unchanged"}
+
+        lock = FileLock(os.path.join(self.persist_directory, INGESTION_LOCK_FILE)) if self.persist_directory else None
+        with lock or contextlib.nullcontext():
+            if self._follow_generation():
+                return {"state": "followed"}
+            current_files = self.document_loader.discover_files()
+            diff = self.manifest.diff(current_files)
+            if not diff.has_changes:
+                return {"state": "unchanged"}
+            return self._build_generation(current_files, diff)
+
+    def _build_generation(self, current_files: Dict[str, str], diff) -> Dict[str, Any]:
+        """Apply ``diff`` to a copy of the live generation, persist it and swap it in."""
+        start = time.perf_counter()
+        departments = sorted(set(current_files.values()))
+        self.vector_store.begin_generation(departments)
+        manifest = self.manifest.copy(self._manifest_path(self.vector_store.generation + 1))
+        try:
+            self.vector_store.open_stores(departments)
+            changed_departments = self._apply_diff(current_files, diff, manifest)
+            self.vector_store.persist()
+            manifest.save()
+        except Exception:
+            self.vector_store.abort_generation()
+            raise
+
+        self.vector_store.activate_generation()
+        self.manifest = manifest
+        access_index.build(current_files)
+        self._sync_tables(current_files, diff)
+        self.answer_cache.invalidate_departments(sorted(changed_departments))
+        if self.persist_directory and self.vector_store.generation >= 2:
+            Path(self._manifest_path(self.vector_store.generation - 2)).unlink(missing_ok=True)
+
+        logger.info(
+            f"✅ Index generation {self.vector_store.generation} live with {self.vector_store.document_count()} chunks "
+            f"({len(diff.added)} new, {len(diff.modified)} modified, {len(diff.removed)} removed files "
+            f"in {time.perf_counter() - start:.1f}s)."
+        )
+        return {
+            "state": "swapped",
+            "added": len(diff.added),
+            "modified": len(diff.modified),
+            "removed": len(diff.removed),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _follow_generation(self) -> bool:
+        """Swap in a newer generation that another worker process activated; True if one was."""
+        number = self.vector_store.read_generation_pointer()
+        if number <= self.vector_store.generation:
+            return False
+        manifest = IngestionManifest(self._manifest_path(number))
+        manifest.load()
+        files = {path: entry["department"] for path, entry in manifest.files.items()}
+        changed_departments = {entry["department"] for entry in self.manifest.files.values()} | set(files.values())
+        self.vector_store.open_generation(number, sorted(set(files.values())))
+        self.manifest = manifest
+        access_index.build(files)
+        self.answer_cache.invalidate_departments(sorted(changed_departments))
+        return True
+
+    async def watch_resources(self, interval: float, build: bool = True) -> None:
+        """Poll the resources folder (and the live generation on disk) every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reingest(build)
+            except Exception as e:
+                logger.error(f"Error watching resources: {e}")
+
+    def _open_prebuilt_stores(self) -> None:
+        """Open an index built by another process without ingesting or writing anything."""
+        files = {path: entry["department"] for path, entry in self.manifest.files.items()}
+        access_index.build(files)
+        self.vector_store.open_stores(sorted(set(files.values())))
+        if self.manifest.chunk_count() != self.vector_store.document_count():
+            logger.error(
+                "❌ The prebuilt index does not match its ingestion manifest; "
+                "build it by starting once without INDEX_READ_ONLY."
+            )
+        elif self.manifest.files and self.manifest.embedding_model != self.embeddings.model_name:
+            logger.error(
+                f"❌ The prebuilt index was embedded with {self.manifest.embedding_model}, "
+                f"not {self.embeddings.model_name}; rebuild it with the configured embedding provider."
+            )
+        self.vector_store.load_lexical_index()
+        self.vector_store.load_section_store()
+        logger.info(f"✅ Opened prebuilt index with {self.vector_store.document_count()} chunks (read-only).")
 
     async def load_and_create_vector_stores(self):
-        """Load documents from resources and create vector stores."""
-        logger.info("🔄 Starting document loading and vector store creation...")
+        """Bring the vector stores in line with the resources folder.
+
+        Only files that were added, modified or removed since the last run are
+        re-chunked and re-embedded; unchanged chunks of a modified file keep their IDs.
+        """
+        logger.info("🔄 Starting incremental document ingestion...")
 
         try:
-            department_docs = self.document_loader.load_all_documents()
-            if not department_docs:
+            current_files = self.document_loader.discover_files()
+            if not current_files:
                 logger.warning("⚠️ No documents found in the resources folder.")
-                return
 
-            logger.info(f"📁 Loaded documents for {len(department_docs)} departments.")
-            self.vector_store.create_department_stores(department_docs)
+            self.vector_store.open_stores(sorted(set(current_files.values())))
+            model_changed = bool(self.manifest.files) and self.manifest.embedding_model != self.embeddings.model_name
+            if model_changed:
+                logger.warning(
+                    f"⚠️ The index was embedded with {self.manifest.embedding_model}, "
+                    f"re-embedding everything with {self.embeddings.model_name}."
+                )
+            elif self.manifest.chunk_count() != self.vector_store.document_count():
+                logger.warning("⚠️ Ingestion manifest does not match the vector store, rebuilding from scratch.")
+            if model_changed or self.manifest.chunk_count() != self.vector_store.document_count():
+                self.vector_store.reset_stores()
+                self.vector_store.open_stores(sorted(set(current_files.values())))
+                self.manifest.reset()
+                self.answer_cache.clear()
+            self.manifest.embedding_model = self.embeddings.model_name
+            self.vector_store.load_lexical_index()
+            self.vector_store.load_section_store()
 
-            all_docs = [doc for docs in department_docs.values() for doc in docs]
-            if all_docs:
-                self.vector_store.create_global_store(all_docs)
-                logger.info(f"✅ Created global vector store with {len(all_docs)} total documents.")
-            else:
-                logger.warning("⚠️ No documents available to create a global vector store.")
+            diff = self.manifest.diff(current_files)
+            logger.info(
+                f"📁 {len(diff.added)} new, {len(diff.modified)} modified, "
+                f"{len(diff.removed)} removed, {len(diff.unchanged)} unchanged files."
+            )
+
+            changed_departments = self._apply_diff(current_files, diff, self.manifest)
+
+            self.vector_store.persist()
+            access_index.build(current_files)
+            self._sync_tables(current_files, diff)
+            self.answer_cache.invalidate_departments(sorted(changed_departments))
+
+            logger.info(f"✅ Vector stores ready with {self.vector_store.document_count()} total chunks.")
         except Exception as e:
             logger.error(f"❌ Error during document loading: {e}")
 
+    def _apply_diff(self, current_files: Dict[str, str], diff, manifest: IngestionManifest) -> set:
+        """Remove, re-chunk and embed the files in ``diff``; returns the departments that changed."""
+        changed_departments = {current_files[path] for path in diff.added + diff.modified}
+        changed_departments.update(manifest.get(path)["department"] for path in diff.removed + diff.modified)
+
+        for path in diff.removed:
+            entry = manifest.get(path)
+            self.vector_store.delete_documents(entry["department"], entry.get("chunk_ids", []))
+            self.vector_store.remove_sections(path)
+            manifest.remove(path)
+            manifest.save()
+
+        self._ingest_files({path: current_files[path] for path in diff.added + diff.modified}, manifest)
+        return changed_departments
+
+    def _ingest_files(self, files: Dict[str, str], manifest: IngestionManifest) -> None:
+        """Stream parsed files into the stores in fixed-size embedding batches.
+
+        Files are parsed in parallel by the document loader, and large CSVs
+        arrive in parts, one read batch at a time. New chunks are buffered until
+        a full batch is ready, and a file is recorded in the manifest only once
+        all of its chunks have been written. A file that fails part-way keeps
+        its previous version, so the next run retries it. Parent sections go
+        straight to the section store; they are not embedded.
+        """
+        pending_docs: List[Any] = []
+        pending_ids: List[str] = []
+        pending_files: List[tuple] = []
+        progress = {"files": 0, "chunks": 0}
+        # Files whose parts are still arriving
+        reading: Dict[str, Dict[str, Any]] = {}
+
+        def flush():
+            self.vector_store.add_document_batch(pending_docs, pending_ids)
+            for path, department, chunk_ids in pending_files:
+                manifest.update(path, department, chunk_ids)
+            manifest.save()
+            progress["files"] += len(pending_files)
+            progress["chunks"] += len(pending_docs)
+            if self.on_ingest_progress is not None:
+                self.on_ingest_progress(progress["files"], len(files), progress["chunks"])
+            pending_docs.clear()
+            pending_ids.clear()
+            pending_files.clear()
+
+        for path, department, docs, status in self.document_loader.iter_loaded_files(files):
+            docs, sections = document_loader.split_sections(docs)
+            state = reading.get(path)
+            if state is None:
+                # Only single-part files (Markdown) have sections
+                self.vector_store.replace_sections(path, sections)
+                state = reading[path] = {
+                    "old_ids": self._previous_chunk_ids(path, department, manifest),
+                    "chunk_ids": [],
+                    "occurrences": {},
+                    "new_ids": [],
+                }
+            chunk_ids = assign_chunk_ids(docs, path, state["occurrences"])
+            new_docs = [doc for doc, chunk_id in zip(docs, chunk_ids) if chunk_id not in state["old_ids"]]
+            state["chunk_ids"].extend(chunk_ids)
+            state["new_ids"].extend(doc.metadata["chunk_id"] for doc in new_docs)
+            pending_docs.extend(new_docs)
+            pending_ids.extend(doc.metadata["chunk_id"] for doc in new_docs)
+            if status == document_loader.FILE_FAILED:
+                del reading[path]
+                self._discard_partial_file(path, department, state["new_ids"], pending_docs, pending_ids)
+                continue
+            if status == document_loader.FILE_COMPLETE:
+                del reading[path]
+                chunk_ids = state["chunk_ids"]
+                stale_ids = list(state["old_ids"] - set(chunk_ids))
+                self.vector_store.delete_documents(department, stale_ids)
+                logger.info(f"Parsed {path}: {len(state['new_ids'])} chunks to embed, {len(stale_ids)} removed, {len(chunk_ids) - len(state['new_ids'])} reused")
+                pending_files.append((path, department, chunk_ids))
+            if len(pending_docs) >= EMBEDDING_BATCH_SIZE:
+                flush()
+        if pending_docs or pending_files:
+            flush()
+
+    def _discard_partial_file(self, path: str, department: str, new_ids: List[str], pending_docs: List[Any], pending_ids: List[str]) -> None:
+        """Drop the chunks a failed file added, buffered or already written; its old chunks stay."""
+        discarded = set(new_ids)
+        kept = [(doc, chunk_id) for doc, chunk_id in zip(pending_docs, pending_ids) if chunk_id not in discarded]
+        pending_docs[:] = [doc for doc, _ in kept]
+        pending_ids[:] = [chunk_id for _, chunk_id in kept]
+        self.vector_store.delete_documents(department, new_ids)
+        logger.warning(f"Could not read all of {path}; keeping its previous version and retrying it on the next run")
+
+    def _sync_tables(self, current_files: Dict[str, str], diff) -> None:
+        """Mirror CSV sources into the table store, loading any the store is missing."""
+        changed = set(diff.added) | set(diff.modified)
+        for path in diff.removed:
+            if path.lower().endswith(".csv"):
+                self.table_store.remove_csv(path)
+        for path, department in current_files.items():
+            if path.lower().endswith(".csv") and (path in changed or not self.table_store.has_file(path)):
+                self.table_store.ingest_csv(path, department)
+
+    def _previous_chunk_ids(self, path: str, department: str, manifest: IngestionManifest) -> set:
+        """Chunk IDs of a file's last ingested version; a file that moved department has its chunks removed instead."""
+        previous = manifest.get(path)
+        if previous and previous.get("department") != department:
+            self.vector_store.delete_documents(previous["department"], previous.get("chunk_ids", []))
+            manifest.remove(path)
+            return set()
+        return set(previous.get("chunk_ids", [])) if previous else set()
+
     async def query(self, question: str, user_role: str, user_context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Process a user query using RAG with detailed features."""
+        """Process a user query using RAG with detailed features.
+
+        Concurrent identical questions from the same role share one computation.
+        """
+        if not self.initialized:
+            raise RuntimeError("RAG service not initialized")
+
+        QUERIES.inc(user_role)
+        if not REQUEST_COALESCING_ENABLED:
+            return await self._answer(question, user_role, user_context)
+        key = (user_role, normalize_question(question))
+        result = await self.inflight.do(key, lambda: self._answer(question, user_role, user_context))
+        # Coalesced callers each get their own copy of the shared result
+        return dict(result)
+
+    async def query_batch(self, questions: List[str], user_role: str, user_context: Dict[str, Any] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Answer several questions, yielding ``(index, result)`` as each one completes.
+
+        Questions that need an embedding are embedded in one batched call, the
+        searches run concurrently and at most CHAT_BATCH_LLM_CONCURRENCY LLM
+        calls of the batch are in flight at once. A failed question yields a
+        result with an ``error`` key; the others are unaffected. Closing the
+        generator cancels the questions still running.
+        """
         if not self.initialized:
             raise RuntimeError("RAG service not initialized")
 
+        for _ in questions:
+            QUERIES.inc(user_role)
+        cached = {question: await self.answer_cache.alookup_exact(user_role, question) for question in dict.fromkeys(questions)}
+        embeddings = await self._embed_batch([question for question, hit in cached.items() if hit is None])
+        token = _llm_slots.set(asyncio.Semaphore(CHAT_BATCH_LLM_CONCURRENCY))
         try:
-            relevant_docs = await self.retrieve_relevant_documents(question, user_role)
-            if not relevant_docs:
+            tasks = {
+                asyncio.ensure_future(self._answer_one(question, user_role, user_context, embeddings.get(question), cached[question])): index
+                for index, question in enumerate(questions)
+            }
+        finally:
+            _llm_slots.reset(token)
+
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.get):
+                    yield tasks[task], task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _embed_batch(self, questions: List[str]) -> Dict[str, List[float]]:
+        """Embed the distinct questions that will need an embedding, in one call."""
+        texts = [question for question in questions if not self.vector_store.is_identifier_query(question)]
+        if not texts:
+            return {}
+        try:
+            with STAGE_LATENCY.time("embedding"):
+                vectors = await self.embeddings.aembed_queries(texts)
+        except Exception as e:
+            # Each question embeds itself instead and reports its own error
+            logger.warning(f"Batched query embedding failed, embedding questions one by one: {e}")
+            return {}
+        return dict(zip(texts, vectors))
+
+    async def _answer_one(self, question: str, user_role: str, user_context: Optional[Dict[str, Any]],
+                          query_embedding: Optional[List[float]], cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # The batch already looked the question up in the exact cache
+        if cached is not None:
+            CACHE_LOOKUPS.inc(user_role, "exact_hit")
+            return dict(cached)
+        compute = lambda: self._answer(question, user_role, user_context, query_embedding, exact_checked=True)
+        try:
+            if not REQUEST_COALESCING_ENABLED:
+                return await compute()
+            return dict(await self.inflight.do((user_role, normalize_question(question)), compute))
+        except Exception as e:
+            logger.error(f"Error processing batch question: {e}")
+            return {"response": f"An error occurred: {str(e)}", "sources": [], "error": str(e)}
+
+    async def _answer(self, question: str, user_role: str, user_context: Dict[str, Any] = None,
+                      query_embedding: Optional[List[float]] = None, exact_checked: bool = False) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            cached = None if exact_checked else await self.answer_cache.alookup_exact(user_role, question)
+            if cached is not None:
+                CACHE_LOOKUPS.inc(user_role, "exact_hit")
+                return cached
+            # Identifier lookups skip embedding; near-duplicates of them ask about a different ID
+            if self.vector_store.is_identifier_query(question):
+                query_embedding = None
+            else:
+                if query_embedding is None:
+                    with STAGE_LATENCY.time("embedding"):
+                        query_embedding = await self.embeddings.aembed_query(question)
+                cached = await self.answer_cache.alookup_similar(user_role, query_embedding)
+                if cached is not None:
+                    CACHE_LOOKUPS.inc(user_role, "semantic_hit")
+                    return cached
+            CACHE_LOOKUPS.inc(user_role, "miss")
+
+            retrieved = await self._retrieve_context(question, user_role, query_embedding)
+            if retrieved is None:
                 return {
                     "response": "I couldn't find relevant information for your query.",
                     "sources": [],
                     "confidence": 0.0,
                 }
 
-            context = await self._prepare_context(relevant_docs)
+            context, sources = retrieved
             response = await self._generate_response(question, context, user_role, user_context)
-            sources = await self._prepare_sources(relevant_docs)
 
-            return {
+            result = {
                 "response": response,
                 "sources": sources,
             }
+            await self.answer_cache.astore(
+                user_role, question, result,
+                embedding=query_embedding,
+                departments=self._role_departments(user_role)
+            )
+            return result
         except Exception as e:
             logger.error(f"Error processing query: {e}")
+            ERRORS.inc(user_role)
             return {
                 "response": f"An error occurred: {str(e)}",
                 "sources": [],
+                "error": str(e),
             }
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - start, "total")
 
-    async def retrieve_relevant_documents(self, question: str, user_role: str) -> List[str]:
-        """Retrieve relevant documents based on the user's question and role."""
-        return self.vector_store.similarity_search(question, user_role)
+    async def stream_query(self, question: str, user_role: str, user_context: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a RAG answer as events: ``sources`` first, then ``token`` chunks, then ``done``.
 
-    async def _prepare_context(self, documents: List[Any]) -> str:
-        return "\n".join([doc.page_content for doc in documents])
+        Closing the generator (e.g. when the client disconnects) closes the LLM
+        stream as well, so abandoned requests stop consuming tokens.
+        """
+        if not self.initialized:
+            raise RuntimeError("RAG service not initialized")
 
+        QUERIES.inc(user_role)
+        start = time.perf_counter()
+        try:
+            cached = await self.answer_cache.alookup_exact(user_role, question)
+            cache_result = "exact_hit"
+            query_embedding = None
+            if cached is None and not self.vector_store.is_identifier_query(question):
+                with STAGE_LATENCY.time("embedding"):
+                    query_embedding = await self.embeddings.aembed_query(question)
+                cached = await self.answer_cache.alookup_similar(user_role, query_embedding)
+                cache_result = "semantic_hit"
+            CACHE_LOOKUPS.inc(user_role, cache_result if cached is not None else "miss")
+            if cached is not None:
+                yield {"event": "sources", "data": cached["sources"]}
+                yield {"event": "token", "data": cached["response"]}
+                yield {"event": "done", "data": {"cached": True}}
+                return
 
-    async def _generate_response(self, question: str, context: str, user_role: str, user_context: Dict[str, Any]) -> str:
+            retrieved = await self._retrieve_context(question, user_role, query_embedding)
+            if retrieved is None:
+                yield {"event": "sources", "data": []}
+                yield {"event": "token", "data": "I couldn't find relevant information for your query."}
+                yield {"event": "done", "data": {"cached": False}}
+                return
+
+            context, sources = retrieved
+            yield {"event": "sources", "data": sources}
+
+            prompt = self._build_prompt(question, context, user_role)
+            parts = []
+            llm_start = time.perf_counter()
+            stream = self.llm.astream(prompt)
+            try:
+                async for chunk in stream:
+                    if chunk.content:
+                        if not parts:
+                            STAGE_LATENCY.observe(time.perf_counter() - llm_start, "llm_first_token")
+                        parts.append(chunk.content)
+                        yield {"event": "token", "data": chunk.content}
+            finally:
+                await stream.aclose()
+                STAGE_LATENCY.observe(time.perf_counter() - llm_start, "llm")
+                TOKENS.inc(user_role, "in", amount=count_tokens(prompt, self.model_name))
+                TOKENS.inc(user_role, "out", amount=count_tokens("".join(parts), self.model_name))
+
+            await self.answer_cache.astore(
+                user_role, question, {"response": "".join(parts), "sources": sources},
+                embedding=query_embedding,
+                departments=self._role_departments(user_role)
+            )
+            yield {"event": "done", "data": {"cached": False}}
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            ERRORS.inc(user_role)
+            yield {"event": "error", "data": f"An error occurred: {str(e)}"}
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - start, "total")
+
+    @staticmethod
+    def _role_departments(user_role: str) -> Optional[List[str]]:
+        """Departments a role's answers can draw from; None means any department."""
+        return ROLE_DEPARTMENTS.get(user_role)
+
+    async def _retrieve_context(self, question: str, user_role: str, query_embedding: Optional[List[float]]) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Return (context, sources) from the table store or the vector store, or None if nothing matched."""
+        table_result = await self._query_tables(question, user_role)
+        if table_result is not None:
+            return table_result
+
+        with STAGE_LATENCY.time("vector_search"):
+            relevant_docs = await self.retrieve_relevant_documents(question, user_role, query_embedding)
+        if not relevant_docs:
+            return None
+        with STAGE_LATENCY.time("context_prep"):
+            context, used_docs = await self._prepare_context(relevant_docs)
+            return context, await self._prepare_sources(used_docs)
+
+    async def _query_tables(self, question: str, user_role: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Answer aggregate/filter questions with SQL over the role's CSV tables.
+
+        The LLM writes the query, SQLite computes the result, and only that result
+        is passed on as context. Returns None to fall back to document retrieval.
+        """
+        if not TABLE_QUERY_ENABLED or self.table_store is None or not TABULAR_QUESTION_PATTERN.search(question):
+            return None
+        loop = asyncio.get_running_loop()
+        tables = await loop.run_in_executor(None, self.table_store.tables_for_departments, self._role_departments(user_role) or [])
+        if not tables or not is_tabular_question(question, tables):
+            return None
+
+        try:
+            with STAGE_LATENCY.time("table_query"):
+                sql = await self._generate_sql(question, tables, user_role)
+                if not sql:
+                    return None
+                columns, rows, truncated = await loop.run_in_executor(
+                    None, self.table_store.execute, sql, [table["table_name"] for table in tables], TABLE_QUERY_MAX_ROWS
+                )
+        except Exception as e:
+            logger.warning(f"Table query failed, falling back to document retrieval: {e}")
+            return None
+
+        used_tables = [table for table in tables if table["table_name"] in sql]
+        context = (
+            f"Exact result of the SQL query `{sql}` over {', '.join(t['filename'] for t in used_tables)}:\n"
+            f"{TableStore.format_result(columns, rows, truncated)}"
+        )
+        sources = [{"filename": table["filename"], "summary": f"Computed with SQL: {sql}"} for table in used_tables]
+        logger.info(f"Answered from tables with {len(rows)} result rows: {sql}")
+        return context, sources
+
+    async def _generate_sql(self, question: str, tables: List[Dict[str, Any]], user_role: str) -> Optional[str]:
         prompt = (
+            "You write SQLite queries.\n"
+            f"{TableStore.describe(tables)}\n"
+            f"Question: {question}\n"
+            "Write one SQLite SELECT statement that answers the question using only these tables. "
+            "Return only the SQL, without explanation or code fences. "
+            "If the tables cannot answer the question, return NONE."
+        )
+        async with self._llm_slot():
+            response_obj = await self.llm.ainvoke(prompt)
+        self._record_tokens(user_role, prompt, response_obj)
+        sql = re.sub(r"^```(?:sql)?|```$", "", response_obj.content.strip(), flags=re.IGNORECASE).strip()
+        if not sql or sql.upper().startswith("NONE"):
+            return None
+        return sql
+
+    async def retrieve_relevant_documents(self, question: str, user_role: str, query_embedding: Optional[List[float]] = None) -> List[Any]:
+        """Retrieve relevant documents based on the user's question and role."""
+        return await self.vector_store.asimilarity_search(question, user_role, query_embedding)
+
+    async def _prepare_context(self, documents: List[Any]) -> Tuple[str, List[Any]]:
+        """Pack retrieved chunks into the model's context budget; returns (context, chunks used)."""
+        return self.context_assembler.assemble(documents)
+
+
+    def _build_prompt(self, question: str, context: str, user_role: str) -> str:
+        return (
             f"User Role: {user_role}\n"
             f"User Question: {question}\n"
             f"Relevant Sources:\n{context}\n"
             "Based on the above sources, provide a detailed answer."
         )
-        response_obj = await self.llm.ainvoke(prompt)
+
+    async def _generate_response(self, question: str, context: str, user_role: str, user_context: Dict[str, Any]) -> str:
+        prompt = self._build_prompt(question, context, user_role)
+        async with self._llm_slot():
+            with STAGE_LATENCY.time("llm"):
+                response_obj = await self.llm.ainvoke(prompt)
+        self._record_tokens(user_role, prompt, response_obj)
         return response_obj.content  # ✅ this is the correct way
 
+    @staticmethod
+    def _llm_slot():
+        """The batch's LLM concurrency slot, or no limit outside a batch."""
+        slots = _llm_slots.get()
+        return slots if slots is not None else contextlib.nullcontext()
+
+    def _record_tokens(self, user_role: str, prompt: str, response_obj: Any) -> None:
+        """Count LLM tokens from the provider's usage data, estimating when it is absent."""
+        usage = getattr(response_obj, "usage_metadata", None) or {}
+        TOKENS.inc(user_role, "in", amount=usage.get("input_tokens") or count_tokens(prompt, self.model_name))
+        TOKENS.inc(user_role, "out", amount=usage.get("output_tokens") or count_tokens(response_obj.content, self.model_name))
+
+    def _collect_metrics(self) -> List[tuple]:
+        """Gauges read at scrape time from the caches and the vector store."""
+        embedding_stats = {"hits": self.embeddings.hits, "misses": self.embeddings.misses} \
+            if hasattr(self.embeddings, "hits") else {}
+        samples = [
+            ("rag_embedding_cache_lookups", "Embedding cache lookups since start", {"result": result}, value)
+            for result, value in embedding_stats.items()
+        ]
+        samples.extend(
+            ("rag_answer_cache", "Answer cache counters since start", {"stat": stat}, value)
+            for stat, value in self.answer_cache.get_stats().items()
+        )
+        local_stats = getattr(self.embeddings.underlying, "stats", None) or {}
+        samples.extend(
+            ("rag_local_embedding", "Local embedding model batches and inputs since start", {"stat": stat}, value)
+            for stat, value in local_stats.items()
+        )
+        samples.extend(
+            ("rag_query_coalescing", "Query coalescing counters since start", {"stat": stat}, value)
+            for stat, value in self.inflight.stats.items()
+        )
+        samples.append(("rag_queries_in_flight", "Distinct queries being computed", {}, self.inflight.in_flight()))
+        samples.append(("rag_indexed_chunks", "Chunks in the vector store", {}, self.vector_store.document_count()))
+        samples.append(("rag_index_generation", "Live index generation", {}, self.vector_store.generation))
+        return samples
+
     async def _prepare_sources(self, documents: List[Any]) -> List[Dict[str, str]]:
         return [
             {
@@ -117,6 +786,9 @@ class RagService:
     async def cleanup(self):
         """Cleanup resources if needed."""
         logger.info("Cleaning up RAG service resources.")
+        self.vector_store.close()
+        if self.table_store is not None:
+            self.table_store.close()
 
 # Create a singleton instance
 rag_service = RagService()
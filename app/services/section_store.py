@@ -0,0 +1,142 @@
+# ds-rpc-01/app/services/section_store.py
+
+import os
+import gzip
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+SECTION_STORE_VERSION = 1
+# Per-section metadata; everything else is shared by the sections of a file and stored once
+SECTION_KEYS = ("section", "start_index")
+
+
+class SectionStore:
+    """Parent sections of the indexed chunks, keyed by section ID.
+
+    Only the small chunks inside a section are embedded; their ``parent_id``
+    points here, and searches return the section instead of the chunk. The
+    store holds each section's text and its own few metadata fields, with
+    the metadata common to a file (department, filename, ...) kept once per
+    file, and is persisted as one gzipped JSON file next to the lexical index.
+    """
+
+    def __init__(self, store_path: Optional[str] = None):
+        self.store_path = Path(store_path) if store_path else None
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # file_path -> {"metadata": shared metadata, "section_ids": [...]}
+            self._files: Dict[str, Dict[str, Any]] = {}
+            # section_id -> (file_path, text, per-section metadata)
+            self._sections: Dict[str, tuple] = {}
+            self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def get(self, section_id: str) -> Optional[Document]:
+        entry = self._sections.get(section_id)
+        if entry is None:
+            return None
+        file_path, text, metadata = entry
+        file_entry = self._files.get(file_path)
+        if file_entry is None:
+            return None
+        return Document(page_content=text, metadata={**file_entry["metadata"], **metadata, "section_id": section_id})
+
+    def replace_file(self, file_path: str, sections: List[Document]) -> None:
+        """Store the sections of a file in place of the ones it had."""
+        with self._lock:
+            self._remove_file(file_path)
+            if sections:
+                shared = {
+                    key: value for key, value in sections[0].metadata.items()
+                    if key not in SECTION_KEYS and key not in ("section_id", "content_type")
+                }
+                self._files[file_path] = {"metadata": shared, "section_ids": []}
+                for section in sections:
+                    self._add(file_path, section.metadata["section_id"], section.page_content, {
+                        key: section.metadata[key] for key in SECTION_KEYS if key in section.metadata
+                    })
+            self.dirty = True
+
+    def remove_file(self, file_path: str) -> None:
+        with self._lock:
+            self._remove_file(file_path)
+            self.dirty = True
+
+    def _add(self, file_path: str, section_id: str, text: str, metadata: Dict[str, Any]) -> None:
+        self._sections[section_id] = (file_path, text, metadata)
+        self._files[file_path]["section_ids"].append(section_id)
+
+    def _remove_file(self, file_path: str) -> None:
+        entry = self._files.pop(file_path, None)
+        if entry is not None:
+            for section_id in entry["section_ids"]:
+                self._sections.pop(section_id, None)
+
+    def copy(self, store_path: Optional[str] = None) -> "SectionStore":
+        """Independent copy of the stored sections, saved to ``store_path``."""
+        store = SectionStore(store_path)
+        with self._lock:
+            store._files = {
+                path: {"metadata": dict(entry["metadata"]), "section_ids": list(entry["section_ids"])}
+                for path, entry in self._files.items()
+            }
+            store._sections = dict(self._sections)
+        return store
+
+    def load(self) -> bool:
+        """Load the persisted store; returns False if there is none or it is unreadable."""
+        if not self.store_path or not self.store_path.exists():
+            return False
+        try:
+            with gzip.open(self.store_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != SECTION_STORE_VERSION:
+                logger.warning(f"Ignoring section store with unsupported version {data.get('version')}")
+                return False
+            with self._lock:
+                self.reset()
+                for file_path, entry in data["files"].items():
+                    self._files[file_path] = {"metadata": entry["metadata"], "section_ids": []}
+                    for section_id, text, metadata in entry["sections"]:
+                        self._add(file_path, section_id, text, metadata)
+                self.dirty = False
+            logger.info(f"Loaded section store with {len(self._sections)} sections")
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error reading section store {self.store_path}: {e}")
+            self.reset()
+            return False
+
+    def save(self) -> None:
+        """Write the store atomically."""
+        if not self.store_path or not self.dirty:
+            return
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.store_path.with_suffix(self.store_path.suffix + ".tmp")
+        with self._lock:
+            files = {
+                file_path: {
+                    "metadata": entry["metadata"],
+                    "sections": [[section_id, *self._sections[section_id][1:]] for section_id in entry["section_ids"]],
+                }
+                for file_path, entry in self._files.items()
+            }
+            self.dirty = False
+        with open(tmp_path, "wb") as raw:
+            with gzip.open(raw, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump({"version": SECTION_STORE_VERSION, "files": files}, f)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, self.store_path)
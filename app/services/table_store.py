@@ -0,0 +1,279 @@
+# ds-rpc-01/app/services/table_store.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+READ_BATCH_ROWS = 10000
+# A load waits this long for another process's load to commit
+LOAD_BUSY_TIMEOUT_SECONDS = 60
+# Text columns with at most this many distinct values have them listed in the schema prompt
+MAX_LISTED_VALUES = 20
+
+# Aggregate and filter phrasing; bare comparisons only count when a number follows
+TABULAR_QUESTION_PATTERN = re.compile(
+    r"\b(average|avg|mean|median|sum|total number|in total|count|how many|number of|maximum|minimum|"
+    r"highest|lowest|top \d+|bottom \d+|greater than|less than|more than|fewer than|"
+    r"(?:above|below|over|under|at least|at most) \d|between \d+ and \d+|list all|which employees|"
+    r"who has|who have|by department|per department|distribution|breakdown|ranked by|percentage|ratio)\b"
+    r"|[<>]=?\s*\d",
+    re.IGNORECASE
+)
+# Column-name words shorter than this ("id", "date", ...) are too generic to point at a table
+MIN_TERM_LENGTH = 5
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase word tokens with a plural "s" dropped, so "salaries" and "employees" match their columns."""
+    return [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in re.findall(r"[a-z0-9]+", str(text).lower())]
+
+
+def table_terms(tables: List[Dict[str, Any]]) -> set:
+    """Phrases that refer to one of ``tables``: column names, their longer words and listed values."""
+    terms = set()
+    for table in tables:
+        for column in table["columns"]:
+            words = _words(column["name"].replace("_", " "))
+            terms.add(" ".join(words))
+            terms.update(word for word in words if len(word) >= MIN_TERM_LENGTH)
+            terms.update(" ".join(_words(value)) for value in column.get("values", []))
+    terms.discard("")
+    return terms
+
+
+def is_tabular_question(question: str, tables: List[Dict[str, Any]]) -> bool:
+    """Heuristic for aggregate or filter questions that a SQL query over ``tables`` answers exactly.
+
+    The question needs aggregate or filter phrasing and must mention one of
+    the tables' columns or listed values; anything else goes straight to
+    document retrieval without the SQL-writing LLM call.
+    """
+    if not TABULAR_QUESTION_PATTERN.search(question):
+        return False
+    text = f" {' '.join(_words(question))} "
+    return any(f" {term} " in text for term in table_terms(tables))
+
+
+def _identifier(name: str) -> str:
+    identifier = re.sub(r"[^0-9a-zA-Z_]+", "_", str(name)).strip("_").lower()
+    if not identifier or identifier[0].isdigit():
+        identifier = f"c_{identifier}"
+    return identifier
+
+
+def _sql_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+class TableStore:
+    """CSV sources loaded into typed, indexed SQLite tables.
+
+    Aggregate and filter questions are answered by running a read-only SELECT
+    over these tables instead of asking the LLM to do arithmetic over text
+    chunks. A SQLite authorizer restricts each query to the tables of the
+    departments the user may read.
+
+    Queries share one connection; each CSV is loaded through a connection of
+    its own in a single transaction, with the database in WAL mode, so queries
+    keep reading the previous version of a table until the new one commits.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        else:
+            # Loads need a second connection, which a private in-memory database cannot have
+            self._temp_dir = tempfile.TemporaryDirectory(prefix="table_store_")
+            db_path = os.path.join(self._temp_dir.name, "tables.sqlite3")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _tables ("
+            "table_name TEXT PRIMARY KEY, file_path TEXT UNIQUE NOT NULL, department TEXT NOT NULL, "
+            "filename TEXT NOT NULL, columns TEXT NOT NULL, row_count INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def has_file(self, file_path: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM _tables WHERE file_path = ?", (file_path,)).fetchone()
+        return row is not None
+
+    def ingest_csv(self, file_path: str, department: str) -> Optional[str]:
+        """(Re)load a CSV file into its own table, reading it in row batches."""
+        path = Path(file_path)
+        table_name = _identifier(f"{department}_{path.stem}")
+        conn = sqlite3.connect(self.db_path, timeout=LOAD_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            self._drop(conn, file_path)
+            owner = conn.execute("SELECT file_path FROM _tables WHERE table_name = ?", (table_name,)).fetchone()
+            if owner:
+                # Another file in the department has the same stem
+                table_name = f"{table_name}_{hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:8]}"
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            columns: List[Dict[str, Any]] = []
+            row_count = 0
+            for frame in pd.read_csv(path, chunksize=READ_BATCH_ROWS, low_memory=False):
+                if not columns:
+                    columns = [
+                        {"name": _identifier(column), "source": str(column), "type": _sql_type(frame[column])}
+                        for column in frame.columns
+                    ]
+                    column_defs = ", ".join(f'"{c["name"]}" {c["type"]}' for c in columns)
+                    conn.execute(f'CREATE TABLE "{table_name}" ({column_defs})')
+                placeholders = ", ".join("?" * len(columns))
+                frame = frame.astype(object).where(frame.notna(), None)
+                conn.executemany(
+                    f'INSERT INTO "{table_name}" VALUES ({placeholders})',
+                    frame.itertuples(index=False, name=None)
+                )
+                row_count += len(frame)
+            if not columns:
+                conn.execute("ROLLBACK")
+                return None
+
+            for column in columns:
+                conn.execute(
+                    f'CREATE INDEX "idx_{table_name}_{column["name"]}" ON "{table_name}" ("{column["name"]}")'
+                )
+                if column["type"] == "TEXT":
+                    values = conn.execute(
+                        f'SELECT DISTINCT "{column["name"]}" FROM "{table_name}" LIMIT {MAX_LISTED_VALUES + 1}'
+                    ).fetchall()
+                    if len(values) <= MAX_LISTED_VALUES:
+                        column["values"] = [value for (value,) in values if value is not None]
+
+            conn.execute(
+                "INSERT INTO _tables (table_name, file_path, department, filename, columns, row_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name, file_path, department, path.name, json.dumps(columns), row_count)
+            )
+            conn.execute("COMMIT")
+            logger.info(f"Loaded {path.name} into table {table_name}: {row_count} rows, {len(columns)} columns")
+            return table_name
+        except Exception as e:
+            logger.error(f"Error loading CSV {file_path} into table store: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return None
+        finally:
+            conn.close()
+
+    def remove_csv(self, file_path: str) -> None:
+        with self._lock:
+            self._drop(self._conn, file_path)
+            self._conn.commit()
+
+    @staticmethod
+    def _drop(conn: sqlite3.Connection, file_path: str) -> None:
+        row = conn.execute("SELECT table_name FROM _tables WHERE file_path = ?", (file_path,)).fetchone()
+        if row:
+            conn.execute(f'DROP TABLE IF EXISTS "{row[0]}"')
+            conn.execute("DELETE FROM _tables WHERE file_path = ?", (file_path,))
+
+    def tables_for_departments(self, departments: List[str]) -> List[Dict[str, Any]]:
+        if not departments:
+            return []
+        placeholders = ", ".join("?" * len(departments))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT table_name, department, filename, columns, row_count FROM _tables WHERE department IN ({placeholders})",
+                departments
+            ).fetchall()
+        return [
+            {"table_name": name, "department": dept, "filename": filename, "columns": json.loads(columns), "row_count": row_count}
+            for name, dept, filename, columns, row_count in rows
+        ]
+
+    @staticmethod
+    def describe(tables: List[Dict[str, Any]]) -> str:
+        """Schema description for the SQL-writing prompt."""
+        lines = []
+        for table in tables:
+            lines.append(f'Table "{table["table_name"]}" ({table["row_count"]} rows, from {table["filename"]}):')
+            for column in table["columns"]:
+                line = f'  - {column["name"]} {column["type"]}'
+                if column.get("values"):
+                    line += f' (values: {", ".join(map(str, column["values"]))})'
+                lines.append(line)
+        return "\n".join(lines)
+
+    def execute(self, sql: str, allowed_tables: List[str], max_rows: int = 50, timeout_seconds: float = 5.0) -> Tuple[List[str], List[tuple], bool]:
+        """Run a single read-only SELECT limited to ``allowed_tables``.
+
+        Returns (column names, rows, truncated). Raises ValueError for anything
+        that is not a single SELECT and sqlite3.DatabaseError when the query
+        touches a table outside the allowed set or runs past ``timeout_seconds``.
+        """
+        statement = sql.strip().rstrip(";").strip()
+        if ";" in statement or not re.match(r"^(select|with)\b", statement, re.IGNORECASE):
+            raise ValueError("Only a single SELECT statement is allowed")
+
+        allowed = set(allowed_tables)
+
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+                return sqlite3.SQLITE_OK
+            if action == sqlite3.SQLITE_READ:
+                return sqlite3.SQLITE_OK if arg1 in allowed else sqlite3.SQLITE_DENY
+            return sqlite3.SQLITE_DENY
+
+        deadline = time.monotonic() + timeout_seconds
+
+        with self._lock:
+            self._conn.set_authorizer(authorizer)
+            # A non-zero return from the progress handler interrupts the query
+            self._conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+            try:
+                cursor = self._conn.execute(statement)
+                rows = cursor.fetchmany(max_rows + 1)
+                columns = [description[0] for description in cursor.description or []]
+            finally:
+                self._conn.set_authorizer(None)
+                self._conn.set_progress_handler(None, 0)
+        return columns, rows[:max_rows], len(rows) > max_rows
+
+    @staticmethod
+    def format_result(columns: List[str], rows: List[tuple], truncated: bool) -> str:
+        lines = [" | ".join(columns)]
+        lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in rows)
+        if truncated:
+            lines.append(f"(only the first {len(rows)} rows are shown)")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        """Fold the write-ahead log back into the database file and close it.
+
+        Leaves a single self-contained file, as index snapshots need. The log
+        stays while another process still has the database open.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._conn.execute("PRAGMA journal_mode=DELETE")
+            except sqlite3.OperationalError:
+                pass
+            self._conn.close()
+            self._closed = True
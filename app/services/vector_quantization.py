@@ -0,0 +1,192 @@
+# ds-rpc-01/app/services/vector_quantization.py
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # k-means falls back to NumPy
+    faiss = None
+
+
+# Rows scored per block, bounding the float32 temporaries a search allocates
+SCORE_BLOCK_ROWS = 16384
+PQ_CENTROIDS = 256
+PQ_TRAIN_ROWS = 65536
+PQ_TRAIN_ITERATIONS = 20
+
+
+class VectorQuantizer(ABC):
+    """Compact codes for unit vectors and approximate inner products against them.
+
+    ``fit`` learns whatever the codes need from the stored vectors, ``encode``
+    turns float32 rows into codes, and ``scores`` returns approximate
+    query-row inner products of shape (queries, rows).
+    """
+
+    mode: str
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """Learn the code parameters; quantizers without any need not override."""
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        ...
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            result[:, start:end] = self._score_block(queries, codes[start:end])
+        return result
+
+    @abstractmethod
+    def _score_block(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        ...
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to rebuild the quantizer, saved next to the codes."""
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore the arrays returned by ``state``."""
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.state().values())
+
+
+class Float16Quantizer(VectorQuantizer):
+    """Half-precision copies of the vectors: half the memory, near-exact scores."""
+
+    mode = "float16"
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float16)
+
+    def _score_block(self, queries, codes):
+        return queries @ codes.astype(np.float32).T
+
+
+class Int8Quantizer(VectorQuantizer):
+    """Per-dimension scalar quantization to one byte: a quarter of the memory.
+
+    Each dimension's range over the stored vectors is split into 255 steps;
+    a vector is ``offset + scale * code``, so its inner product with a query
+    is ``query . offset + (query * scale) . code``.
+    """
+
+    mode = "int8"
+
+    def __init__(self):
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    def fit(self, vectors):
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def _score_block(self, queries, codes):
+        return (queries * self.scale) @ codes.astype(np.float32).T + (queries @ self.offset)[:, None]
+
+    def state(self):
+        return {"offset": self.offset, "scale": self.scale}
+
+    def load_state(self, state):
+        self.offset, self.scale = state["offset"], state["scale"]
+
+
+class ProductQuantizer(VectorQuantizer):
+    """Product quantization: each vector is cut into ``subvectors`` pieces and
+    every piece is stored as the index of its nearest of 256 learned centroids.
+
+    A vector takes ``subvectors`` bytes (e.g. 192 bytes instead of 6 KB for
+    1536 dimensions). Scores use per-query lookup tables of piece-centroid
+    inner products, so they never decode a vector.
+    """
+
+    mode = "pq"
+
+    def __init__(self, subvectors: int = 0):
+        self.subvectors = subvectors
+        self.centroids: Optional[np.ndarray] = None  # (subvectors, centroids, piece dimensions)
+
+    def _subvector_count(self, dimensions: int) -> int:
+        count = min(self.subvectors or max(dimensions // 8, 1), dimensions)
+        while dimensions % count:
+            count -= 1
+        return count
+
+    def fit(self, vectors):
+        count = self._subvector_count(vectors.shape[1])
+        sample = vectors
+        if len(vectors) > PQ_TRAIN_ROWS:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), PQ_TRAIN_ROWS, replace=False)]
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        centroid_count = min(PQ_CENTROIDS, len(sample))
+        pieces = sample.reshape(len(sample), count, -1)
+        self.centroids = np.stack([
+            _kmeans(np.ascontiguousarray(pieces[:, i, :]), centroid_count) for i in range(count)
+        ])
+
+    def encode(self, vectors):
+        count, _, width = self.centroids.shape
+        pieces = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), count, width)
+        codes = np.empty((len(vectors), count), dtype=np.uint8)
+        for i in range(count):
+            # argmin ||x - c||^2 == argmax (x . c - ||c||^2 / 2)
+            centroids = self.centroids[i]
+            codes[:, i] = np.argmax(pieces[:, i, :] @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        return codes
+
+    def _score_block(self, queries, codes):
+        count, _, width = self.centroids.shape
+        # (queries, subvectors, centroids) inner products of query pieces with centroids
+        tables = np.einsum("qsw,scw->qsc", queries.reshape(len(queries), count, width), self.centroids)
+        scores = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for i in range(count):
+            scores += tables[:, i, codes[:, i]]
+        return scores
+
+    def state(self):
+        return {"centroids": self.centroids}
+
+    def load_state(self, state):
+        self.centroids = state["centroids"]
+
+
+def _kmeans(points: np.ndarray, k: int) -> np.ndarray:
+    if faiss is not None:
+        # Small collections train on fewer points than FAISS recommends; that is expected here
+        kmeans = faiss.Kmeans(points.shape[1], k, niter=PQ_TRAIN_ITERATIONS, seed=0, verbose=False, min_points_per_centroid=1)
+        kmeans.train(points)
+        return kmeans.centroids.astype(np.float32)
+    rng = np.random.default_rng(0)
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(PQ_TRAIN_ITERATIONS):
+        nearest = np.argmax(points @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        for j in range(k):
+            members = points[nearest == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+    return centroids
+
+
+def create_quantizer(mode: str, pq_subvectors: int = 0) -> Optional[VectorQuantizer]:
+    """Quantizer for a VECTOR_INDEX_QUANTIZATION mode; None for full-precision float32."""
+    if mode == "none":
+        return None
+    if mode == "float16":
+        return Float16Quantizer()
+    if mode == "int8":
+        return Int8Quantizer()
+    if mode == "pq":
+        return ProductQuantizer(pq_subvectors)
+    raise ValueError(f"Unknown vector index quantization: {mode}")
@@ -1,84 +1,1119 @@
 # ds-rpc-01/app/services/vector_store.py
 
+import os
+import json
+import shutil
+import asyncio
 import logging
-from typing import List, Dict, Optional
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from chromadb.config import Settings
 from typing import List
 from langchain.schema import Document
+from app.config import (
+    EMBEDDING_PROVIDER,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    VECTOR_SEARCH_MAX_WORKERS,
+    MAX_CONCURRENT_RETRIEVALS,
+    LEXICAL_INDEX_FILE,
+    SECTION_STORE_FILE,
+    PARENT_RETRIEVAL_ENABLED,
+    INDEX_GENERATION_FILE,
+    HYBRID_SEARCH_ENABLED,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    VECTOR_INDEX_BACKEND,
+    VECTOR_INDEX_ANN_THRESHOLD,
+    VECTOR_INDEX_QUANTIZATION,
+    VECTOR_INDEX_RESCORE_FACTOR,
+    VECTOR_INDEX_PQ_SUBVECTORS,
+)
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.embedding_providers import create_embedding_model
+from app.services.lexical_index import LexicalIndex, find_identifiers, tokenize
+from app.services.section_store import SectionStore
+from app.services.vector_quantization import create_quantizer, SCORE_BLOCK_ROWS
+from app.utils.rbac import access_index
+
+try:
+    import faiss
+except ImportError:  # exact NumPy search only
+    faiss = None
 
 logger = logging.getLogger(__name__)
 
+GLOBAL_COLLECTION_NAME = "global_company_data"
+SEARCH_K = 5
+SCORE_THRESHOLD = 0.3
+SQRT_2 = 2 ** 0.5
+
+
+class IndexBackend(ABC):
+    """One collection of chunk vectors with their texts and metadata.
+
+    ``search`` returns (document, relevance) pairs, best first, on the scale of
+    Chroma's default relevance function so the score threshold means the same
+    thing for every backend.
+    """
+
+    name: str
+    # Views over another collection's data (their writes are done by that collection)
+    shares_storage = False
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict], texts: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, embedding: List[float], k: int, search_filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, page_size: int = 5000) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """Yield (ids, texts, metadatas) pages of every stored chunk."""
+
+    @abstractmethod
+    def iter_vectors(self, page_size: int = 5000) -> Iterator[Tuple[List[str], Any, List[dict], List[str]]]:
+        """Yield (ids, embeddings, metadatas, texts) pages of every stored chunk."""
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Delete the collection and anything it persisted."""
+
+    def persist(self) -> None:
+        """Flush in-memory state to disk; backends that write through need not override."""
+
+
+class ChromaIndexBackend(IndexBackend):
+    """Chroma collection, persisted by Chroma itself under the persist directory."""
+
+    def __init__(self, collection_name: str, embeddings, persist_directory: Optional[str], client_settings: Settings):
+        self.name = collection_name
+        self.store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            client_settings=client_settings,
+            persist_directory=persist_directory
+        )
+        self._relevance_fn = self.store._select_relevance_score_fn()
+
+    def upsert(self, ids, embeddings, metadatas, texts) -> None:
+        self.store._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+
+    def delete(self, ids) -> None:
+        self.store.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.store._collection.count()
+
+    def search(self, embedding, k, search_filter=None):
+        results = self.store.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=search_filter)
+        return [(doc, self._relevance_fn(distance)) for doc, distance in results]
+
+    def iter_chunks(self, page_size: int = 5000):
+        offset = 0
+        while True:
+            page = self.store._collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def iter_vectors(self, page_size: int = 5000):
+        offset = 0
+        while True:
+            page = self.store._collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page["ids"], page["embeddings"], page["metadatas"], page["documents"]
+            offset += len(page["ids"])
+
+    def drop(self) -> None:
+        self.store.delete_collection()
+
+
+class NumpyIndexBackend(IndexBackend):
+    """In-process index over a contiguous float32 matrix of unit vectors.
+
+    Search is a single BLAS matrix-vector (or matrix-matrix, for batches)
+    product, i.e. exact cosine similarity. Collections with at least
+    ``ann_threshold`` vectors also get a FAISS HNSW graph, used for unfiltered
+    searches and for filtered ones when enough candidates survive the filter.
+    The graph and the codes are built by ``persist`` (or when a collection is
+    opened without them), never by a search; searches after a write scan the
+    float32 matrix exactly until the next ``persist``.
+
+    With ``quantization`` set, searches scan compact codes of the vectors
+    instead (see ``vector_quantization``) and re-rank the best
+    ``k * rescore_factor`` candidates by exact cosine, reading only those rows
+    of the float32 matrix; the HNSW graph is not used.
+
+    Persisted collections are a directory with ``vectors.npy``, ``chunks.json``
+    and (when built) ``hnsw.faiss`` or ``codes.npy`` and ``quantizer.npz``.
+    Vectors and codes are opened with ``mmap_mode="r"`` and the graph with
+    FAISS's mmap flag, so worker processes share the same page-cache pages;
+    the first write copies the matrix into private memory. A quantized
+    collection maps its matrix back from disk once persisted, so only the
+    pages of rescored rows are ever read.
+    """
+
+    def __init__(self, collection_name: str, persist_directory: Optional[str] = None, ann_threshold: int = VECTOR_INDEX_ANN_THRESHOLD,
+                 quantization: str = VECTOR_INDEX_QUANTIZATION, rescore_factor: int = VECTOR_INDEX_RESCORE_FACTOR,
+                 pq_subvectors: int = VECTOR_INDEX_PQ_SUBVECTORS):
+        self.name = collection_name
+        self.path = Path(persist_directory) / "vector_index" / collection_name if persist_directory else None
+        self.ann_threshold = ann_threshold
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.pq_subvectors = pq_subvectors
+        self._quantizer = create_quantizer(quantization, pq_subvectors)
+        self._codes: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._columns: Dict[str, np.ndarray] = {}
+        self._ann = None
+        # Bumped by every write, so structures built from an older state are discarded
+        self._version = 0
+        self._dirty = False
+        self._load()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def count(self, search_filter: Optional[dict] = None) -> int:
+        with self._lock:
+            mask = self._filter_mask(search_filter)
+            return self._size if mask is None else int(mask.sum())
+
+    def memory_bytes(self) -> int:
+        """Bytes every search scans (codes, or the float32 matrix), plus the matrix if held in private memory."""
+        with self._lock:
+            codes = self._codes
+            if codes is None:
+                return self.vectors.nbytes
+            private = self.vectors.nbytes if self._vectors.flags.writeable else 0
+            return codes.nbytes + self._quantizer.nbytes() + private
+
+    def upsert(self, ids, embeddings, metadatas, texts) -> None:
+        if not ids:
+            return
+        batch = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._ensure_capacity(self._size + len(ids), batch.shape[1])
+            for i, chunk_id in enumerate(ids):
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[chunk_id] = row
+                    self._ids.append(chunk_id)
+                    self._texts.append(texts[i])
+                    self._metadatas.append(metadatas[i])
+                else:
+                    self._texts[row] = texts[i]
+                    self._metadatas[row] = metadatas[i]
+                self._vectors[row] = batch[i]
+            self._invalidate()
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                row = self._rows.pop(chunk_id, None)
+                if row is None:
+                    continue
+                self._make_writable()
+                last = self._size - 1
+                if row != last:
+                    # Move the last row into the hole so the matrix stays contiguous
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size = last
+            self._invalidate()
+
+    def search(self, embedding, k, search_filter=None):
+        return self.search_batch([embedding], k, search_filter)[0]
+
+    def search_batch(self, embeddings: List[List[float]], k: int, search_filter: Optional[dict] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-``k`` cosine matches for several query vectors in one matrix product."""
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self._lock:
+            if not self._size:
+                return [[] for _ in embeddings]
+            mask = self._filter_mask(search_filter)
+            allowed = self._size if mask is None else int(mask.sum())
+            if not allowed:
+                return [[] for _ in embeddings]
+            k = min(k, allowed)
+
+            ann = self._ann
+            if ann is not None and allowed * 4 >= self._size:
+                results = self._search_ann(ann, queries, k, mask)
+                if results is not None:
+                    return results
+
+            codes = self._codes
+            rescore = codes is not None and self.rescore_factor > 0
+            scores = queries @ self.vectors.T if codes is None else self._quantizer.scores(queries, codes)
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            candidates = min(allowed, k * self.rescore_factor) if rescore else k
+            top = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+            results = []
+            for query, query_scores, rows in zip(queries, scores, top):
+                if rescore:
+                    # Exact cosines from the float32 rows; sorted rows read the mapped file in order
+                    rows = np.sort(rows)
+                    exact = self._vectors[rows] @ query
+                    order = np.argsort(-exact)[:k]
+                    results.append([self._result(rows[i], exact[i]) for i in order])
+                    continue
+                rows = rows[np.argsort(-query_scores[rows])]
+                results.append([self._result(row, query_scores[row]) for row in rows])
+            return results
+
+    def _search_ann(self, ann, queries: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        fetch = k if mask is None else min(self._size, k * 4)
+        scores, rows = ann.search(queries, fetch)
+        results = []
+        for query_scores, query_rows in zip(scores, rows):
+            hits = [
+                self._result(row, score) for row, score in zip(query_rows, query_scores)
+                if row >= 0 and (mask is None or mask[row])
+            ][:k]
+            if len(hits) < k:
+                # Too few candidates survived the filter; let the exact scan answer
+                return None
+            results.append(hits)
+        return results
+
+    def _result(self, row: int, cosine: float) -> Tuple[Document, float]:
+        # Same scale as Chroma's default L2 relevance for unit vectors: 1 - squared distance / sqrt(2)
+        return (
+            Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row]),
+            1.0 - (2.0 - 2.0 * float(cosine)) / SQRT_2
+        )
+
+    def _filter_mask(self, search_filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for Chroma-style ``{field: value}`` / ``{field: {"$in": [...]}}`` filters."""
+        if not search_filter:
+            return None
+        mask = np.ones(self._size, dtype=bool)
+        for field, condition in search_filter.items():
+            column = self._columns.get(field)
+            if column is None:
+                column = np.array([metadata.get(field) for metadata in self._metadatas], dtype=object)
+                self._columns[field] = column
+            values = condition["$in"] if isinstance(condition, dict) else [condition]
+            mask &= np.isin(column, values)
+        return mask
+
+    def _wants_ann(self) -> bool:
+        return faiss is not None and self._quantizer is None and self._size >= self.ann_threshold
+
+    def build_search_structures(self) -> None:
+        """Build the HNSW graph or the quantized codes of the stored vectors if the collection lacks them.
+
+        They are built outside the lock, so searches go on (scanning the
+        matrix) meanwhile, and dropped if a write came in during the build.
+        The codes come with a freshly fitted quantizer, swapped in with them.
+        """
+        with self._lock:
+            build_ann = self._ann is None and self._wants_ann()
+            build_codes = self._codes is None and self._quantizer is not None and self._size > 0
+            if not (build_ann or build_codes):
+                return
+            version, vectors = self._version, self.vectors
+        ann = quantizer = codes = None
+        if build_ann:
+            ann = faiss.IndexHNSWFlat(vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            ann.hnsw.efSearch = 128
+            ann.add(np.ascontiguousarray(vectors))
+        if build_codes:
+            quantizer = create_quantizer(self.quantization, self.pq_subvectors)
+            quantizer.fit(vectors)
+            codes = np.concatenate([
+                quantizer.encode(vectors[start:start + SCORE_BLOCK_ROWS])
+                for start in range(0, len(vectors), SCORE_BLOCK_ROWS)
+            ])
+        with self._lock:
+            if self._version != version:
+                return
+            if ann is not None:
+                self._ann = ann
+            if codes is not None:
+                self._quantizer, self._codes = quantizer, codes
+            self._dirty = True
+
+    def _invalidate(self) -> None:
+        self._columns = {}
+        self._ann = None
+        self._codes = None
+        self._version += 1
+        self._dirty = True
+
+    def _make_writable(self) -> None:
+        if not self._vectors.flags.writeable:
+            self._vectors = np.array(self._vectors)
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        if self._vectors.shape[1] != dim:
+            if self._size:
+                raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._vectors.shape[1]}")
+            self._vectors = np.empty((0, dim), dtype=np.float32)
+        if rows > self._vectors.shape[0] or not self._vectors.flags.writeable:
+            capacity = max(rows, 2 * self._vectors.shape[0], 1024)
+            grown = np.empty((capacity, dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    def iter_chunks(self, page_size: int = 5000, search_filter: Optional[dict] = None):
+        with self._lock:
+            rows = self._selected_rows(search_filter)
+            ids, texts, metadatas = [self._ids[row] for row in rows], [self._texts[row] for row in rows], [self._metadatas[row] for row in rows]
+        for start in range(0, len(ids), page_size):
+            yield ids[start:start + page_size], texts[start:start + page_size], metadatas[start:start + page_size]
+
+    def iter_vectors(self, page_size: int = 5000, search_filter: Optional[dict] = None):
+        with self._lock:
+            rows = self._selected_rows(search_filter)
+            ids, texts, metadatas = [self._ids[row] for row in rows], [self._texts[row] for row in rows], [self._metadatas[row] for row in rows]
+            vectors = self.vectors[rows]
+        for start in range(0, len(ids), page_size):
+            end = start + page_size
+            yield ids[start:end], vectors[start:end], metadatas[start:end], texts[start:end]
+
+    def _selected_rows(self, search_filter: Optional[dict]) -> np.ndarray:
+        mask = self._filter_mask(search_filter)
+        return np.arange(self._size) if mask is None else np.flatnonzero(mask)
+
+    def _load(self) -> None:
+        if not self.path or not (self.path / "chunks.json").exists():
+            return
+        try:
+            with open(self.path / "chunks.json", "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+            if len(vectors) != len(chunks["ids"]):
+                raise ValueError("vector and chunk counts differ")
+            self._vectors = vectors
+            self._size = len(vectors)
+            self._ids, self._texts, self._metadatas = chunks["ids"], chunks["texts"], chunks["metadatas"]
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            ann_path = self.path / "hnsw.faiss"
+            if ann_path.exists() and self._wants_ann():
+                ann = faiss.read_index(str(ann_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._ann = ann if ann.ntotal == self._size else None
+            self._load_codes()
+            logger.info(f"Opened vector index {self.name} with {self._size} vectors")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error reading vector index {self.path}: {e}")
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            self._size = 0
+            self._ids, self._texts, self._metadatas, self._rows = [], [], [], {}
+            return
+        # A collection persisted without its graph or codes (e.g. quantized differently) gets them now, not on a query
+        self.build_search_structures()
+
+    def _load_codes(self) -> None:
+        """Open persisted codes made with the configured quantization; otherwise they are rebuilt once the collection is open."""
+        codes_path, quantizer_path = self.path / "codes.npy", self.path / "quantizer.npz"
+        if self._quantizer is None or not codes_path.exists() or not quantizer_path.exists():
+            return
+        with np.load(quantizer_path, allow_pickle=False) as state:
+            if str(state["mode"]) != self.quantization:
+                logger.info(f"Vector index {self.name} was quantized as {state['mode']}, re-encoding as {self.quantization}")
+                return
+            self._quantizer.load_state(dict(state))
+        codes = np.load(codes_path, mmap_mode="r")
+        self._codes = codes if len(codes) == self._size else None
+
+    def persist(self) -> None:
+        """Build the search structures, then write the collection atomically: each
+        file goes to a temp name and is renamed into place.
+
+        Collections without a persist directory only build their structures.
+        """
+        self.build_search_structures()
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            ann = self._ann
+            _atomic_write(self.path / "vectors.npy", lambda f: np.save(f, np.ascontiguousarray(self.vectors)))
+            _atomic_write(self.path / "chunks.json", lambda f: f.write(json.dumps(
+                {"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}
+            ).encode("utf-8")))
+            if ann is not None:
+                tmp_path = self.path / "hnsw.faiss.tmp"
+                faiss.write_index(ann, str(tmp_path))
+                os.replace(tmp_path, self.path / "hnsw.faiss")
+            else:
+                (self.path / "hnsw.faiss").unlink(missing_ok=True)
+            codes = self._codes if self._size else None
+            if codes is not None:
+                _atomic_write(self.path / "codes.npy", lambda f: np.save(f, codes))
+                _atomic_write(self.path / "quantizer.npz", lambda f: np.savez(
+                    f, mode=np.array(self.quantization), **self._quantizer.state()
+                ))
+                # Keep only the codes in memory; rescoring reads single rows of the mapped file
+                self._vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+                self._codes = np.load(self.path / "codes.npy", mmap_mode="r")
+            else:
+                (self.path / "codes.npy").unlink(missing_ok=True)
+                (self.path / "quantizer.npz").unlink(missing_ok=True)
+            self._dirty = False
+
+    def drop(self) -> None:
+        with self._lock:
+            if self.path and self.path.exists():
+                shutil.rmtree(self.path, ignore_errors=True)
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            self._size = 0
+            self._ids, self._texts, self._metadatas, self._rows = [], [], [], {}
+            self._invalidate()
+            self._dirty = False
+
+
+class DepartmentView(IndexBackend):
+    """One department's chunks inside a NumPy global collection.
+
+    The global collection already holds every chunk with its department in
+    the metadata, so a department store is that collection searched with a
+    department filter rather than a second copy of the vectors. Writes and
+    persistence are left to the global collection.
+    """
+
+    shares_storage = True
+
+    def __init__(self, collection: NumpyIndexBackend, department: str):
+        self.name = f"{collection.name}[{department}]"
+        self.collection = collection
+        self.department = department
+
+    def _filter(self, search_filter: Optional[dict] = None) -> dict:
+        return {**(search_filter or {}), "department": self.department}
+
+    def upsert(self, ids, embeddings, metadatas, texts) -> None:
+        pass
+
+    def delete(self, ids) -> None:
+        pass
+
+    def count(self) -> int:
+        return self.collection.count(self._filter())
+
+    def search(self, embedding, k, search_filter=None):
+        return self.collection.search(embedding, k, self._filter(search_filter))
+
+    def iter_chunks(self, page_size: int = 5000):
+        return self.collection.iter_chunks(page_size, self._filter())
+
+    def iter_vectors(self, page_size: int = 5000):
+        return self.collection.iter_vectors(page_size, self._filter())
+
+    def drop(self) -> None:
+        pass
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _RoleRetriever(BaseRetriever):
+    """LangChain retriever that runs the service's role-scoped hybrid search."""
+
+    vector_store: Any
+    user_role: str
+    departments: Optional[List[str]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.vector_store.similarity_search(query, self.user_role, self.departments)
+
+
+def generation_file_name(file_name: str, generation: int) -> str:
+    """Name of a per-generation file; generation 0 keeps the original name."""
+    if generation == 0:
+        return file_name
+    stem, dot, suffix = file_name.partition(".")
+    return f"{stem}.g{generation}{dot}{suffix}"
+
+
+class IndexGeneration:
+    """One complete set of collections with its lexical index and section store.
+
+    Ingestion writes to a generation before it goes live; once live it is
+    only read. Searches pin the live generation for their whole duration, so
+    a retired generation is released only after its last reader finishes.
+    """
+
+    def __init__(self, number: int, lexical_index: Optional[LexicalIndex] = None, sections: Optional[SectionStore] = None):
+        self.number = number
+        self.global_store: Optional[IndexBackend] = None
+        self.department_stores: Dict[str, IndexBackend] = {}
+        self.lexical_index = lexical_index if lexical_index is not None else LexicalIndex()
+        self.sections = sections if sections is not None else SectionStore()
+        self.readers = 0
+        self.retired = False
+
+    def stores(self) -> List[IndexBackend]:
+        return [store for store in [self.global_store, *self.department_stores.values()] if store is not None]
+
+    def release(self) -> None:
+        """Drop this process's references to the generation's indexes so their memory is freed."""
+        self.global_store = None
+        self.department_stores = {}
+        self.lexical_index = LexicalIndex()
+        self.sections = SectionStore()
+
+
 class VectorStoreService:
-    """Manages vector stores for document retrieval using OpenAI embeddings and ChromaDB."""
+    """Manages vector stores for document retrieval using a pluggable embedding provider (OpenAI by
+    default, or a local CPU model) and a pluggable index backend (ChromaDB by default, or the
+    in-process NumPy/FAISS index)."""
     
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: Optional[str], persist_directory: Optional[str] = None, index_backend: Optional[str] = None,
+                 embedding_model: Optional[Embeddings] = None):
         self.openai_api_key = openai_api_key
+        self.persist_directory = persist_directory
+        self.index_backend = index_backend or VECTOR_INDEX_BACKEND
+        if self.index_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector index backend: {self.index_backend}")
         
-        self.embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+        self.embeddings = CachedEmbeddings(
+            embedding_model or create_embedding_model(EMBEDDING_PROVIDER, openai_api_key),
+            cache_path=EMBEDDING_CACHE_PATH,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+        )
         self.chroma_settings = Settings(anonymized_telemetry=False)
-        self.department_stores: Dict[str, Chroma] = {}
-        self.global_store: Optional[Chroma] = None
+        self._live = IndexGeneration(0)
+        self._building: Optional[IndexGeneration] = None
+        self._generation_lock = threading.Lock()
+        self._search_executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_MAX_WORKERS, thread_name_prefix="vector-search")
+        self._search_semaphore = asyncio.Semaphore(MAX_CONCURRENT_RETRIEVALS)
+
+    # Ingestion writes go to the generation being built, or to the live one
+    # when none is (e.g. at startup, before any query is served).
+
+    @property
+    def _target(self) -> IndexGeneration:
+        return self._building or self._live
+
+    @property
+    def global_store(self) -> Optional[IndexBackend]:
+        return self._target.global_store
+
+    @property
+    def department_stores(self) -> Dict[str, IndexBackend]:
+        return self._target.department_stores
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        return self._target.lexical_index
+
+    @property
+    def sections(self) -> SectionStore:
+        return self._target.sections
+
+    @property
+    def generation(self) -> int:
+        """Number of the live index generation."""
+        return self._live.number
+
+    @staticmethod
+    def _department_collection_name(department: str) -> str:
+        return f"dept_{department.lower().replace('-', '_')}"
+
+    @staticmethod
+    def _generation_collection_name(collection_name: str, generation: int) -> str:
+        return collection_name if generation == 0 else f"{collection_name}__g{generation}"
+
+    def _create_store(self, collection_name: str, generation: Optional[int] = None) -> IndexBackend:
+        """Open (or create) a collection; persisted collections are reopened as they were left."""
+        collection_name = self._generation_collection_name(
+            collection_name, self._target.number if generation is None else generation
+        )
+        if self.index_backend == "numpy":
+            return NumpyIndexBackend(collection_name, self.persist_directory)
+        return ChromaIndexBackend(collection_name, self.embeddings, self.persist_directory, self.chroma_settings)
+
+    def open_stores(self, departments: List[str]) -> None:
+        """Open the global store and one store per department (a view of the global store for the NumPy backend)."""
+        target = self._target
+        if target.global_store is None:
+            target.global_store = self._create_store(GLOBAL_COLLECTION_NAME)
+        for department in departments:
+            if department not in target.department_stores:
+                if self.index_backend == "numpy":
+                    target.department_stores[department] = DepartmentView(target.global_store, department)
+                else:
+                    target.department_stores[department] = self._create_store(self._department_collection_name(department))
+
+    def reset_stores(self) -> None:
+        """Drop every collection so the next ingestion starts from an empty index."""
+        target = self._target
+        for store in target.stores():
+            try:
+                store.drop()
+            except Exception as e:
+                logger.error(f"Error deleting collection: {e}")
+        target.department_stores = {}
+        target.global_store = None
+        target.lexical_index.reset()
+        target.sections.reset()
+
+    def _lexical_index_path(self, generation: int) -> Optional[str]:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, generation_file_name(LEXICAL_INDEX_FILE, generation))
+
+    def load_lexical_index(self) -> None:
+        """Load the persisted BM25 index, rebuilding it from the vector store if it is missing or stale."""
+        target = self._target
+        if self.persist_directory:
+            target.lexical_index = LexicalIndex(self._lexical_index_path(target.number))
+            target.lexical_index.load()
+        store_count = target.global_store.count() if target.global_store is not None else 0
+        if len(target.lexical_index) != store_count:
+            logger.warning("Lexical index does not match the vector store, rebuilding it from stored chunks.")
+            self.rebuild_lexical_index()
+
+    def _section_store_path(self, generation: int) -> Optional[str]:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, generation_file_name(SECTION_STORE_FILE, generation))
+
+    def load_section_store(self) -> None:
+        """Load the persisted parent sections; chunks whose section is missing are returned as they are."""
+        target = self._target
+        if self.persist_directory:
+            target.sections = SectionStore(self._section_store_path(target.number))
+            target.sections.load()
+        if len(target.sections) and (target.global_store is None or not target.global_store.count()):
+            # Left over from an index that has since been reset
+            target.sections.reset()
+
+    def replace_sections(self, file_path: str, sections: List[Document]) -> None:
+        self.sections.replace_file(file_path, sections)
+
+    def remove_sections(self, file_path: str) -> None:
+        self.sections.remove_file(file_path)
+
+    def rebuild_lexical_index(self, page_size: int = 5000) -> None:
+        self.lexical_index.reset()
+        if self.global_store is None:
+            return
+        for ids, texts, metadatas in self.global_store.iter_chunks(page_size):
+            self.lexical_index.add_many(
+                (chunk_id, metadata.get("department", ""), text, metadata)
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            )
+        logger.info(f"Rebuilt lexical index with {len(self.lexical_index)} chunks")
 
-    def create_global_store(self, split_docs: List[Document]) -> None:
-        """Create a global vector store containing all documents."""
+    def persist(self) -> None:
+        """Write the lexical index, the section store and any in-process vector indexes to disk."""
+        for store in self._target.stores():
+            store.persist()
+        self._target.lexical_index.save()
+        self._target.sections.save()
+
+    def document_count(self) -> int:
+        """Number of chunks in the live global store."""
+        store = self._live.global_store
+        return store.count() if store is not None else 0
+
+    # Index generations --------------------------------------------------
+
+    def set_live_generation(self, number: int) -> None:
+        """Select the generation to open at startup, before any store is opened."""
+        self._live = IndexGeneration(number)
+
+    def begin_generation(self, departments: List[str]) -> IndexGeneration:
+        """Start the next generation as a copy of the live one.
+
+        Vectors are copied, not re-embedded. Until ``activate_generation`` or
+        ``abort_generation``, ingestion writes go to the copy while searches
+        keep reading the live generation.
+        """
+        live = self._live
+        building = IndexGeneration(
+            live.number + 1,
+            LexicalIndex(self._lexical_index_path(live.number + 1)),
+            live.sections.copy(self._section_store_path(live.number + 1))
+        )
+        self._building = building
         try:
-            self.global_store = Chroma(
-                collection_name="global_company_data",
-                embedding_function=self.embeddings,
-                client_settings=self.chroma_settings
+            # Leftovers of an interrupted build of the same number are discarded first
+            for name in [GLOBAL_COLLECTION_NAME, *map(self._department_collection_name, sorted(set(departments) | set(live.department_stores)))]:
+                self._create_store(name, building.number).drop()
+            self.open_stores(sorted(live.department_stores))
+            for department, store in live.department_stores.items():
+                self._copy_store(store, building.department_stores[department])
+            if live.global_store is not None:
+                self._copy_store(live.global_store, building.global_store)
+            self.rebuild_lexical_index()
+        except Exception:
+            self.abort_generation()
+            raise
+        logger.info(f"Building index generation {building.number} from generation {live.number}")
+        return building
+
+    @staticmethod
+    def _copy_store(source: IndexBackend, destination: IndexBackend) -> None:
+        if destination.shares_storage:
+            return
+        for ids, vectors, metadatas, texts in source.iter_vectors():
+            destination.upsert(ids, vectors, metadatas, texts)
+
+    def abort_generation(self) -> None:
+        """Discard the generation being built."""
+        building, self._building = self._building, None
+        if building is None:
+            return
+        for store in building.stores():
+            try:
+                store.drop()
+            except Exception as e:
+                logger.error(f"Error deleting collection: {e}")
+        building.release()
+
+    def activate_generation(self) -> IndexGeneration:
+        """Make the generation being built live; the caller has persisted it.
+
+        Returns the retired generation. Its in-memory indexes are released as
+        soon as no search is using them any more; its files stay on disk until
+        the generation after next, so other worker processes can finish
+        switching over.
+        """
+        building = self._building
+        if building is None:
+            raise RuntimeError("No index generation is being built")
+        self._building = None
+        self._write_generation_pointer(building.number)
+        retired = self._swap(building)
+        self.drop_generation_files(building.number - 2, sorted(building.department_stores))
+        return retired
+
+    def open_generation(self, number: int, departments: List[str]) -> IndexGeneration:
+        """Open a generation another process built and make it live here."""
+        generation = IndexGeneration(number)
+        self._building = generation
+        try:
+            self.open_stores(departments)
+            self.load_lexical_index()
+            self.load_section_store()
+        finally:
+            self._building = None
+        return self._swap(generation)
+
+    def _swap(self, generation: IndexGeneration) -> IndexGeneration:
+        with self._generation_lock:
+            retired, self._live = self._live, generation
+            retired.retired = True
+            drained = retired.readers == 0
+        if drained:
+            retired.release()
+        logger.info(f"Index generation {generation.number} is live ({self.document_count()} chunks)")
+        return retired
+
+    @contextmanager
+    def _pinned(self) -> Iterator[IndexGeneration]:
+        """The live generation, kept from being released until the block exits."""
+        with self._generation_lock:
+            generation = self._live
+            generation.readers += 1
+        try:
+            yield generation
+        finally:
+            with self._generation_lock:
+                generation.readers -= 1
+                drained = generation.retired and generation.readers == 0
+            if drained:
+                generation.release()
+                logger.info(f"Released index generation {generation.number} after in-flight searches drained")
+
+    def read_generation_pointer(self) -> int:
+        """Live generation recorded on disk by the last activation (0 if none)."""
+        if not self.persist_directory:
+            return 0
+        try:
+            with open(os.path.join(self.persist_directory, INDEX_GENERATION_FILE), "r", encoding="utf-8") as f:
+                return int(json.load(f)["generation"])
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error reading index generation pointer: {e}")
+            return 0
+
+    def _write_generation_pointer(self, number: int) -> None:
+        if not self.persist_directory:
+            return
+        _atomic_write(
+            Path(self.persist_directory) / INDEX_GENERATION_FILE,
+            lambda f: f.write(json.dumps({"generation": number}).encode("utf-8"))
+        )
+
+    def drop_generation_files(self, number: int, departments: List[str]) -> None:
+        """Delete a generation's persisted collections, lexical index and section store."""
+        if number < 0 or not self.persist_directory:
+            return
+        for name in [GLOBAL_COLLECTION_NAME, *map(self._department_collection_name, departments)]:
+            try:
+                self._create_store(name, number).drop()
+            except Exception as e:
+                logger.error(f"Error deleting collection of generation {number}: {e}")
+        Path(self._lexical_index_path(number)).unlink(missing_ok=True)
+        Path(self._section_store_path(number)).unlink(missing_ok=True)
+
+    def add_documents(self, department: str, documents: List[Document], ids: List[str]) -> None:
+        """Embed chunks once and upsert the same vectors into the department and global stores."""
+        for doc in documents:
+            doc.metadata["department"] = department
+        self.add_document_batch(documents, ids)
+
+    def add_document_batch(self, documents: List[Document], ids: List[str]) -> None:
+        """Embed a batch of chunks from any departments and upsert each vector into
+        the chunk's department store and the global store."""
+        if not documents:
+            return
+        self.open_stores(sorted({doc.metadata["department"] for doc in documents}))
+        for start in range(0, len(documents), EMBEDDING_BATCH_SIZE):
+            batch = documents[start:start + EMBEDDING_BATCH_SIZE]
+            batch_ids = ids[start:start + EMBEDDING_BATCH_SIZE]
+            texts = [doc.page_content for doc in batch]
+            metadatas = [doc.metadata for doc in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            self.global_store.upsert(batch_ids, vectors, metadatas, texts)
+            self.lexical_index.add_many(
+                (chunk_id, metadata["department"], text, dict(metadata))
+                for chunk_id, text, metadata in zip(batch_ids, texts, metadatas)
             )
-            self.global_store.add_documents(split_docs)
-            
-            logger.info(f"Global vector store created with {len(split_docs)} documents")
-        except Exception as e:
-            logger.error(f"Error creating global store: {e}")
-
-    def create_department_stores(self, department_docs: Dict[str, List[Document]]):
-        """Create department-specific vector stores."""
-        logger.info("Creating department-specific vector stores...")
-        for department, documents in department_docs.items():
-            if documents:
-                try:
-                    store = Chroma(
-                        collection_name=f"dept_{department.lower().replace('-', '_')}",
-                        embedding_function=self.embeddings,
-                        
-                        client_settings=self.chroma_settings
-                    )
-                    store.add_documents(documents)
-                    
-                    self.department_stores[department] = store
-                    logger.info(f"Vector store created for {department}: {len(documents)} documents")
-                except Exception as e:
-                    logger.error(f"Error creating vector store for {department}: {e}")
+
+            by_department: Dict[str, List[int]] = {}
+            for i, doc in enumerate(batch):
+                by_department.setdefault(doc.metadata["department"], []).append(i)
+            for department, positions in by_department.items():
+                self.department_stores[department].upsert(
+                    [batch_ids[i] for i in positions],
+                    [vectors[i] for i in positions],
+                    [metadatas[i] for i in positions],
+                    [texts[i] for i in positions]
+                )
+        logger.info(f"Added {len(documents)} chunks to department and global stores")
+
+    def delete_documents(self, department: str, ids: List[str]) -> None:
+        """Remove chunks from their department store and from the global store."""
+        if not ids:
+            return
+        self.open_stores([department])
+        self.department_stores[department].delete(ids)
+        self.global_store.delete(ids)
+        self.lexical_index.remove(ids)
+        logger.info(f"Removed {len(ids)} chunks from {department} and global stores")
+
+    def _accessible_departments(self, generation: IndexGeneration, user_role: str, departments: Optional[List[str]] = None) -> List[str]:
+        """Ingested departments a role may search; defaults to the precomputed access index."""
+        accessible_depts = departments if departments is not None else access_index.departments_for_role(user_role)
+        return [dept for dept in accessible_depts if dept in generation.department_stores]
+
+    def _resolve_store(self, generation: IndexGeneration, user_role: str, departments: Optional[List[str]] = None):
+        """Pick the store and metadata filter that match a user's role and departments.
+
+        A role that can read every ingested department searches the global store
+        unfiltered, a single department uses its own store, anything else filters
+        the global store by department.
+        """
+        accessible_depts = self._accessible_departments(generation, user_role, departments)
+        if not accessible_depts:
+            return None, None
+
+        if len(accessible_depts) == 1:
+            return generation.department_stores[accessible_depts[0]], None
+
+        if generation.global_store:
+            if set(accessible_depts) >= set(generation.department_stores):
+                return generation.global_store, None
+            return generation.global_store, {"department": {"$in": accessible_depts}}
+        return None, None
 
     def get_retriever(self, user_role: str, departments: Optional[List[str]] = None):
         """Return a retriever based on user role and departments."""
-        if user_role == "c-level" and self.global_store:
-            return self.global_store.as_retriever(search_type="similarity_score_threshold", search_kwargs={"k": 5, "score_threshold": 0.3})
+        store, _ = self._resolve_store(self._live, user_role, departments)
+        if store is None:
+            return None
+        return _RoleRetriever(vector_store=self, user_role=user_role, departments=departments)
 
-        accessible_depts = departments or ["general"]
-        if len(accessible_depts) == 1 and accessible_depts[0] in self.department_stores:
-            return self.department_stores[accessible_depts[0]].as_retriever(search_type="similarity_score_threshold", search_kwargs={"k": 5, "score_threshold": 0.3})
+    def _search_by_vector(self, store: IndexBackend, embedding: List[float], search_filter: Optional[dict], k: int = SEARCH_K) -> List[Document]:
+        """Run the vector search for a precomputed query vector and apply the score threshold."""
+        documents = []
+        for doc, score in store.search(embedding, k, search_filter):
+            if score >= SCORE_THRESHOLD:
+                doc.metadata["relevance_score"] = score
+                documents.append(doc)
+        return documents
 
-        if self.global_store:
-            return self.global_store.as_retriever(
-                search_type="similarity_score_threshold",
-                search_kwargs={"k": 5, "score_threshold": 0.3, "filter": {"department": {"$in": accessible_depts}}}
-            )
-        return None
+    @staticmethod
+    def is_identifier_query(query: str) -> bool:
+        """Whether a query names an identifier and can be served by the lexical fast path."""
+        return HYBRID_SEARCH_ENABLED and bool(find_identifiers(query))
+
+    @staticmethod
+    def _lexical_documents(generation: IndexGeneration, hits) -> List[Document]:
+        documents = []
+        for chunk_id, score in hits:
+            chunk = generation.lexical_index.get(chunk_id)
+            if chunk is not None:
+                documents.append(Document(page_content=chunk["text"], metadata={**chunk["metadata"], "lexical_score": score}))
+        return documents
+
+    @staticmethod
+    def _parent_documents(generation: IndexGeneration, documents: List[Document], k: int = SEARCH_K) -> List[Document]:
+        """Replace chunks by their parent section, keeping each section once at its best-ranked chunk.
+
+        The section carries the chunk's scores. Chunks without a parent (or
+        whose section is missing) are returned as they are.
+        """
+        results: List[Document] = []
+        seen = set()
+        for doc in documents:
+            parent_id = doc.metadata.get("parent_id") if PARENT_RETRIEVAL_ENABLED else None
+            section = generation.sections.get(parent_id) if parent_id else None
+            if section is not None:
+                if parent_id in seen:
+                    continue
+                seen.add(parent_id)
+                scores = {key: value for key, value in doc.metadata.items() if key.endswith("_score")}
+                doc = Document(page_content=section.page_content, metadata={**section.metadata, **scores})
+            results.append(doc)
+            if len(results) >= k:
+                break
+        return results
+
+    def _identifier_lookup(self, generation: IndexGeneration, query: str, departments: List[str]) -> List[Document]:
+        """Chunks (or their sections) that contain every identifier in the query, ranked by BM25."""
+        required_terms = [term for identifier in find_identifiers(query) for term in tokenize(identifier)]
+        if not required_terms:
+            return []
+        return self._parent_documents(generation, self._lexical_documents(
+            generation, generation.lexical_index.search(query, departments, k=HYBRID_CANDIDATES, required_terms=required_terms)
+        ))
+
+    def _hybrid_search(self, generation: IndexGeneration, store: IndexBackend, embedding: List[float], search_filter: Optional[dict], query: str, departments: List[str]) -> List[Document]:
+        """Fuse vector and BM25 candidates with reciprocal rank fusion, then collapse them into sections."""
+        if not HYBRID_SEARCH_ENABLED:
+            return self._parent_documents(generation, self._search_by_vector(store, embedding, search_filter, k=HYBRID_CANDIDATES))
 
-    def similarity_search(self, query: str, user_role: str) -> List[Document]:
-        """Perform a similarity search using the appropriate retriever for the user's role."""
-        retriever = self.get_retriever(user_role)
-        if retriever:
+        dense = self._search_by_vector(store, embedding, search_filter, k=HYBRID_CANDIDATES)
+        lexical = self._lexical_documents(generation, generation.lexical_index.search(query, departments, k=HYBRID_CANDIDATES))
+
+        fused: Dict[str, Document] = {}
+        scores: Dict[str, float] = {}
+        for ranking in (dense, lexical):
+            for rank, doc in enumerate(ranking):
+                key = doc.metadata.get("chunk_id") or doc.page_content
+                if key in fused:
+                    fused[key].metadata.update({k: v for k, v in doc.metadata.items() if k not in fused[key].metadata})
+                else:
+                    fused[key] = doc
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        for key in ranked:
+            fused[key].metadata["rrf_score"] = scores[key]
+        return self._parent_documents(generation, [fused[key] for key in ranked])
+
+    def similarity_search(self, query: str, user_role: str, departments: Optional[List[str]] = None) -> List[Document]:
+        """Perform a hybrid search over the stores the user's role can read."""
+        with self._pinned() as generation:
+            departments = self._accessible_departments(generation, user_role, departments)
+            store, search_filter = self._resolve_store(generation, user_role, departments)
+            if store:
+                try:
+                    if self.is_identifier_query(query):
+                        documents = self._identifier_lookup(generation, query, departments)
+                        if documents:
+                            return documents
+                    return self._hybrid_search(generation, store, self.embeddings.embed_query(query), search_filter, query, departments)
+                except Exception as e:
+                    logger.error(f"Error in similarity search: {e}")
+        return []
+
+    async def asimilarity_search(self, query: str, user_role: str, query_embedding: Optional[List[float]] = None) -> List[Document]:
+        """Async hybrid search that keeps the event loop free.
+
+        Identifier lookups are answered from the lexical index without embedding
+        the query when it has matches. Otherwise the query is embedded with the
+        async client and the searches run in a bounded thread pool; a semaphore
+        caps how many retrievals run at once.
+        """
+        with self._pinned() as generation:
+            departments = self._accessible_departments(generation, user_role)
+            store, search_filter = self._resolve_store(generation, user_role, departments)
+            if not store:
+                return []
             try:
-                return retriever.get_relevant_documents(query)
+                async with self._search_semaphore:
+                    loop = asyncio.get_running_loop()
+                    if query_embedding is None and self.is_identifier_query(query):
+                        documents = await loop.run_in_executor(
+                            self._search_executor, self._identifier_lookup, generation, query, departments
+                        )
+                        if documents:
+                            return documents
+                    if query_embedding is None:
+                        query_embedding = await self.embeddings.aembed_query(query)
+                    return await loop.run_in_executor(
+                        self._search_executor, self._hybrid_search, generation, store, query_embedding, search_filter, query, departments
+                    )
             except Exception as e:
                 logger.error(f"Error in similarity search: {e}")
         return []
 
+    def close(self) -> None:
+        self._search_executor.shutdown(wait=False)
+        close_model = getattr(self.embeddings.underlying, "close", None)
+        if close_model is not None:
+            close_model()
@@ -1,45 +1,219 @@
 # ds-rpc-02/app/utils/audit.py
 
 import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
 
-# Ensure the logs directory exists
-logs_dir = os.path.join(os.path.dirname(__file__), "..", "..", "logs")
-os.makedirs(logs_dir, exist_ok=True)
+from starlette.concurrency import run_in_threadpool
 
-# Set the log file path
-log_file_path = os.path.join(logs_dir, "audit.log")
+from app.config import (
+    AUDIT_LOG_PATH,
+    AUDIT_QUEUE_MAX_RECORDS,
+    AUDIT_BATCH_SIZE,
+    AUDIT_FSYNC_INTERVAL_SECONDS,
+    AUDIT_MAX_BYTES,
+    AUDIT_BACKUP_COUNT,
+)
+from app.utils.metrics import metrics
 
-# Configure the logger
-audit_logger = logging.getLogger("audit_logger")
-audit_logger.setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
 
-# Create handlers
-console_handler = logging.StreamHandler()
-file_handler = logging.FileHandler(log_file_path)
 
-# Formatter
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
+class AuditWriter:
+    """Background writer of JSONL audit records.
 
-# Add handlers
-audit_logger.addHandler(console_handler)
-audit_logger.addHandler(file_handler)
+    Callers only enqueue a record. A single writer thread drains the queue in
+    batches, appends them to the audit file, fsyncs at most every
+    ``fsync_interval`` seconds (and on close) and rotates the file once it
+    exceeds ``max_bytes``. When the queue is full, callers block until the
+    writer catches up instead of dropping records; ``awrite`` waits in the
+    threadpool, so the event loop keeps serving other requests meanwhile.
+    """
 
-# Define logging functions
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 500,
+                 fsync_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._last_fsync = 0.0
+        self.stats = {"written": 0, "blocked_enqueues": 0, "write_errors": 0, "rotations": 0}
+
+    def write(self, event: str, level: str = "info", **fields: Any) -> None:
+        """Enqueue a record from synchronous code; blocks the calling thread while the queue is full."""
+        record = self._enqueue(event, level, fields)
+        if record is not None:
+            self._queue.put(record)
+
+    async def awrite(self, event: str, level: str = "info", **fields: Any) -> None:
+        """Enqueue a record from the event loop; a full queue is waited on in the threadpool."""
+        record = self._enqueue(event, level, fields)
+        if record is not None:
+            await run_in_threadpool(self._queue.put, record)
+
+    def _enqueue(self, event: str, level: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Enqueue without waiting; returns the record when the queue is full and the caller must wait."""
+        record = {"ts": datetime.now(timezone.utc).isoformat(), "event": event, "level": level, **fields}
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return None
+        except queue.Full:
+            # Backpressure: wait for the writer rather than lose an audit record
+            self.stats["blocked_enqueues"] += 1
+            return record
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                record = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._sync()
+                continue
+            batch: List[Optional[Dict[str, Any]]] = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write_batch([entry for entry in batch if entry is not None])
+            if stop:
+                self._sync()
+                self._close_file()
+                return
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._sync()
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        while True:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(data)
+                self._file.flush()
+                self.stats["written"] += len(records)
+                break
+            except OSError as e:
+                # Keep the batch and retry; callers back up behind the full queue meanwhile
+                self.stats["write_errors"] += 1
+                logger.error(f"Audit log write failed, retrying: {e}")
+                self._close_file()
+                time.sleep(1.0)
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _sync(self) -> None:
+        if self._file is not None:
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logger.error(f"Audit log fsync failed: {e}")
+        self._last_fsync = time.monotonic()
+
+    def _rotate(self) -> None:
+        self._sync()
+        self._close_file()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stats["rotations"] += 1
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write out everything queued so far, fsync and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+audit_writer = AuditWriter(
+    AUDIT_LOG_PATH,
+    max_queue=AUDIT_QUEUE_MAX_RECORDS,
+    batch_size=AUDIT_BATCH_SIZE,
+    fsync_interval=AUDIT_FSYNC_INTERVAL_SECONDS,
+    max_bytes=AUDIT_MAX_BYTES,
+    backup_count=AUDIT_BACKUP_COUNT,
+)
+atexit.register(audit_writer.close)
+metrics.register_collector("audit", lambda: [
+    ("audit_records_pending", "Audit records waiting to be written", {}, audit_writer.pending()),
+    *(("audit_writer", "Audit writer counters since start", {"stat": stat}, value) for stat, value in audit_writer.stats.items()),
+])
+
+# Define logging functions; the a-prefixed variants are for request handlers on the event loop
 def log_authentication_success(username: str, role: str):
-    audit_logger.info(f"Authentication success: User '{username}' with role '{role}'.")
+    audit_writer.write("authentication_success", username=username, role=role)
 
 def log_authentication_failure(username: str, reason: str):
-    audit_logger.warning(f"Authentication failure: User '{username}', Reason: {reason}")
+    audit_writer.write("authentication_failure", level="warning", username=username, reason=reason)
 
 def log_query(username: str, query: str, query_id: str, user_role: str):
-    audit_logger.info(f"Query {query_id} from user '{username}': {query}")
+    audit_writer.write("query", username=username, role=user_role, query_id=query_id, query=query)
 
 def log_query_success(username: str, query_id: str, processing_time_ms: int, sources_count: int):
-    audit_logger.info(f"Query {query_id} from '{username}' succeeded in {processing_time_ms} ms with {sources_count} sources.")
+    audit_writer.write(
+        "query_success", username=username, query_id=query_id,
+        processing_time_ms=processing_time_ms, sources_count=sources_count
+    )
 
 def log_query_error(username: str, query_id: str, error: str):
-    audit_logger.error(f"Query {query_id} from '{username}' failed: {error}")
-    
\ No newline at end of file
+    audit_writer.write("query_error", level="error", username=username, query_id=query_id, error=error)
+
+async def alog_authentication_success(username: str, role: str):
+    await audit_writer.awrite("authentication_success", username=username, role=role)
+
+async def alog_authentication_failure(username: str, reason: str):
+    await audit_writer.awrite("authentication_failure", level="warning", username=username, reason=reason)
+
+async def alog_query(username: str, query: str, query_id: str, user_role: str):
+    await audit_writer.awrite("query", username=username, role=user_role, query_id=query_id, query=query)
+
+async def alog_query_success(username: str, query_id: str, processing_time_ms: int, sources_count: int):
+    await audit_writer.awrite(
+        "query_success", username=username, query_id=query_id,
+        processing_time_ms=processing_time_ms, sources_count=sources_count
+    )
+
+async def alog_query_error(username: str, query_id: str, error: str):
+    await audit_writer.awrite("query_error", level="error", username=username, query_id=query_id, error=error)
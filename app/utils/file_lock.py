@@ -0,0 +1,54 @@
+# ds-rpc-01/app/utils/file_lock.py
+
+import os
+import logging
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run single-process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, held across processes.
+
+    Worker processes take it around ingestion so that only one of them builds
+    or updates the persisted index while the others wait and then open it.
+    On platforms without ``fcntl`` the lock is a no-op.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        """Block until the lock is held."""
+        if fcntl is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
@@ -0,0 +1,225 @@
+# ds-rpc-01/app/utils/metrics.py
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Callable, Iterator, Optional
+
+# Latency buckets in seconds, roughly x2.5 apart from 1 ms to 60 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Sharded:
+    """Per-thread shards so observations never contend on a lock.
+
+    Each thread writes only to its own shard; the lock is taken once per
+    thread to register the shard and when a scrape reads all shards. Reads may
+    miss an observation that is in flight, which is fine for monitoring.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._register_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._register_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshot(self) -> List[dict]:
+        with self._register_lock:
+            return [dict(shard) for shard in self._shards]
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__()
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+
+class Histogram(_Sharded):
+    """Fixed-bucket histogram; each shard maps labels -> [bucket counts..., +Inf count, sum]."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def values(self) -> Dict[LabelValues, Dict[str, object]]:
+        """Per label set: cumulative bucket counts, count, sum and estimated quantiles."""
+        merged: Dict[LabelValues, List[float]] = {}
+        for shard in self._snapshot():
+            for labels, series in shard.items():
+                total = merged.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(list(series)):
+                    total[i] += value
+
+        result = {}
+        for labels, series in merged.items():
+            counts, total_sum = series[:-1], series[-1]
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[labels] = {
+                "buckets": dict(zip([*map(str, self.buckets), "+Inf"], cumulative)),
+                "count": running,
+                "sum": total_sum,
+                "p50": self._quantile(cumulative, 0.50),
+                "p95": self._quantile(cumulative, 0.95),
+                "p99": self._quantile(cumulative, 0.99),
+            }
+        return result
+
+    def _quantile(self, cumulative: List[int], q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-quantile (Prometheus-style estimate)."""
+        total = cumulative[-1] if cumulative else 0
+        if not total:
+            return None
+        rank = q * total
+        for i, count in enumerate(cumulative):
+            if count >= rank:
+                # None when it falls in the +Inf bucket, so JSON output stays valid
+                return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[object] = []
+        # Gauges read at scrape time, e.g. counters kept by other components
+        self._collectors: Dict[str, Callable[[], List[Tuple[str, str, Dict[str, str], float]]]] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, key: str, collector: Callable[[], List[Tuple[str, str, Dict[str, str], float]]]) -> None:
+        """Register a callable returning (name, help, labels, value) gauge samples.
+
+        A later registration under the same ``key`` replaces the earlier one.
+        """
+        self._collectors[key] = collector
+
+    def _collected(self) -> List[Tuple[str, str, Dict[str, str], float]]:
+        samples = []
+        for collector in list(self._collectors.values()):
+            try:
+                samples.extend(collector())
+            except Exception:
+                continue
+        # Keep each gauge's samples together for the text format
+        return sorted(samples, key=lambda sample: sample[0])
+
+    def to_json(self) -> Dict[str, object]:
+        data: Dict[str, object] = {}
+        for metric in self._metrics:
+            series = [
+                {"labels": dict(zip(metric.labelnames, labels)), **({"value": value} if isinstance(metric, Counter) else value)}
+                for labels, value in sorted(metric.values().items())
+            ]
+            data[metric.name] = {
+                "type": "counter" if isinstance(metric, Counter) else "histogram",
+                "help": metric.help,
+                "series": series,
+            }
+        for name, help_text, labels, value in self._collected():
+            entry = data.setdefault(name, {"type": "gauge", "help": help_text, "series": []})
+            entry["series"].append({"labels": labels, "value": value})
+        return data
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            kind = "counter" if isinstance(metric, Counter) else "histogram"
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for labels, value in sorted(metric.values().items()):
+                label_pairs = list(zip(metric.labelnames, labels))
+                if isinstance(metric, Counter):
+                    lines.append(f"{metric.name}{_format_labels(label_pairs)} {_format_value(value)}")
+                    continue
+                for bound, count in value["buckets"].items():
+                    lines.append(f"{metric.name}_bucket{_format_labels(label_pairs + [('le', bound)])} {count}")
+                lines.append(f"{metric.name}_sum{_format_labels(label_pairs)} {_format_value(value['sum'])}")
+                lines.append(f"{metric.name}_count{_format_labels(label_pairs)} {value['count']}")
+
+        seen = set()
+        for name, help_text, labels, value in self._collected():
+            if name not in seen:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(list(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+
+STAGE_LATENCY = metrics.histogram(
+    "rag_stage_latency_seconds", "Latency of each RAG query stage", ("stage",)
+)
+QUERIES = metrics.counter("rag_queries_total", "RAG queries processed", ("role",))
+ERRORS = metrics.counter("rag_errors_total", "RAG queries that failed", ("role",))
+TOKENS = metrics.counter("rag_llm_tokens_total", "LLM tokens sent and received", ("role", "direction"))
+CACHE_LOOKUPS = metrics.counter("rag_answer_cache_lookups_total", "Answer cache lookups by result", ("role", "result"))
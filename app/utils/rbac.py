@@ -1,6 +1,9 @@
 # ds-rpc-02/app/utils/rbac.py
 
+import os
+import threading
 from pathlib import Path
+from typing import Dict, List, Set, Optional
 
 # Define the base path to your data resources
 RESOURCES_PATH = Path(__file__).parent.parent.parent / "resources" / "data"
@@ -22,24 +25,89 @@ ROLE_PERMISSIONS = {
     ],
 }
 
-def get_accessible_files(role: str):
+# Role -> department names, derived once from ROLE_PERMISSIONS
+ROLE_DEPARTMENTS: Dict[str, List[str]] = {
+    role: [path.name for path in paths] for role, paths in ROLE_PERMISSIONS.items()
+}
+
+
+class AccessIndex:
     """
-    Retrieves a list of all file paths a given role has access to.
+    Precomputed role -> departments -> files index.
+
+    Built from the ingestion file listing and rebuilt whole once a new index
+    generation is live, so authorization checks are dictionary lookups
+    instead of walks over the resources tree. A rebuild swaps in new maps
+    rather than changing the current ones, so readers need no lock.
     """
-    accessible_files = []
-    if role in ROLE_PERMISSIONS:
-        for path in ROLE_PERMISSIONS[role]:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_departments: Dict[str, str] = {}
+        self._department_files: Dict[str, Set[str]] = {}
+        self.built = False
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.abspath(path)
+
+    def build(self, files: Dict[str, str]) -> None:
+        """Replace the index with a file path -> department mapping."""
+        file_departments = {self._normalize(path): dept for path, dept in files.items()}
+        department_files: Dict[str, Set[str]] = {}
+        for path, dept in file_departments.items():
+            department_files.setdefault(dept, set()).add(path)
+        with self._lock:
+            self._file_departments = file_departments
+            self._department_files = department_files
+            self.built = True
+
+    def departments_for_role(self, role: str) -> List[str]:
+        return ROLE_DEPARTMENTS.get(role, [])
+
+    def files_for_role(self, role: str) -> List[str]:
+        files = []
+        department_files = self._department_files
+        for department in self.departments_for_role(role):
+            files.extend(department_files.get(department, ()))
+        return files
+
+    def department_of(self, path: str) -> Optional[str]:
+        return self._file_departments.get(self._normalize(path))
+
+    def can_access(self, role: str, path: str) -> bool:
+        department = self.department_of(path)
+        return department is not None and department in ROLE_DEPARTMENTS.get(role, ())
+
+
+access_index = AccessIndex()
+
+
+def _ensure_index() -> None:
+    """Build the index from disk once if ingestion has not populated it yet."""
+    if access_index.built:
+        return
+    files = {}
+    for paths in ROLE_PERMISSIONS.values():
+        for path in paths:
             if path.is_dir():
-                # Add all files in the directory
                 for file_path in path.rglob('*'):
                     if file_path.is_file():
-                        accessible_files.append(str(file_path))
-    return accessible_files
+                        files[str(file_path)] = path.name
+    access_index.build(files)
+
+
+def get_accessible_files(role: str):
+    """
+    Retrieves a list of all file paths a given role has access to.
+    """
+    _ensure_index()
+    return access_index.files_for_role(role)
 
 
 def validate_user_access(role: str, resource_path: str) -> bool:
     """
     Validates if the given role has access to the specified resource path.
     """
-    accessible_files = get_accessible_files(role)
-    return resource_path in accessible_files
+    _ensure_index()
+    return access_index.can_access(role, resource_path)
@@ -0,0 +1,276 @@
+# ds-rpc-01/app/utils/shared_state.py
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Expired rows are purged on roughly one write in this many
+PURGE_EVERY_WRITES = 1000
+# Namespaces are trimmed to their size limit on one write in this many
+TRIM_EVERY_WRITES = 50
+
+
+class SharedState:
+    """Counters and TTL entries in one SQLite file shared by every worker process.
+
+    Used when the app runs with several uvicorn workers, so rate limits,
+    verified-password checks and cached answers are the same for every worker.
+    WAL mode lets readers proceed while one process writes; counter updates
+    run in an IMMEDIATE transaction so concurrent increments are never lost.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, expires_at REAL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(namespace, created_at)")
+        logger.info(f"Shared state opened at {path}")
+
+    # Counters -------------------------------------------------------------
+
+    def incr(self, key: str, amount: int = 1, expiry: Optional[float] = None) -> int:
+        """Add ``amount`` to a counter and return the new value.
+
+        A counter with an ``expiry`` (seconds) starts over from zero once it has
+        expired; the expiry is set when the counter is created, not extended.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+                if row is None or (row[1] is not None and row[1] <= now):
+                    value = amount
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, now + expiry if expiry else None)
+                    )
+                else:
+                    value = row[0] + amount
+                    self._conn.execute("UPDATE counters SET value = ? WHERE key = ?", (value, key))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+        return value
+
+    def counter(self, key: str) -> int:
+        row = self._read("SELECT value, expires_at FROM counters WHERE key = ?", (key,))
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return 0
+        return row[0]
+
+    def counters(self, keys: List[str]) -> Dict[str, int]:
+        """Values of several counters read in one query; missing or expired ones are 0."""
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, expires_at FROM counters WHERE key IN ({', '.join('?' * len(keys))})", keys
+            ).fetchall()
+        now = time.time()
+        values = dict.fromkeys(keys, 0)
+        for key, value, expires_at in rows:
+            if expires_at is None or expires_at > now:
+                values[key] = value
+        return values
+
+    def counter_expiry(self, key: str) -> float:
+        """Epoch time at which the counter expires (now if it has none or does not exist)."""
+        row = self._read("SELECT expires_at FROM counters WHERE key = ?", (key,))
+        return row[0] if row and row[0] is not None else time.time()
+
+    def delete_counter(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def delete_counters(self, prefix: str = "") -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM counters WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).rowcount
+
+    # Entries --------------------------------------------------------------
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._read("SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, max_entries: Optional[int] = None) -> None:
+        """Store a JSON-serializable value.
+
+        Beyond ``max_entries`` the oldest entries of the namespace are dropped;
+        the limit is enforced every TRIM_EVERY_WRITES writes, so it may be
+        briefly exceeded.
+        """
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, data, now, now + ttl if ttl else None)
+            )
+            if max_entries is not None and self._writes % TRIM_EVERY_WRITES == 0:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM entries WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+                    (namespace, namespace, max_entries)
+                )
+            self._after_write()
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def clear_prefix(self, prefix: str) -> None:
+        """Delete every namespace starting with ``prefix``."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE substr(namespace, 1, ?) = ?", (len(prefix), prefix))
+
+    def count(self, namespace: str) -> int:
+        row = self._read("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,))
+        return row[0]
+
+    # Internals ------------------------------------------------------------
+
+    def _read(self, sql: str, params: tuple) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _after_write(self) -> None:
+        """Purge expired rows every PURGE_EVERY_WRITES writes; called with the lock held."""
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES:
+            return
+        now = time.time()
+        self._conn.execute("DELETE FROM counters WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SharedTTLCache:
+    """Dict-like TTL cache over a SharedState namespace, a drop-in for ``cachetools.TTLCache``."""
+
+    def __init__(self, state: SharedState, namespace: str, maxsize: int, ttl: float):
+        self.state = state
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.state.get(self.namespace, key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.state.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.state.get(self.namespace, key) is not None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.state.set(self.namespace, key, value, ttl=self.ttl, max_entries=self.maxsize)
+
+    def __delitem__(self, key: str) -> None:
+        self.state.delete(self.namespace, key)
+
+    def __len__(self) -> int:
+        return self.state.count(self.namespace)
+
+    def clear(self) -> None:
+        self.state.clear(self.namespace)
+
+
+class SQLiteLimitStorage(Storage):
+    """``limits`` storage on a SharedState file, so slowapi limits hold across worker processes.
+
+    Registered for ``sqlite:///path/to/file.sqlite3`` storage URIs; supports the
+    fixed-window strategy slowapi uses by default.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    KEY_PREFIX = "ratelimit:"
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options: Any):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri[len("sqlite://"):]
+        if path.startswith("//"):
+            # sqlite:////abs/path (SQLAlchemy style) names the same file as sqlite:///abs/path
+            path = "/" + path.lstrip("/")
+        self.state = open_shared_state(path)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self.state.incr(self.KEY_PREFIX + key, amount, expiry)
+
+    def get(self, key: str) -> int:
+        return self.state.counter(self.KEY_PREFIX + key)
+
+    def get_expiry(self, key: str) -> float:
+        return self.state.counter_expiry(self.KEY_PREFIX + key)
+
+    def check(self) -> bool:
+        try:
+            self.state.counter(self.KEY_PREFIX)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self.state.delete_counters(self.KEY_PREFIX)
+
+    def clear(self, key: str) -> None:
+        self.state.delete_counter(self.KEY_PREFIX + key)
+
+
+_shared_states: Dict[str, SharedState] = {}
+
+
+def limit_storage_uri(path: str) -> str:
+    """``limits`` storage URI of a SharedState file, opening the same instance as ``open_shared_state``."""
+    return f"sqlite://{os.path.abspath(path)}"
+
+
+def open_shared_state(path: str) -> SharedState:
+    """One SharedState per file and process."""
+    path = os.path.abspath(path)
+    if path not in _shared_states:
+        _shared_states[path] = SharedState(path)
+    return _shared_states[path]
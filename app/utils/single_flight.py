@@ -0,0 +1,73 @@
+# ds-rpc-01/app/utils/single_flight.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+    def joinable(self) -> bool:
+        """Whether a new caller can still wait for this computation's result."""
+        return not (self.abandoned or self.task.done())
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key starts the computation as a task; callers that
+    arrive while it is running await the same task. A caller that is cancelled
+    (e.g. its client disconnected) only stops waiting: the computation keeps
+    running for the others, and is cancelled only once nobody is waiting.
+    The key is released as soon as the computation finishes, so results are
+    never served from here after the fact (that is the answer cache's job).
+    A caller that arrives after the computation finished or was cancelled,
+    but before its key was released, starts a new one.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of ``compute()``, shared with concurrent callers of the same key."""
+        flight = self._flights.get(key)
+        if flight is None or not flight.joinable():
+            flight = _Flight(asyncio.ensure_future(compute()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._release(key, flight))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            # shield: cancelling this caller must not cancel the shared task
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                self.stats["abandoned"] += 1
+                flight.abandoned = True
+                logger.debug(f"Cancelling abandoned computation for {key!r}")
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _release(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled() and flight.task.exception() is not None and flight.waiters == 0:
+            # Nobody is left to receive the error; retrieve it so asyncio does not log it as unhandled
+            logger.debug(f"Computation for {key!r} failed after all callers left: {flight.task.exception()}")
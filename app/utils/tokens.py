@@ -0,0 +1,39 @@
+# ds-rpc-01/app/utils/tokens.py
+
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+# Rough characters-per-token ratio for English text, used when no encoding is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str = None):
+    """Return the tiktoken encoding for a model, falling back to cl100k_base.
+
+    Returns None when the encoding files cannot be loaded (e.g. offline hosts
+    without a tiktoken cache), in which case token counts are estimated.
+    """
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count the tokens ``text`` takes up for the given model."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
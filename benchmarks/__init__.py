@@ -0,0 +1 @@
+# ds-rpc-01/benchmarks/__init__.py
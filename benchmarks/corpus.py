@@ -0,0 +1,34 @@
+# ds-rpc-01/benchmarks/corpus.py
+
+import shutil
+from pathlib import Path
+
+TEXT_SUFFIXES = {".md", ".txt"}
+
+
+def build_synthetic_corpus(source: str, destination: str, scale: int) -> Path:
+    """Copy ``source`` into ``destination`` with every file repeated ``scale`` times.
+
+    Copies keep their department folder. Text copies get a distinct heading so
+    their chunks hash differently; other files are copied byte for byte and
+    differ only by path, which is enough for distinct chunk IDs.
+    """
+    source_path = Path(source)
+    destination_path = Path(destination)
+    if destination_path.exists():
+        shutil.rmtree(destination_path)
+    for file_path in source_path.rglob("*"):
+        if not file_path.is_file():
+            continue
+        relative = file_path.relative_to(source_path)
+        for copy in range(scale):
+            target = destination_path / relative
+            if copy:
+                target = target.with_name(f"{target.stem}_copy{copy}{target.suffix}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if copy and file_path.suffix.lower() in TEXT_SUFFIXES:
+                text = file_path.read_text(encoding="utf-8", errors="ignore")
+                target.write_text(f"# Copy {copy} of {file_path.name}\n\n{text}", encoding="utf-8")
+            else:
+                shutil.copyfile(file_path, target)
+    return destination_path
@@ -0,0 +1,344 @@
+# ds-rpc-01/benchmarks/run.py
+"""Offline benchmark harness for ingestion, retrieval and end-to-end chat.
+
+Runs without network access or an OpenAI key: embeddings come from
+HashingEmbeddings and answers from FakeChatModel. Results are written as JSON.
+
+    python -m benchmarks.run --scales 1,4,16 --output bench_output.json
+"""
+
+import os
+
+# The app builds its OpenAI-backed singleton at import time; it is replaced
+# below and never called. The embedding cache is disabled so every run
+# measures real embedding work.
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+from app.config import RESOURCES_PATH, HYBRID_CANDIDATES
+from app.services.document_loader import DocumentLoader
+from app.services.vector_store import VectorStoreService, NumpyIndexBackend
+from app.services.ingestion_manifest import assign_chunk_ids
+from app.services.answer_cache import AnswerCache
+from app.utils.rbac import access_index
+from benchmarks.corpus import build_synthetic_corpus
+from benchmarks.fakes import HashingEmbeddings, FakeChatModel
+
+logger = logging.getLogger("benchmarks")
+
+# (role, question) pairs drawn from the sample corpus, cycled through in every timed loop
+QUERIES = [
+    ("finance", "What was the revenue growth in the last quarter?"),
+    ("finance", "Summarize operating expenses and cash flow"),
+    ("marketing", "How did the marketing campaigns perform?"),
+    ("hr", "What is the leave policy for employees?"),
+    ("hr", "Who is the manager of FINEMP1000?"),
+    ("engineering", "Describe the system architecture and deployment process"),
+    ("employee", "What are the company holidays?"),
+    ("c-level", "Give an overview of the company's financial and marketing performance"),
+]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "min_ms": round(float(values.min()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def bench_loading(corpus: Path, workers: int) -> Dict[str, Any]:
+    loader = DocumentLoader(str(corpus), max_workers=workers)
+    files = loader.discover_files()
+    size_bytes = sum(Path(path).stat().st_size for path in files)
+    start = time.perf_counter()
+    department_docs = loader.load_all_documents()
+    seconds = time.perf_counter() - start
+    chunks = sum(len(docs) for docs in department_docs.values())
+    return {
+        "workers": loader.max_workers,
+        "files": len(files),
+        "bytes": size_bytes,
+        "chunks": chunks,
+        "seconds": round(seconds, 4),
+        "files_per_second": round(len(files) / seconds, 2),
+        "chunks_per_second": round(chunks / seconds, 2),
+        "mb_per_second": round(size_bytes / seconds / 1e6, 3),
+    }, department_docs
+
+
+def bench_store(department_docs, backend: str, embedding_model: HashingEmbeddings, iterations: int) -> Dict[str, Any]:
+    """Build a fresh store from pre-loaded chunks, then time role-scoped searches."""
+    documents, ids = [], []
+    by_file: Dict[str, List[Any]] = {}
+    for docs in department_docs.values():
+        for doc in docs:
+            by_file.setdefault(doc.metadata["file_path"], []).append(doc)
+    for file_path, docs in by_file.items():
+        ids.extend(assign_chunk_ids(docs, file_path))
+        documents.extend(docs)
+
+    with tempfile.TemporaryDirectory(prefix="bench-store-") as persist_directory:
+        store = VectorStoreService(
+            openai_api_key=None,
+            persist_directory=persist_directory,
+            index_backend=backend,
+            embedding_model=embedding_model
+        )
+        try:
+            start = time.perf_counter()
+            store.add_document_batch(documents, ids)
+            store.persist()
+            build_seconds = time.perf_counter() - start
+
+            for role, question in QUERIES:
+                store.similarity_search(question, role)  # warm-up
+            latencies = []
+            for i in range(iterations):
+                role, question = QUERIES[i % len(QUERIES)]
+                start = time.perf_counter()
+                store.similarity_search(question, role)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            store.close()
+
+    return {
+        "backend": backend,
+        "chunks": len(documents),
+        "build_seconds": round(build_seconds, 4),
+        "build_chunks_per_second": round(len(documents) / build_seconds, 2),
+        "similarity_search": summarize(latencies),
+    }
+
+
+def bench_quantization(department_docs, modes: List[str], rescore_factor: int, embedding_model: HashingEmbeddings, iterations: int) -> List[Dict[str, Any]]:
+    """Recall against exact float32 search, index memory and search latency per quantization mode.
+
+    Queries are the benchmark questions plus chunk texts, searched for the
+    top HYBRID_CANDIDATES chunks as the service does. A hit counts towards
+    recall when its exact cosine is at least the k-th best one, so duplicated
+    chunks with tied scores are interchangeable.
+    """
+    documents = [doc for docs in department_docs.values() for doc in docs]
+    texts = [doc.page_content for doc in documents]
+    ids = [str(i) for i in range(len(documents))]
+    metadatas = [{"department": doc.metadata["department"]} for doc in documents]
+    vectors = embedding_model.embed_documents(texts)
+    step = max(len(texts) // max(iterations - len(QUERIES), 1), 1)
+    queries = embedding_model.embed_documents([question for _, question in QUERIES] + texts[::step])[:iterations]
+    k = min(HYBRID_CANDIDATES, len(documents))
+    matrix = np.asarray(vectors, dtype=np.float32)
+    exact_scores = np.asarray(queries, dtype=np.float32) @ matrix.T
+    thresholds = np.sort(exact_scores, axis=1)[:, -k] - 1e-5
+
+    results = []
+    for mode in modes:
+        with tempfile.TemporaryDirectory(prefix="bench-quantization-") as persist_directory:
+            index = NumpyIndexBackend("bench", persist_directory, ann_threshold=len(documents) + 1,
+                                      quantization=mode, rescore_factor=rescore_factor)
+            start = time.perf_counter()
+            index.upsert(ids, vectors, metadatas, texts)
+            index.persist()
+            build_seconds = time.perf_counter() - start
+
+            latencies, recalls = [], []
+            for i, query in enumerate(queries):
+                start = time.perf_counter()
+                hits = index.search(query, k)
+                latencies.append(time.perf_counter() - start)
+                rows = [int(doc.id) for doc, _ in hits]
+                recalls.append(float(np.sum(exact_scores[i, rows] >= thresholds[i])) / k)
+            memory_bytes = index.memory_bytes()
+        results.append({
+            "quantization": mode,
+            "rescore_factor": rescore_factor if mode != "none" else 0,
+            "vectors": len(documents),
+            "k": k,
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "memory_bytes": memory_bytes,
+            "bytes_per_vector": round(memory_bytes / len(documents), 1),
+            "build_seconds": round(build_seconds, 4),
+            "search": summarize(latencies),
+        })
+    return results
+
+
+async def bench_chat(corpus: Path, backend: str, args) -> Dict[str, Any]:
+    """Drive POST /api/chat through the ASGI app with fake models behind it."""
+    import httpx
+    import app.main as main_module
+    from app.services.rag_service import RagService
+
+    rag = RagService(
+        llm=FakeChatModel(latency_ms=args.llm_latency_ms, token_latency_ms=args.llm_token_latency_ms),
+        embedding_model=HashingEmbeddings(dimensions=args.dimensions, latency_ms=args.embedding_latency_ms),
+        index_backend=backend
+    )
+    rag.document_loader = DocumentLoader(str(corpus), max_workers=args.workers)
+    if not args.answer_cache:
+        rag.answer_cache = AnswerCache(max_entries_per_role=0)
+
+    with tempfile.TemporaryDirectory(prefix="bench-chat-") as persist_directory:
+        start = time.perf_counter()
+        await rag.initialize(persist_directory)
+        ingest_seconds = time.perf_counter() - start
+
+        main_module.rag_service = rag
+        main_module.limiter.enabled = False
+        tokens = {
+            user.role: main_module.create_access_token(data={"sub": user.username})
+            for user in main_module.users_db.values()
+        }
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            async def send(i: int) -> None:
+                role, question = QUERIES[i % len(QUERIES)]
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/chat",
+                        json={"message": question},
+                        headers={"Authorization": f"Bearer {tokens[role]}"}
+                    )
+                    latencies.append(time.perf_counter() - start)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+            await send(0)  # warm-up
+            latencies.clear()
+            statuses.clear()
+            start = time.perf_counter()
+            await asyncio.gather(*(send(i) for i in range(args.chat_requests)))
+            wall_seconds = time.perf_counter() - start
+        await rag.cleanup()
+
+    return {
+        "backend": backend,
+        "ingest_seconds": round(ingest_seconds, 4),
+        "chunks": rag.vector_store.document_count(),
+        "requests": args.chat_requests,
+        "concurrency": args.concurrency,
+        "llm_latency_ms": args.llm_latency_ms,
+        "embedding_latency_ms": args.embedding_latency_ms,
+        "answer_cache": args.answer_cache,
+        "status_codes": statuses,
+        "requests_per_second": round(args.chat_requests / wall_seconds, 2),
+        "latency": summarize(latencies),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion, retrieval and chat.")
+    parser.add_argument("--source", default=RESOURCES_PATH, help="corpus to scale up (default: resources/data)")
+    parser.add_argument("--scales", default="1,4", help="comma-separated corpus scale factors")
+    parser.add_argument("--backends", default="chroma,numpy", help="comma-separated vector index backends")
+    parser.add_argument("--workers", type=int, default=0, help="loader processes; 0 picks the default")
+    parser.add_argument("--dimensions", type=int, default=1536, help="fake embedding dimensions")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--search-iterations", type=int, default=200)
+    parser.add_argument("--quantization", default="none,float16,int8,pq",
+                        help="comma-separated NumPy index quantization modes to compare; empty skips it")
+    parser.add_argument("--rescore-factor", type=int, default=16, help="full-precision rescoring factor for quantized modes")
+    parser.add_argument("--chat-scale", type=int, default=1, help="corpus scale for the end-to-end chat run; 0 skips it")
+    parser.add_argument("--chat-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache enabled in the chat run")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, force=True)
+    logger.setLevel(logging.INFO)
+    scales = [int(scale) for scale in args.scales.split(",") if scale]
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    quantization_modes = [mode.strip() for mode in args.quantization.split(",") if mode.strip()]
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "loading": [],
+        "store": [],
+        "quantization": [],
+        "chat": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench-corpus-") as workdir:
+        for scale in sorted(set(scales + ([args.chat_scale] if args.chat_scale else []))):
+            corpus = build_synthetic_corpus(args.source, os.path.join(workdir, f"scale_{scale}"), scale)
+            access_index.build(DocumentLoader(str(corpus)).discover_files())
+
+            if scale in scales:
+                logger.info(f"Scale {scale}: loading documents")
+                loading, department_docs = bench_loading(corpus, args.workers)
+                results["loading"].append({"scale": scale, **loading})
+                for backend in backends:
+                    logger.info(f"Scale {scale}: building and searching the {backend} store")
+                    embedding_model = HashingEmbeddings(dimensions=args.dimensions, latency_ms=args.embedding_latency_ms)
+                    results["store"].append({"scale": scale, **bench_store(department_docs, backend, embedding_model, args.search_iterations)})
+                if quantization_modes:
+                    logger.info(f"Scale {scale}: comparing quantized NumPy indexes")
+                    embedding_model = HashingEmbeddings(dimensions=args.dimensions)
+                    results["quantization"].extend(
+                        {"scale": scale, **result}
+                        for result in bench_quantization(department_docs, quantization_modes, args.rescore_factor, embedding_model, args.search_iterations)
+                    )
+
+            if scale == args.chat_scale:
+                for backend in backends:
+                    logger.info(f"Scale {scale}: end-to-end /api/chat with the {backend} store")
+                    results["chat"].append({"scale": scale, **asyncio.run(bench_chat(corpus, backend, args))})
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        logger.info(f"Wrote results to {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
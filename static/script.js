@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', () => {
         ENDPOINTS: {
             USER_INFO: '/api/user-info',
             CHAT: '/api/chat',
+            CHAT_STREAM: '/api/chat/stream',
             HEALTH: '/api/health',
             METRICS: '/api/metrics'
         },
@@ -56,6 +57,7 @@ document.addEventListener('DOMContentLoaded', () => {
             this.startTime = Date.now();
             this.lastActivity = Date.now();
             this.retryCount = 0;
+            this.activeStream = null;
         }
 
         setUser(userData, creds) {
@@ -67,6 +69,10 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         clearUser() {
+            if (this.activeStream) {
+                this.activeStream.abort();
+                this.activeStream = null;
+            }
             this.user = null;
             this.credentials = null;
             this.isAuthenticated = false;
@@ -227,6 +233,58 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         },
 
+        // Server-Sent Events over POST: calls onEvent(event, data) for every event received
+        async streamRequest(url, body, onEvent, controller) {
+            const response = await fetch(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                    ...(appState.credentials && { 'Authorization': `Basic ${appState.credentials}` })
+                },
+                body: JSON.stringify(body),
+                signal: controller.signal
+            });
+
+            if (!response.ok) {
+                if (response.status === 429) {
+                    throw new Error('Rate limit exceeded. Please slow down.');
+                }
+                if (response.status === 401) {
+                    appState.clearUser();
+                    showLogin();
+                    throw new Error('Authentication required');
+                }
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventName = 'message';
+                    const dataLines = [];
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+                    });
+                    if (dataLines.length) {
+                        onEvent(eventName, JSON.parse(dataLines.join('\n')));
+                    }
+                }
+            }
+        },
+
         // Enhanced error handling
         handleError(error, context = '') {
             console.error(`Error in ${context}:`, error);
@@ -519,6 +577,47 @@ I'm your RAG-powered assistant with access to **${config.files.length} documents
         }
     }
 
+    // Bot bubble that renders tokens as they arrive; replaced by a regular message when done
+    function startStreamingMessage() {
+        const messageWrapper = document.createElement('div');
+        messageWrapper.classList.add('message-wrapper', 'fade-in');
+        messageWrapper.innerHTML = `
+            <div class="flex w-full">
+                <div class="w-8 h-8 rounded-full bg-gradient-to-r from-indigo-500 to-purple-600 flex items-center justify-center text-white font-bold text-sm flex-shrink-0 mr-3">
+                    AI
+                </div>
+                <div class="message-bubble bot flex-1">
+                    <div class="prose dark:prose-invert prose-sm max-w-none"></div>
+                </div>
+            </div>
+        `;
+        chatContainer.appendChild(messageWrapper);
+        const content = messageWrapper.querySelector('.prose');
+
+        let text = '';
+        let renderPending = false;
+
+        return {
+            appendToken(token) {
+                text += token;
+                if (renderPending) return;
+                renderPending = true;
+                requestAnimationFrame(() => {
+                    renderPending = false;
+                    content.innerHTML = marked.parse(text);
+                    chatContainer.scrollTop = chatContainer.scrollHeight;
+                });
+            },
+            finish(sources = [], metadata = {}) {
+                messageWrapper.remove();
+                addMessage('bot', text, sources, metadata);
+            },
+            get text() {
+                return text;
+            }
+        };
+    }
+
     function clearChat() {
         chatContainer.innerHTML = `
             <div class="text-center text-gray-500 dark:text-gray-400">
@@ -664,21 +763,44 @@ I'm your RAG-powered assistant with access to **${config.files.length} documents
                 }
             };
             
-            const response = await utils.apiRequest(CONFIG.ENDPOINTS.CHAT, {
-                method: 'POST',
-                body: JSON.stringify(requestBody),
-                timeout: CONFIG.TIMEOUTS.CHAT
-            });
-            
-            const data = await response.json();
-            
+            const controller = new AbortController();
+            appState.activeStream = controller;
+            const startedAt = Date.now();
+            let streamingMessage = null;
+            let sources = [];
+
+            await utils.streamRequest(CONFIG.ENDPOINTS.CHAT_STREAM, requestBody, (event, data) => {
+                if (event === 'sources') {
+                    sources = data;
+                } else if (event === 'token') {
+                    if (!streamingMessage) {
+                        removeTypingIndicator();
+                        streamingMessage = startStreamingMessage();
+                    }
+                    streamingMessage.appendToken(data);
+                } else if (event === 'error') {
+                    throw new Error(data);
+                }
+            }, controller);
+
             removeTypingIndicator();
-            addMessage('bot', data.response, data.sources || [], data.metadata || {});
+            const metadata = {
+                processing_time_ms: Date.now() - startedAt,
+                sources_found: sources.length
+            };
+            if (streamingMessage) {
+                streamingMessage.finish(sources, metadata);
+            } else {
+                addMessage('bot', 'No response received.', sources, metadata);
+            }
             
         } catch (error) {
             removeTypingIndicator();
-            addMessage('bot', utils.handleError(error, 'chat'));
+            if (error.name !== 'AbortError') {
+                addMessage('bot', utils.handleError(error, 'chat'));
+            }
         } finally {
+            appState.activeStream = null;
             sendBtn.disabled = false;
             sendBtn.innerHTML = `
                 <svg class="w-4 h-4 mr-2" fill="none" stroke="currentColor" viewBox="0 0 24 24">
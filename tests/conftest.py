@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The app reads its configuration at import time: keep the tests away from the
+# embedding cache and audit log of a local deployment.
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("AUDIT_LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="ds-rpc-tests-"), "audit.jsonl"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
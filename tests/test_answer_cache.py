@@ -0,0 +1,87 @@
+import asyncio
+
+from app.services.answer_cache import AnswerCache
+from app.utils.shared_state import SharedState
+
+ANSWER = {"answer": "Revenue grew 12%."}
+
+
+def test_exact_hits_ignore_case_whitespace_and_trailing_punctuation():
+    cache = AnswerCache()
+    cache.store("finance", "What was Q3 revenue?", ANSWER, departments=["finance"])
+
+    assert cache.lookup_exact("finance", "  what was q3   REVENUE ") == ANSWER
+    assert cache.lookup_exact("finance", "What was Q4 revenue?") is None
+
+
+def test_answers_never_cross_roles():
+    cache = AnswerCache()
+    cache.store("finance", "What was Q3 revenue?", ANSWER, embedding=[1.0, 0.0], departments=["finance"])
+
+    assert cache.lookup_exact("hr", "What was Q3 revenue?") is None
+    assert cache.lookup_similar("hr", [1.0, 0.0]) is None
+
+
+def test_near_duplicate_questions_hit_the_semantic_tier():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.store("finance", "What was Q3 revenue?", ANSWER, embedding=[1.0, 0.0], departments=["finance"])
+
+    assert cache.lookup_similar("finance", [0.99, 0.05]) == ANSWER
+    assert cache.lookup_similar("finance", [0.5, 0.5]) is None
+
+
+def test_reingesting_a_department_invalidates_only_answers_drawn_from_it():
+    cache = AnswerCache()
+    cache.store("c-level", "revenue", ANSWER, embedding=[1.0, 0.0], departments=["finance"])
+    cache.store("c-level", "leave policy", {"answer": "20 days"}, embedding=[0.0, 1.0], departments=["hr"])
+
+    cache.invalidate_departments(["finance"])
+
+    assert cache.lookup_exact("c-level", "revenue") is None
+    assert cache.lookup_similar("c-level", [1.0, 0.0]) is None
+    assert cache.lookup_exact("c-level", "leave policy") == {"answer": "20 days"}
+
+
+def test_answers_without_known_departments_are_invalidated_by_any_reingestion():
+    cache = AnswerCache()
+    cache.store("employee", "who am i", ANSWER, departments=None)
+
+    cache.invalidate_departments(["marketing"])
+
+    assert cache.lookup_exact("employee", "who am i") is None
+
+
+def test_expired_answers_are_not_served():
+    cache = AnswerCache(ttl_seconds=-1)
+    cache.store("finance", "revenue", ANSWER, departments=["finance"])
+
+    assert cache.lookup_exact("finance", "revenue") is None
+
+
+def test_least_recently_used_answers_are_evicted_per_role():
+    cache = AnswerCache(max_entries_per_role=2)
+    for question in ["a", "b"]:
+        cache.store("finance", question, {"answer": question}, departments=["finance"])
+    cache.lookup_exact("finance", "a")
+    cache.store("finance", "c", {"answer": "c"}, departments=["finance"])
+
+    assert cache.lookup_exact("finance", "b") is None
+    assert cache.lookup_exact("finance", "a") == {"answer": "a"}
+    assert cache.stats["evictions"] == 1
+
+
+def test_workers_share_answers_and_invalidations(tmp_path):
+    state = SharedState(str(tmp_path / "shared.sqlite3"))
+    first, second = AnswerCache(shared=state), AnswerCache(shared=state)
+
+    async def scenario():
+        await first.astore("finance", "revenue", ANSWER, departments=["finance"])
+        shared_hit = await second.alookup_exact("finance", "revenue")
+        second.invalidate_departments(["finance"])
+        return shared_hit, await first.alookup_exact("finance", "revenue")
+
+    shared_hit, after_invalidation = asyncio.run(scenario())
+    state.close()
+
+    assert shared_hit == ANSWER
+    assert after_invalidation is None
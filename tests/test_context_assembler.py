@@ -0,0 +1,80 @@
+from langchain_core.documents import Document
+
+from app.services import context_assembler
+from app.services.context_assembler import ContextAssembler, context_token_budget
+from app.utils.tokens import count_tokens
+
+TEXT = " ".join(f"word{i}" for i in range(400))
+
+
+def chunk(start: int, end: int, filename: str = "report.md", **metadata) -> Document:
+    return Document(
+        page_content=TEXT[start:end],
+        metadata={"file_path": f"/data/{filename}", "filename": filename, "start_index": start, **metadata},
+    )
+
+
+def test_budget_uses_the_longest_matching_model_prefix(monkeypatch):
+    monkeypatch.setattr(context_assembler, "CONTEXT_TOKEN_BUDGET", 0)
+
+    assert context_token_budget("gpt-4o-mini") == 6000
+    assert context_token_budget("gpt-4-0613") == 3000
+    assert context_token_budget("llama3") == context_assembler.DEFAULT_CONTEXT_TOKEN_BUDGET
+
+    monkeypatch.setattr(context_assembler, "CONTEXT_TOKEN_BUDGET", 1234)
+    assert context_token_budget("gpt-4o") == 1234
+
+
+def test_overlapping_chunks_of_a_file_are_sent_once():
+    documents = [chunk(0, 300), chunk(250, 550), chunk(545, 800)]
+
+    context, used = ContextAssembler(token_budget=10_000).assemble(documents)
+
+    assert context == f"[Source: report.md]\n{TEXT[0:800]}"
+    assert used == documents
+
+
+def test_chunks_without_offsets_merge_on_their_text_overlap():
+    documents = [
+        Document(page_content=TEXT[0:300], metadata={"source": "notes.txt"}),
+        Document(page_content=TEXT[250:600], metadata={"source": "notes.txt"}),
+    ]
+
+    context, _ = ContextAssembler(token_budget=10_000).assemble(documents)
+
+    assert context == f"[Source: notes.txt]\n{TEXT[0:600]}"
+
+
+def test_near_duplicate_passages_from_other_files_are_dropped():
+    original = chunk(0, 300, "a.md")
+    copy = Document(page_content=TEXT[0:300] + " copy", metadata={"file_path": "/data/b.md", "filename": "b.md"})
+    other = chunk(1000, 1300, "c.md")
+
+    context, used = ContextAssembler(token_budget=10_000).assemble([original, copy, other])
+
+    assert used == [original, other]
+    assert "[Source: b.md]" not in context
+
+
+def test_passages_are_packed_in_rank_order_within_the_budget():
+    documents = [chunk(i * 600, i * 600 + 400, f"file{i}.md", section=f"Part {i}") for i in range(4)]
+    # Too little is left after two passages to start a truncated third
+    budget = sum(count_tokens(f"[Source: file{i}.md > Part {i}]\n{documents[i].page_content}") for i in range(2)) + 20
+
+    context, used = ContextAssembler(token_budget=budget).assemble(documents)
+
+    assert count_tokens(context) <= budget + 2
+    assert used == documents[:2]
+    assert context.startswith("[Source: file0.md > Part 0]")
+    assert context.index("file0.md") < context.index("file1.md")
+
+
+def test_the_last_passage_is_truncated_when_enough_budget_remains():
+    documents = [chunk(0, 400, "a.md"), chunk(1000, 1400, "b.md")]
+    first_tokens = count_tokens(f"[Source: a.md]\n{documents[0].page_content}")
+
+    context, used = ContextAssembler(token_budget=first_tokens + 60).assemble(documents)
+
+    assert used == documents
+    second = context.split("\n\n")[1]
+    assert second.startswith("[Source: b.md]") and len(second) < len(documents[1].page_content)
@@ -0,0 +1,95 @@
+from app.services import document_loader
+from app.services.document_loader import DocumentLoader, FILE_COMPLETE, FILE_FAILED, FILE_PART
+from app.utils.tokens import count_tokens
+
+
+def write_csv(path, rows, bad_row_at=None):
+    lines = ["id,amount"]
+    for i in range(rows):
+        if i == bad_row_at:
+            lines.append("1,2,3,4")
+        lines.append(f"{i},{i * 10}")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_csv_that_fails_part_way_ends_with_a_failed_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_READ_BATCH_ROWS", 4)
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_ROWS", 2)
+    path = tmp_path / "finance" / "ledger.csv"
+    path.parent.mkdir()
+    write_csv(path, 20, bad_row_at=10)
+
+    parts = list(DocumentLoader(str(tmp_path), max_workers=1).iter_loaded_files({str(path): "finance"}))
+
+    statuses = [status for _, _, _, status in parts]
+    assert statuses[-1] == FILE_FAILED
+    assert set(statuses[:-1]) == {FILE_PART}
+    assert any(docs for _, _, docs, _ in parts[:-1])
+
+
+def test_csv_read_to_the_end_ends_with_a_complete_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_READ_BATCH_ROWS", 4)
+    path = tmp_path / "finance" / "ledger.csv"
+    path.parent.mkdir()
+    write_csv(path, 20)
+
+    parts = list(DocumentLoader(str(tmp_path), max_workers=1).iter_loaded_files({str(path): "finance"}))
+
+    assert [status for _, _, _, status in parts][-1] == FILE_COMPLETE
+    assert FILE_FAILED not in [status for _, _, _, status in parts]
+
+
+def csv_chunks(tmp_path, text):
+    path = tmp_path / "finance" / "ledger.csv"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    loader = DocumentLoader(str(tmp_path), max_workers=1)
+    parts = list(loader.iter_file_parts(path, "finance"))
+    docs = [doc for part in parts for doc in part]
+    return parts, [doc for doc in docs if doc.metadata["content_type"] == "data_chunk"], docs[-1]
+
+
+def chunk_rows(doc):
+    # Line 0 names the rows, line 1 is the typed header
+    return doc.page_content.split("\n")[2:]
+
+
+def test_csv_chunks_are_bounded_by_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_READ_BATCH_ROWS", 7)
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_ROWS", 3)
+    rows = [f"{i},{i * 10}" for i in range(20)]
+
+    parts, chunks, summary = csv_chunks(tmp_path, "id,amount\n" + "\n".join(rows) + "\n")
+
+    assert all(len(chunk_rows(chunk)) <= 3 for chunk in chunks)
+    assert [row for chunk in chunks for row in chunk_rows(chunk)] == [row.replace(",", " | ") for row in rows]
+    assert [(chunk.metadata["chunk_start"], chunk.metadata["chunk_end"]) for chunk in chunks][:2] == [(0, 3), (3, 6)]
+    assert chunks[0].page_content.split("\n")[1] == "id (int) | amount (int)"
+    # One part per read batch (of 7, 7 and 6 rows), then the last chunk with the summary
+    assert len(parts) == 4
+    assert parts[-1][-1] is summary
+    assert summary.metadata["content_type"] == "summary"
+    assert "Number of rows: 20" in summary.page_content
+
+
+def test_csv_chunks_are_bounded_by_tokens(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_TOKENS", 60)
+    rows = [f"{i},{'lorem ipsum dolor sit amet ' * 2}" for i in range(30)]
+
+    _, chunks, _ = csv_chunks(tmp_path, "id,note\n" + "\n".join(rows) + "\n")
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        header = chunk.page_content.split("\n")[1]
+        tokens = count_tokens(header) + sum(count_tokens(row) + 1 for row in chunk_rows(chunk))
+        assert tokens <= 60
+    assert sum(len(chunk_rows(chunk)) for chunk in chunks) == 30
+
+
+def test_row_over_the_token_budget_gets_a_chunk_of_its_own(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_TOKENS", 30)
+    long_note = "lorem ipsum dolor sit amet " * 20
+
+    _, chunks, _ = csv_chunks(tmp_path, f"id,note\n1,short\n2,{long_note}\n3,short\n")
+
+    assert [len(chunk_rows(chunk)) for chunk in chunks] == [1, 1, 1]
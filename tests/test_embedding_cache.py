@@ -0,0 +1,70 @@
+import sqlite3
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from app.services import embedding_cache
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def last_accesses(path) -> List[float]:
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT last_access FROM embeddings ORDER BY key")]
+
+
+def test_hits_are_served_from_the_cache(tmp_path):
+    underlying = CountingEmbeddings()
+    cache = CachedEmbeddings(underlying, str(tmp_path / "cache.sqlite3"))
+
+    assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cache.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert cache.embed_query("a") == [1.0, 1.0]
+
+    # Queries are cached apart from documents
+    assert underlying.texts == ["a", "bb", "ccc", "a"]
+    assert (cache.hits, cache.misses) == (2, 4)
+    assert CachedEmbeddings(CountingEmbeddings(), str(tmp_path / "cache.sqlite3")).embed_documents(["ccc"]) == [[3.0, 1.0]]
+
+
+def test_recent_hits_do_not_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = CachedEmbeddings(CountingEmbeddings(), path)
+    cache.embed_documents(["a", "bb"])
+    written = last_accesses(path)
+
+    cache.embed_documents(["a", "bb"])
+    assert last_accesses(path) == written
+
+    later = written[0] + embedding_cache.LRU_TOUCH_SECONDS + 1
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: later)
+    cache.embed_documents(["a"])
+    assert sorted(last_accesses(path)) == sorted([written[1], later])
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: clock["now"])
+    cache = CachedEmbeddings(CountingEmbeddings(), str(tmp_path / "cache.sqlite3"), max_entries=10)
+    for i in range(10):
+        cache.embed_documents([f"text {i}"])
+        clock["now"] += embedding_cache.LRU_TOUCH_SECONDS + 1
+    cache.embed_documents(["text 0"])  # used again, so it outlives texts 1-9
+
+    cache.embed_documents(["text 10"])
+
+    underlying = CountingEmbeddings()
+    cache.underlying = underlying
+    cache.embed_documents([f"text {i}" for i in range(11)])
+    assert underlying.texts == ["text 1", "text 2"]
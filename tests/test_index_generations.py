@@ -0,0 +1,135 @@
+import threading
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.services.vector_store import VectorStoreService
+
+VOCABULARY = ["alpha", "beta", "gamma", "delta"]
+
+
+class KeywordEmbeddings(Embeddings):
+    """One dimension per vocabulary word; query embedding waits on ``gate`` while it is cleared."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.embedding_query = threading.Event()
+
+    @staticmethod
+    def _embed(text: str) -> List[float]:
+        words = text.lower().split()
+        return [float(words.count(word)) for word in VOCABULARY] + [0.1]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedding_query.set()
+        self.gate.wait(timeout=5)
+        return self._embed(text)
+
+
+def make_service(path, embeddings=None) -> VectorStoreService:
+    service = VectorStoreService(None, str(path), index_backend="numpy", embedding_model=embeddings or KeywordEmbeddings())
+    service.open_stores(["finance"])
+    return service
+
+
+def ingest(service: VectorStoreService, *texts: str) -> None:
+    service.add_documents("finance", [Document(page_content=text) for text in texts], [f"chunk-{text}" for text in texts])
+
+
+def contents(documents: List[Document]) -> List[str]:
+    return [doc.page_content for doc in documents]
+
+
+def test_searches_read_the_live_generation_until_the_next_one_is_activated(tmp_path):
+    service = make_service(tmp_path)
+    ingest(service, "alpha report")
+    service.persist()
+
+    service.begin_generation(["finance"])
+    ingest(service, "beta ledger")
+    assert contents(service.similarity_search("beta", "finance")) == []
+
+    service.persist()
+    service.activate_generation()
+
+    assert service.generation == 1
+    assert service.read_generation_pointer() == 1
+    assert contents(service.similarity_search("beta", "finance")) == ["beta ledger"]
+    assert "alpha report" in contents(service.similarity_search("alpha", "finance"))
+
+
+def test_aborted_generation_leaves_the_live_one_untouched(tmp_path):
+    service = make_service(tmp_path)
+    ingest(service, "alpha report")
+    service.persist()
+
+    service.begin_generation(["finance"])
+    service.delete_documents("finance", ["chunk-alpha report"])
+    service.abort_generation()
+
+    assert service.generation == 0
+    assert contents(service.similarity_search("alpha", "finance")) == ["alpha report"]
+
+
+def test_retired_generation_is_released_after_in_flight_searches_finish(tmp_path):
+    embeddings = KeywordEmbeddings()
+    service = make_service(tmp_path, embeddings)
+    ingest(service, "alpha report")
+    service.persist()
+
+    embeddings.gate.clear()
+    results = []
+    search = threading.Thread(target=lambda: results.append(service.similarity_search("alpha", "finance")))
+    search.start()
+    assert embeddings.embedding_query.wait(timeout=5)
+
+    service.begin_generation(["finance"])
+    service.delete_documents("finance", ["chunk-alpha report"])
+    service.persist()
+    retired = service.activate_generation()
+    # The search started before the swap still holds the old generation
+    assert retired.global_store is not None
+
+    embeddings.gate.set()
+    search.join(timeout=5)
+    assert contents(results[0]) == ["alpha report"]
+    assert retired.global_store is None
+    assert contents(service.similarity_search("alpha", "finance")) == []
+
+
+def test_unused_retired_generation_is_released_at_once(tmp_path):
+    service = make_service(tmp_path)
+    ingest(service, "alpha report")
+    service.persist()
+
+    service.begin_generation(["finance"])
+    service.persist()
+    retired = service.activate_generation()
+
+    assert retired.retired
+    assert retired.global_store is None
+
+
+def test_other_process_opens_the_activated_generation(tmp_path):
+    builder = make_service(tmp_path)
+    ingest(builder, "alpha report")
+    builder.persist()
+    reader = make_service(tmp_path)
+    reader.load_lexical_index()
+
+    builder.begin_generation(["finance"])
+    ingest(builder, "gamma forecast")
+    builder.persist()
+    builder.activate_generation()
+
+    assert contents(reader.similarity_search("gamma", "finance")) == []
+    retired = reader.open_generation(reader.read_generation_pointer(), ["finance"])
+
+    assert reader.generation == 1
+    assert retired.global_store is None
+    assert contents(reader.similarity_search("gamma", "finance")) == ["gamma forecast"]
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from app.config import INGESTION_LOCK_FILE, SNAPSHOT_MANIFEST_FILE
+from app.services.index_snapshot import (
+    SnapshotError, publish_snapshot, read_snapshot_manifest, verify_snapshot, write_snapshot_manifest
+)
+
+
+def build_snapshot(directory, content: str = "vectors") -> str:
+    (directory / "vector_index" / "global").mkdir(parents=True)
+    (directory / "vector_index" / "global" / "vectors.npy").write_text(content, encoding="utf-8")
+    (directory / "lexical.json.gz").write_text("postings", encoding="utf-8")
+    (directory / INGESTION_LOCK_FILE).write_text("", encoding="utf-8")
+    write_snapshot_manifest(str(directory), {"embedding_model": "test", "chunks": 2})
+    return str(directory)
+
+
+def test_manifest_records_every_file_except_the_build_leftovers(tmp_path):
+    build_snapshot(tmp_path)
+
+    manifest = verify_snapshot(str(tmp_path))
+
+    assert set(manifest["files"]) == {"vector_index/global/vectors.npy", "lexical.json.gz"}
+    assert manifest["files"]["lexical.json.gz"]["bytes"] == len("postings")
+    assert manifest["embedding_model"] == "test"
+    assert not (tmp_path / INGESTION_LOCK_FILE).exists()
+
+
+def test_changed_or_missing_files_fail_verification(tmp_path):
+    build_snapshot(tmp_path)
+    vectors = tmp_path / "vector_index" / "global" / "vectors.npy"
+
+    vectors.write_text("VECTORS", encoding="utf-8")
+    with pytest.raises(SnapshotError, match="checksum"):
+        verify_snapshot(str(tmp_path))
+
+    vectors.unlink()
+    with pytest.raises(SnapshotError, match="missing"):
+        verify_snapshot(str(tmp_path))
+
+
+def test_directories_without_a_supported_manifest_are_rejected(tmp_path):
+    with pytest.raises(SnapshotError):
+        read_snapshot_manifest(str(tmp_path))
+
+    (tmp_path / SNAPSHOT_MANIFEST_FILE).write_text('{"version": 99, "files": {}}', encoding="utf-8")
+    with pytest.raises(SnapshotError, match="version"):
+        read_snapshot_manifest(str(tmp_path))
+
+
+def versions(tmp_path) -> list:
+    return sorted(path.name for path in tmp_path.iterdir() if path.name.startswith("index.") and not path.is_symlink())
+
+
+def test_publishing_flips_the_symlink_and_keeps_one_previous_version(tmp_path):
+    target = tmp_path / "index"
+
+    first = publish_snapshot(build_snapshot(tmp_path / "staging1", "one"), str(target))
+    assert target.is_symlink() and os.path.realpath(target) == os.path.realpath(first)
+    assert not (tmp_path / "staging1").exists()
+
+    second = publish_snapshot(build_snapshot(tmp_path / "staging2", "two"), str(target))
+    assert os.path.realpath(target) == os.path.realpath(second)
+    assert (target / "vector_index" / "global" / "vectors.npy").read_text(encoding="utf-8") == "two"
+    assert versions(tmp_path) == sorted([os.path.basename(first), os.path.basename(second)])
+
+    third = publish_snapshot(build_snapshot(tmp_path / "staging3", "three"), str(target))
+    assert versions(tmp_path) == sorted([os.path.basename(second), os.path.basename(third)])
+    verify_snapshot(str(target))
+
+
+def test_a_plain_directory_is_converted_to_a_symlink(tmp_path):
+    target = tmp_path / "index"
+    build_snapshot(target, "legacy")
+
+    published = publish_snapshot(build_snapshot(tmp_path / "staging", "new"), str(target))
+
+    assert target.is_symlink() and os.path.realpath(target) == os.path.realpath(published)
+    legacy = [name for name in versions(tmp_path) if name.endswith("-old")]
+    assert len(legacy) == 1
+    assert (tmp_path / legacy[0] / "vector_index" / "global" / "vectors.npy").read_text(encoding="utf-8") == "legacy"
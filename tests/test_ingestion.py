@@ -0,0 +1,121 @@
+import asyncio
+
+from app.services import document_loader
+from app.services.document_loader import DocumentLoader
+from app.services.rag_service import RagService
+from benchmarks.fakes import FakeChatModel, HashingEmbeddings
+
+
+def make_rag(resources) -> RagService:
+    rag = RagService(llm=FakeChatModel(latency_ms=0), embedding_model=HashingEmbeddings(dimensions=64), index_backend="numpy")
+    rag.document_loader = DocumentLoader(str(resources), max_workers=1)
+    return rag
+
+
+def run_ingestion(rag: RagService, index_path, *edits) -> None:
+    """Open the index in ``index_path``, then apply each edit and ingest again."""
+    async def scenario():
+        await rag.initialize(str(index_path), read_only=False)
+        try:
+            for edit in edits:
+                edit()
+                await rag.load_and_create_vector_stores()
+        finally:
+            await rag.cleanup()
+
+    asyncio.run(scenario())
+
+
+def csv_text(rows, bad_row_at=None) -> str:
+    lines = ["id,amount"]
+    for i in range(rows):
+        if i == bad_row_at:
+            lines.append("1,2,3,4")
+        lines.append(f"{i},{i * 10}")
+    return "\n".join(lines) + "\n"
+
+
+def test_csv_that_fails_part_way_is_not_recorded_and_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_READ_BATCH_ROWS", 4)
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_ROWS", 2)
+    resources = tmp_path / "resources"
+    (resources / "finance").mkdir(parents=True)
+    ledger = resources / "finance" / "ledger.csv"
+    ledger.write_text(csv_text(20, bad_row_at=10), encoding="utf-8")
+    (resources / "finance" / "notes.md").write_text("# Notes\n\nQuarterly revenue grew.\n", encoding="utf-8")
+    rag = make_rag(resources)
+    seen = {}
+
+    def check_failed():
+        seen["files"] = set(rag.manifest.files)
+        seen["consistent"] = rag.manifest.chunk_count() == rag.vector_store.document_count()
+        ledger.write_text(csv_text(20), encoding="utf-8")
+
+    run_ingestion(rag, tmp_path / "index", check_failed)
+
+    assert seen["files"] == {str(resources / "finance" / "notes.md")}
+    assert seen["consistent"]
+    assert str(ledger) in rag.manifest.files
+    assert rag.manifest.chunk_count() == rag.vector_store.document_count()
+
+
+def test_failed_update_keeps_the_previous_version_of_a_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_loader, "CSV_READ_BATCH_ROWS", 4)
+    monkeypatch.setattr(document_loader, "CSV_CHUNK_MAX_ROWS", 2)
+    resources = tmp_path / "resources"
+    (resources / "finance").mkdir(parents=True)
+    ledger = resources / "finance" / "ledger.csv"
+    ledger.write_text(csv_text(20), encoding="utf-8")
+    rag = make_rag(resources)
+    seen = {}
+
+    def break_file():
+        seen["entry"] = dict(rag.manifest.get(str(ledger)))
+        ledger.write_text(csv_text(30, bad_row_at=25), encoding="utf-8")
+
+    run_ingestion(rag, tmp_path / "index", break_file)
+
+    assert rag.manifest.get(str(ledger)) == seen["entry"]
+    assert rag.manifest.chunk_count() == rag.vector_store.document_count()
+    assert rag.manifest.diff({str(ledger): "finance"}).modified == [str(ledger)]
+
+
+def test_only_changed_chunks_are_embedded_again(tmp_path):
+    resources = tmp_path / "resources"
+    (resources / "finance").mkdir(parents=True)
+    (resources / "hr").mkdir()
+    report = resources / "finance" / "report.txt"
+    revenue = "Revenue grew in every region. " * 8
+    report.write_text(f"{revenue}\n\n{'Costs stayed flat. ' * 12}\n", encoding="utf-8")
+    (resources / "hr" / "policy.md").write_text("# Leave\n\nEmployees get twenty days of leave.\n", encoding="utf-8")
+    rag = make_rag(resources)
+    embeddings = rag.embeddings.underlying
+    seen = {}
+
+    def edit_one_paragraph():
+        seen["first_run"] = embeddings.texts
+        report.write_text(f"{revenue}\n\n{'Costs fell by a tenth. ' * 10}\n", encoding="utf-8")
+
+    def change_nothing():
+        seen["after_edit"] = embeddings.texts
+
+    run_ingestion(rag, tmp_path / "index", edit_one_paragraph, change_nothing)
+
+    assert seen["first_run"] > 0
+    # Only the edited section's chunk is embedded again
+    assert seen["after_edit"] - seen["first_run"] == 1
+    assert embeddings.texts == seen["after_edit"]
+    assert rag.manifest.chunk_count() == rag.vector_store.document_count()
+
+
+def test_restart_reuses_the_persisted_index(tmp_path):
+    resources = tmp_path / "resources"
+    (resources / "finance").mkdir(parents=True)
+    (resources / "finance" / "report.md").write_text("# Revenue\n\nRevenue grew in every region.\n", encoding="utf-8")
+    run_ingestion(make_rag(resources), tmp_path / "index")
+
+    restarted = make_rag(resources)
+    run_ingestion(restarted, tmp_path / "index")
+
+    assert restarted.embeddings.underlying.texts == 0
+    assert restarted.vector_store.document_count() == restarted.manifest.chunk_count() > 0
@@ -0,0 +1,113 @@
+import os
+
+from langchain_core.documents import Document
+
+from app.services.ingestion_manifest import IngestionManifest, assign_chunk_ids
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def recorded(tmp_path, **files):
+    """A manifest that has ingested ``files`` (name -> text) into the finance department."""
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    for name, text in files.items():
+        path = write(tmp_path / "finance" / name, text)
+        manifest.update(path, "finance", [f"{name}-chunk"])
+    return manifest
+
+
+def test_diff_classifies_added_modified_removed_and_unchanged_files(tmp_path):
+    manifest = recorded(tmp_path, **{"same.md": "same", "edited.md": "before", "gone.md": "gone"})
+    edited = write(tmp_path / "finance" / "edited.md", "after, and longer")
+    os.remove(tmp_path / "finance" / "gone.md")
+    added = write(tmp_path / "finance" / "new.md", "new")
+    same = str(tmp_path / "finance" / "same.md")
+
+    diff = manifest.diff({same: "finance", edited: "finance", added: "finance"})
+
+    assert diff.added == [added]
+    assert diff.modified == [edited]
+    assert diff.removed == [str(tmp_path / "finance" / "gone.md")]
+    assert diff.unchanged == [same]
+    assert diff.has_changes
+
+
+def test_touched_but_identical_file_is_unchanged(tmp_path):
+    manifest = recorded(tmp_path, **{"report.md": "quarterly report"})
+    path = str(tmp_path / "finance" / "report.md")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    diff = manifest.diff({path: "finance"})
+
+    assert diff.unchanged == [path] and not diff.has_changes
+    assert manifest.get(path)["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+
+def test_file_that_moved_department_is_modified(tmp_path):
+    manifest = recorded(tmp_path, **{"report.md": "quarterly report"})
+    path = str(tmp_path / "finance" / "report.md")
+
+    assert manifest.diff({path: "marketing"}).modified == [path]
+
+
+def test_manifest_survives_a_reload(tmp_path):
+    manifest = recorded(tmp_path, **{"report.md": "quarterly report"})
+    manifest.embedding_model = "model-a"
+    manifest.save()
+
+    reloaded = IngestionManifest(str(tmp_path / "manifest.json"))
+    reloaded.load()
+
+    assert reloaded.files == manifest.files
+    assert reloaded.embedding_model == "model-a"
+    assert reloaded.chunk_count() == 1
+    assert not reloaded.diff({str(tmp_path / "finance" / "report.md"): "finance"}).has_changes
+
+
+def test_manifest_of_another_version_is_ignored(tmp_path):
+    (tmp_path / "manifest.json").write_text('{"version": 1, "files": {"a": {}}}', encoding="utf-8")
+
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    manifest.load()
+
+    assert manifest.files == {}
+
+
+def chunks(*texts, parent_id=None):
+    return [Document(page_content=text, metadata={"parent_id": parent_id} if parent_id else {}) for text in texts]
+
+
+def test_chunk_ids_are_stable_and_tell_duplicates_apart():
+    first = assign_chunk_ids(chunks("alpha", "beta", "alpha"), "a.md")
+    again = assign_chunk_ids(chunks("alpha", "beta", "alpha"), "a.md")
+
+    assert first == again
+    assert len(set(first)) == 3
+    assert assign_chunk_ids(chunks("alpha"), "b.md") != first[:1]
+
+
+def test_unchanged_chunks_keep_their_ids_when_the_file_is_edited():
+    before = assign_chunk_ids(chunks("intro", "body", "outro"), "a.md")
+    after = assign_chunk_ids(chunks("intro", "new paragraph", "body", "outro"), "a.md")
+
+    assert set(before) <= set(after)
+
+
+def test_chunk_id_changes_with_its_parent_section():
+    docs = chunks("alpha", parent_id="section-1")
+
+    assert assign_chunk_ids(docs, "a.md") != assign_chunk_ids(chunks("alpha", parent_id="section-2"), "a.md")
+    assert docs[0].metadata["chunk_id"] and docs[0].metadata["chunk_hash"]
+
+
+def test_parts_numbered_with_shared_occurrences_match_the_whole_file():
+    whole = assign_chunk_ids(chunks("row", "row", "other", "row"), "t.csv")
+    occurrences = {}
+    parts = assign_chunk_ids(chunks("row", "row"), "t.csv", occurrences) + assign_chunk_ids(chunks("other", "row"), "t.csv", occurrences)
+
+    assert parts == whole
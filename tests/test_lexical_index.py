@@ -0,0 +1,110 @@
+from langchain_core.documents import Document
+
+from app.services.lexical_index import LexicalIndex, find_identifiers, tokenize
+from app.services.vector_store import VectorStoreService
+from benchmarks.fakes import HashingEmbeddings
+
+
+def make_index(path=None) -> LexicalIndex:
+    index = LexicalIndex(path)
+    index.add_many([
+        ("f1", "finance", "revenue grew in the north region", {"n": 1}),
+        ("f2", "finance", "revenue revenue revenue report", {"n": 2}),
+        ("f3", "finance", "travel expenses policy", {"n": 3}),
+        ("h1", "hr", "revenue bonus for employee FINEMP1000", {"n": 4}),
+    ])
+    return index
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the Q3 revenue, per region?") == ["q3", "revenue", "per", "region"]
+
+
+def test_identifiers_are_mixed_letter_digit_codes():
+    assert find_identifiers("salary of FINEMP1000 and SKU-2041 in 2024") == ["FINEMP1000", "SKU-2041"]
+
+
+def test_bm25_ranks_by_term_frequency_and_rarity():
+    index = make_index()
+
+    ranked = [chunk_id for chunk_id, _ in index.search("revenue north", ["finance"])]
+
+    # "north" is rarer than "revenue", so the chunk with both beats the one repeating "revenue"
+    assert ranked == ["f1", "f2"]
+    assert [chunk_id for chunk_id, _ in index.search("revenue", ["finance"])] == ["f2", "f1"]
+
+
+def test_search_only_scores_the_given_departments():
+    index = make_index()
+
+    assert {chunk_id for chunk_id, _ in index.search("revenue", ["hr"])} == {"h1"}
+    assert index.search("revenue", ["marketing"]) == []
+
+
+def test_required_terms_filter_candidates():
+    index = make_index()
+
+    hits = index.search("revenue FINEMP1000", ["finance", "hr"], required_terms=["finemp1000"])
+
+    assert [chunk_id for chunk_id, _ in hits] == ["h1"]
+
+
+def test_removed_chunks_are_no_longer_found():
+    index = make_index()
+
+    index.remove(["f1"])
+
+    assert [chunk_id for chunk_id, _ in index.search("north", ["finance"])] == []
+    assert len(index) == 3
+
+
+def test_index_survives_a_reload(tmp_path):
+    path = str(tmp_path / "lexical.json.gz")
+    index = make_index(path)
+    index.save()
+
+    reloaded = LexicalIndex(path)
+    assert reloaded.load()
+
+    assert reloaded.search("revenue north", ["finance"]) == index.search("revenue north", ["finance"])
+    assert reloaded.get("f3")["metadata"] == {"n": 3}
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(dimensions=1024)
+        self.queries = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def make_service(tmp_path, embeddings) -> VectorStoreService:
+    service = VectorStoreService(None, str(tmp_path), index_backend="numpy", embedding_model=embeddings)
+    texts = ["revenue growth in north region", "revenue report", "holiday schedule", "payroll for FINEMP1000"]
+    service.add_documents("finance", [Document(page_content=text) for text in texts], [f"c{i}" for i in range(len(texts))])
+    service.persist()
+    return service
+
+
+def test_hybrid_search_fuses_dense_and_lexical_rankings(tmp_path):
+    service = make_service(tmp_path, CountingEmbeddings())
+
+    results = service.similarity_search("revenue growth", "finance")
+
+    # The first chunk is in both rankings, the second is only a lexical match
+    assert [doc.page_content for doc in results] == ["revenue growth in north region", "revenue report"]
+    assert results[0].metadata["rrf_score"] > results[1].metadata["rrf_score"]
+    assert "relevance_score" in results[0].metadata and "lexical_score" in results[0].metadata
+    assert "relevance_score" not in results[1].metadata
+
+
+def test_identifier_queries_skip_the_query_embedding(tmp_path):
+    embeddings = CountingEmbeddings()
+    service = make_service(tmp_path, embeddings)
+
+    results = service.similarity_search("payroll of FINEMP1000", "finance")
+
+    assert [doc.page_content for doc in results] == ["payroll for FINEMP1000"]
+    assert embeddings.queries == 0
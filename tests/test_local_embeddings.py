@@ -0,0 +1,93 @@
+import threading
+from typing import List
+
+import numpy as np
+
+from app.services.embedding_providers import LocalEmbeddings
+
+
+class FakeEncoder:
+    """Encodes each text as [len(text), 1]; blocks on ``gate`` while it is cleared."""
+
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy, show_progress_bar):
+        self.batches.append(list(texts))
+        self.entered.set()
+        self.gate.wait(timeout=5)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+def make_model(encoder: FakeEncoder, **kwargs) -> LocalEmbeddings:
+    return LocalEmbeddings("fake", encoder=encoder, **kwargs)
+
+
+def test_queries_waiting_behind_a_batch_are_encoded_together():
+    encoder = FakeEncoder()
+    model = make_model(encoder, max_batch_size=8, query_prefix="q: ")
+    try:
+        encoder.gate.clear()
+        first = model._submit_queries(["a"])
+        assert encoder.entered.wait(timeout=5)
+        waiting = model._submit_queries(["bb", "ccc", "dddd"])
+        encoder.gate.set()
+
+        assert first[0].result(timeout=5) == [4.0, 1.0]
+        assert [future.result(timeout=5) for future in waiting] == [[5.0, 1.0], [6.0, 1.0], [7.0, 1.0]]
+        assert encoder.batches == [["q: a"], ["q: bb", "q: ccc", "q: dddd"]]
+        assert model.stats["query_batches"] == 2 and model.stats["queries"] == 4
+    finally:
+        model.close()
+
+
+def test_documents_are_cut_into_batches_of_max_batch_size():
+    encoder = FakeEncoder()
+    model = make_model(encoder, max_batch_size=2)
+    try:
+        vectors = model.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+        assert vectors == [[float(n), 1.0] for n in range(1, 6)]
+        assert [len(batch) for batch in encoder.batches] == [2, 2, 1]
+        assert model.stats["document_batches"] == 3
+    finally:
+        model.close()
+
+
+def test_cancelled_queries_are_not_encoded():
+    encoder = FakeEncoder()
+    model = make_model(encoder, max_batch_size=8)
+    try:
+        encoder.gate.clear()
+        model._submit_queries(["first"])
+        assert encoder.entered.wait(timeout=5)
+        kept, dropped = model._submit_queries(["kept", "dropped"])
+        assert dropped.cancel()
+        encoder.gate.set()
+
+        assert kept.result(timeout=5) == [4.0, 1.0]
+        assert encoder.batches == [["first"], ["kept"]]
+        assert model.stats["queries"] == 2
+    finally:
+        model.close()
+
+
+def test_batch_of_only_cancelled_queries_is_skipped():
+    encoder = FakeEncoder()
+    model = make_model(encoder, max_batch_size=8)
+    try:
+        encoder.gate.clear()
+        model._submit_queries(["first"])
+        assert encoder.entered.wait(timeout=5)
+        for future in model._submit_queries(["gone", "also gone"]):
+            future.cancel()
+        encoder.gate.set()
+        # Queued behind the cancelled ones, so it is encoded after they were skipped
+        assert model.embed_query("last") == [4.0, 1.0]
+
+        assert encoder.batches == [["first"], ["last"]]
+        assert model.stats["query_batches"] == 2
+    finally:
+        model.close()
@@ -0,0 +1,136 @@
+from pathlib import Path
+
+import pytest
+
+from app.services import markdown_splitter, vector_store
+from app.services.document_loader import DocumentLoader, split_sections
+from app.services.markdown_splitter import MarkdownSectionSplitter, make_section_id
+from app.services.vector_store import VectorStoreService
+from benchmarks.fakes import HashingEmbeddings
+
+GUIDE = """# Handbook
+
+Welcome to the company handbook.
+
+## Travel
+
+Flights above 500 need approval from finance.
+
+Hotels are reimbursed up to 200 per night.
+
+## Equipment
+
+```
+# not a heading
+laptop --refresh
+```
+
+Laptops are replaced every three years.
+"""
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word, so section and chunk sizes do not depend on the tiktoken cache
+    monkeypatch.setattr(markdown_splitter, "count_tokens", lambda text: len(text.split()))
+
+
+def paragraph(words: int, tag: str) -> str:
+    return " ".join(f"{tag}{i}" for i in range(words))
+
+
+def test_sections_follow_headings_and_slice_the_source():
+    sections = MarkdownSectionSplitter(section_max_tokens=20, chunk_max_tokens=20).split(GUIDE)
+
+    assert [section.title for section in sections] == ["Handbook", "Handbook > Travel", "Handbook > Equipment"]
+    for section in sections:
+        assert GUIDE[section.start_index:section.start_index + len(section.text)] == section.text
+    # The fence is kept whole and its "# not a heading" line starts no section
+    assert "laptop --refresh\n```" in sections[2].text
+
+
+def test_small_sibling_sections_are_joined_under_their_parent():
+    sections = MarkdownSectionSplitter(section_max_tokens=600, chunk_max_tokens=200).split(GUIDE)
+
+    assert len(sections) == 1
+    assert sections[0].text == GUIDE.strip()
+    assert len(sections[0].chunks) == 3
+
+
+def test_chunks_carry_their_heading_path():
+    sections = MarkdownSectionSplitter(section_max_tokens=20, chunk_max_tokens=12).split(GUIDE)
+    travel = sections[1]
+
+    assert len(travel.chunks) == 2
+    # The chunk that starts with the heading leaves it out of the breadcrumb
+    assert travel.chunks[0].text.startswith("Handbook\n## Travel")
+    assert travel.chunks[1].text == "Handbook > Travel\nHotels are reimbursed up to 200 per night."
+    assert travel.chunks[1].start_index == GUIDE.index("Hotels")
+
+
+def test_oversized_sections_are_cut_at_paragraphs():
+    text = "# Policy\n\n" + "\n\n".join(paragraph(30, tag) for tag in "abc")
+
+    sections = MarkdownSectionSplitter(section_max_tokens=50, chunk_max_tokens=50).split(text)
+
+    assert len(sections) == 3
+    assert all(section.title == "Policy" for section in sections)
+    assert "".join(section.text for section in sections).replace("\n", "") == text.replace("\n", "")
+
+
+def test_table_rows_are_never_cut_and_repeat_the_header():
+    rows = "\n".join(f"| item{i} | {i * 10} |" for i in range(12))
+    text = f"# Prices\n\n| item | price |\n| --- | --- |\n{rows}\n"
+
+    sections = MarkdownSectionSplitter(section_max_tokens=600, chunk_max_tokens=40).split(text)
+    chunks = sections[0].chunks
+
+    assert len(chunks) > 1
+    for chunk in chunks[1:]:
+        assert chunk.text.startswith("Prices\n| item | price |\n| --- | --- |\n| item")
+        assert chunk.start_index is None
+    body = [line for chunk in chunks for line in chunk.text.splitlines() if line.startswith("| item") and line != "| item | price |"]
+    assert body == rows.splitlines()
+
+
+def test_section_ids_are_stable_and_tell_repeated_sections_apart():
+    assert make_section_id("a.md", "text") == make_section_id("a.md", "text")
+    assert make_section_id("a.md", "text") != make_section_id("a.md", "text", occurrence=1)
+    assert make_section_id("a.md", "text") != make_section_id("b.md", "text")
+
+
+def make_service(tmp_path) -> VectorStoreService:
+    resources = tmp_path / "resources"
+    (resources / "finance").mkdir(parents=True)
+    guide = resources / "finance" / "guide.md"
+    guide.write_text(GUIDE, encoding="utf-8")
+    loader = DocumentLoader(str(resources), max_workers=1)
+    loader.markdown_splitter = MarkdownSectionSplitter(section_max_tokens=20, chunk_max_tokens=12)
+    chunks, sections = split_sections(loader.load_file(Path(guide), "finance"))
+
+    service = VectorStoreService(None, str(tmp_path / "index"), index_backend="numpy", embedding_model=HashingEmbeddings(dimensions=1024))
+    service.add_documents("finance", chunks, [f"c{i}" for i in range(len(chunks))])
+    service.replace_sections(str(guide), sections)
+    service.persist()
+    return service
+
+
+def test_search_returns_the_parent_section_once(tmp_path):
+    service = make_service(tmp_path)
+
+    results = service.similarity_search("hotels reimbursed per night flights approval", "finance")
+
+    travel = GUIDE[GUIDE.index("## Travel"):GUIDE.index("## Equipment")].strip()
+    assert results[0].page_content == travel
+    assert results[0].metadata["section"] == "Handbook > Travel"
+    assert "rrf_score" in results[0].metadata
+    assert [doc.page_content for doc in results].count(travel) == 1
+
+
+def test_parent_retrieval_can_be_turned_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "PARENT_RETRIEVAL_ENABLED", False)
+    service = make_service(tmp_path)
+
+    results = service.similarity_search("hotels reimbursed per night", "finance")
+
+    assert results[0].page_content == "Handbook > Travel\nHotels are reimbursed up to 200 per night."
@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+
+from app.main import app, create_access_token, users_db
+
+client = TestClient(app, base_url="http://localhost")
+
+
+def user_with_role(role: str) -> str:
+    return next(username for username, user in users_db.items() if user.role == role)
+
+
+def auth(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def test_metrics_require_authentication():
+    assert client.get("/api/metrics").status_code == 401
+
+
+def test_metrics_are_only_for_admin_roles():
+    response = client.get("/api/metrics", headers=auth(user_with_role("engineering")))
+    assert response.status_code == 403
+
+
+def test_admin_reads_metrics_as_json_or_prometheus_text():
+    headers = auth(user_with_role("c-level"))
+
+    assert client.get("/api/metrics", headers=headers).status_code == 200
+    response = client.get("/api/metrics", params={"format": "prometheus"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
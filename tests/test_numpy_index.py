@@ -0,0 +1,217 @@
+import numpy as np
+import pytest
+
+from app.services import vector_store
+from app.services.vector_quantization import Int8Quantizer
+from app.services.vector_store import DepartmentView, NumpyIndexBackend
+
+DIMENSIONS = 16
+
+
+def random_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(index: NumpyIndexBackend, vectors: np.ndarray, start: int = 0) -> None:
+    ids = [f"c{start + i}" for i in range(len(vectors))]
+    index.upsert(ids, vectors.tolist(), [{"department": "finance" if i % 2 else "hr"} for i in range(len(vectors))], [f"text {start + i}" for i in range(len(vectors))])
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, rows=None) -> list:
+    rows = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    order = np.argsort(-(vectors[rows] @ query))[:k]
+    return [f"c{row}" for row in rows[order]]
+
+
+def test_search_returns_the_exact_top_k(tmp_path):
+    vectors = random_vectors(50)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+
+    for query in random_vectors(5, seed=1):
+        hits = index.search(query.tolist(), 4)
+        assert [doc.id for doc, _ in hits] == exact_top_k(vectors, query, 4)
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_batch_matches_single_searches(tmp_path):
+    vectors = random_vectors(30)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+    queries = random_vectors(3, seed=2)
+
+    batch = index.search_batch(queries.tolist(), 3)
+
+    assert [[doc.id for doc, _ in hits] for hits in batch] == [[doc.id for doc, _ in index.search(query.tolist(), 3)] for query in queries]
+
+
+def test_filters_restrict_searches_and_counts(tmp_path):
+    vectors = random_vectors(40)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+    finance_rows = list(range(1, 40, 2))
+
+    hits = index.search(vectors[2].tolist(), 3, {"department": "finance"})
+
+    assert [doc.id for doc, _ in hits] == exact_top_k(vectors, vectors[2], 3, finance_rows)
+    assert all(doc.metadata["department"] == "finance" for doc, _ in hits)
+    assert index.count({"department": "finance"}) == 20
+    assert index.count({"department": {"$in": ["finance", "hr"]}}) == 40
+    assert index.count({"department": "legal"}) == 0
+    assert index.search(vectors[2].tolist(), 3, {"department": "legal"}) == []
+
+
+def test_department_view_is_a_filtered_collection(tmp_path):
+    vectors = random_vectors(10)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+    view = DepartmentView(index, "hr")
+
+    assert view.count() == 5
+    assert {doc.metadata["department"] for doc, _ in view.search(vectors[1].tolist(), 5)} == {"hr"}
+    assert sorted(chunk_id for ids, _, _ in view.iter_chunks() for chunk_id in ids) == ["c0", "c2", "c4", "c6", "c8"]
+
+
+def test_upsert_replaces_and_delete_compacts_rows(tmp_path):
+    vectors = random_vectors(6)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+
+    index.upsert(["c1"], [vectors[4].tolist()], [{"department": "hr"}], ["updated"])
+    index.delete(["c0", "missing"])
+
+    assert index.count() == 5
+    ids = [chunk_id for page, _, _ in index.iter_chunks() for chunk_id in page]
+    assert sorted(ids) == ["c1", "c2", "c3", "c4", "c5"]
+    hits = index.search(vectors[5].tolist(), 1)
+    assert hits[0][0].id == "c5" and hits[0][0].page_content == "text 5"
+    updated = dict(zip(*next(index.iter_chunks())[:2]))["c1"]
+    assert updated == "updated"
+
+
+def test_persisted_collection_reopens_memory_mapped_with_the_same_results(tmp_path):
+    vectors = random_vectors(30)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+    fill(index, vectors)
+    index.delete(["c3"])
+    index.persist()
+    query = random_vectors(1, seed=3)[0].tolist()
+
+    reopened = NumpyIndexBackend("test", str(tmp_path), ann_threshold=10_000)
+
+    assert reopened.count() == 29
+    assert isinstance(reopened.vectors.base, np.memmap) or isinstance(reopened.vectors, np.memmap)
+    assert [(doc.id, doc.metadata) for doc, _ in reopened.search(query, 5)] == [(doc.id, doc.metadata) for doc, _ in index.search(query, 5)]
+
+    # Writing to a reopened collection copies the mapped matrix instead of failing
+    fill(reopened, random_vectors(2, seed=4), start=100)
+    assert reopened.count() == 31
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    index = NumpyIndexBackend("test", str(tmp_path))
+    fill(index, random_vectors(2))
+
+    with pytest.raises(ValueError):
+        index.upsert(["other"], [[1.0, 0.0, 0.0]], [{"department": "hr"}], ["text"])
+
+
+@pytest.fixture
+def graph_builds(monkeypatch):
+    if vector_store.faiss is None:
+        pytest.skip("faiss is not installed")
+    builds = []
+    build = vector_store.faiss.IndexHNSWFlat
+
+    def counting(*args):
+        builds.append(args)
+        return build(*args)
+
+    monkeypatch.setattr(vector_store.faiss, "IndexHNSWFlat", counting)
+    return builds
+
+
+def test_searches_never_build_the_graph(tmp_path, graph_builds):
+    vectors = random_vectors(64)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=32)
+    fill(index, vectors)
+
+    hits = index.search(vectors[3].tolist(), 5)
+    assert hits[0][0].id == "c3"
+    assert graph_builds == []
+
+    index.persist()
+    assert len(graph_builds) == 1
+    assert (tmp_path / "vector_index" / "test" / "hnsw.faiss").exists()
+
+    fill(index, random_vectors(8, seed=1), start=64)
+    index.search(vectors[3].tolist(), 5)
+    assert len(graph_builds) == 1
+
+
+def test_reopened_collection_loads_its_graph_instead_of_building_it(tmp_path, graph_builds):
+    vectors = random_vectors(64)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=32)
+    fill(index, vectors)
+    index.persist()
+
+    reopened = NumpyIndexBackend("test", str(tmp_path), ann_threshold=32)
+    assert reopened.search(vectors[7].tolist(), 1)[0][0].id == "c7"
+    assert len(graph_builds) == 1
+
+
+def test_collection_opened_without_its_graph_builds_it_at_open(tmp_path, graph_builds):
+    vectors = random_vectors(64)
+    index = NumpyIndexBackend("test", str(tmp_path), ann_threshold=1000)
+    fill(index, vectors)
+    index.persist()
+    assert graph_builds == []
+
+    reopened = NumpyIndexBackend("test", str(tmp_path), ann_threshold=32)
+    assert len(graph_builds) == 1
+    reopened.search(vectors[7].tolist(), 1)
+    assert len(graph_builds) == 1
+
+
+@pytest.fixture
+def quantizer_fits(monkeypatch):
+    fits = []
+    fit = Int8Quantizer.fit
+
+    def counting(self, vectors):
+        fits.append(len(vectors))
+        return fit(self, vectors)
+
+    monkeypatch.setattr(Int8Quantizer, "fit", counting)
+    return fits
+
+
+def test_searches_never_fit_the_quantizer(tmp_path, quantizer_fits):
+    vectors = random_vectors(64)
+    index = NumpyIndexBackend("test", str(tmp_path), quantization="int8")
+    fill(index, vectors)
+
+    assert index.search(vectors[5].tolist(), 3)[0][0].id == "c5"
+    assert quantizer_fits == []
+
+    index.persist()
+    assert quantizer_fits == [64]
+    assert (tmp_path / "vector_index" / "test" / "codes.npy").exists()
+    assert index.search(vectors[5].tolist(), 3)[0][0].id == "c5"
+    assert quantizer_fits == [64]
+
+
+def test_reopened_collection_loads_its_codes_or_encodes_them_at_open(tmp_path, quantizer_fits):
+    vectors = random_vectors(64)
+    index = NumpyIndexBackend("test", str(tmp_path), quantization="int8")
+    fill(index, vectors)
+    index.persist()
+
+    NumpyIndexBackend("test", str(tmp_path), quantization="int8")
+    assert quantizer_fits == [64]
+
+    float16 = NumpyIndexBackend("test", str(tmp_path), quantization="float16")
+    assert float16.search(vectors[9].tolist(), 3)[0][0].id == "c9"
+    assert float16.memory_bytes() < vectors.nbytes
@@ -0,0 +1,36 @@
+from limits.storage import storage_from_string
+
+from app.utils.shared_state import SharedTTLCache, limit_storage_uri, open_shared_state
+
+
+def test_limiter_storage_and_caches_share_one_state(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    state = open_shared_state(path)
+
+    storage = storage_from_string(limit_storage_uri(path))
+    cache = SharedTTLCache(open_shared_state(path), "verified_passwords", maxsize=10, ttl=60)
+
+    assert storage.state is state
+    assert cache.state is state
+
+
+def test_four_slash_uri_names_the_same_file(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+
+    assert storage_from_string(f"sqlite:///{path}").state is open_shared_state(path)
+
+
+def test_counters_expire_and_entries_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    state = open_shared_state(path)
+    storage = storage_from_string(limit_storage_uri(path))
+
+    assert storage.incr("login:1.2.3.4", expiry=60) == 1
+    assert storage.incr("login:1.2.3.4", expiry=60) == 2
+    assert storage.get("login:1.2.3.4") == 2
+    assert state.counter("login:1.2.3.4") == 0  # limiter keys are namespaced
+    assert state.counters(["ratelimit:login:1.2.3.4", "missing"]) == {"ratelimit:login:1.2.3.4": 2, "missing": 0}
+
+    cache = SharedTTLCache(state, "answers", maxsize=10, ttl=60)
+    cache["q"] = {"answer": 42}
+    assert SharedTTLCache(open_shared_state(path), "answers", maxsize=10, ttl=60)["q"] == {"answer": 42}
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_with_the_same_key_share_one_computation():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "answer"
+
+        callers = [asyncio.create_task(flights.do("q", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.in_flight() == 1
+        release.set()
+        results = await asyncio.gather(*callers)
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["answer"] * 5
+    assert flights.stats == {"leaders": 1, "coalesced": 4, "abandoned": 0}
+    assert flights.in_flight() == 0
+
+
+def test_different_keys_are_computed_separately():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def compute(value):
+            await asyncio.sleep(0)
+            return value
+
+        return flights, await asyncio.gather(
+            flights.do("a", lambda: compute(1)),
+            flights.do("b", lambda: compute(2)),
+        )
+
+    flights, results = asyncio.run(scenario())
+    assert results == [1, 2]
+    assert flights.stats["leaders"] == 2
+
+
+def test_cancelled_waiter_does_not_cancel_a_shared_computation():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.create_task(flights.do("q", compute))
+        second = asyncio.create_task(flights.do("q", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return flights, await second
+
+    flights, result = asyncio.run(scenario())
+    assert result == "answer"
+    assert flights.stats["abandoned"] == 0
+
+
+def test_cancelling_the_last_waiter_cancels_the_computation():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def compute():
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flights.do("q", compute)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        await asyncio.sleep(0)
+        return flights
+
+    flights = asyncio.run(scenario())
+    assert flights.stats["abandoned"] == 1
+    assert flights.in_flight() == 0
+
+
+def test_caller_arriving_after_the_computation_was_abandoned_starts_a_new_one():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+        runs = 0
+
+        async def compute():
+            nonlocal runs
+            runs += 1
+            if runs == 1:
+                started.set()
+                await asyncio.Event().wait()
+            return "answer"
+
+        first = asyncio.create_task(flights.do("q", compute))
+        await started.wait()
+        first.cancel()
+        # Scheduled before the cancelled computation has finished and released its key
+        second = asyncio.create_task(flights.do("q", compute))
+        await asyncio.gather(first, return_exceptions=True)
+        return flights, runs, await second
+
+    flights, runs, result = asyncio.run(scenario())
+    assert result == "answer"
+    assert runs == 2
+    assert flights.stats["abandoned"] == 1
+    assert flights.in_flight() == 0
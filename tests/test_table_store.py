@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from app.services.table_store import TableStore, is_tabular_question
+
+
+@pytest.fixture
+def store(tmp_path):
+    finance = tmp_path / "finance_data.csv"
+    finance.write_text("region,revenue\nnorth,100\nsouth,250\nwest,75\n", encoding="utf-8")
+    hr = tmp_path / "hr_data.csv"
+    hr.write_text("full_name,salary,department\nAnn,5000,Sales\nBob,7000,Tech\n", encoding="utf-8")
+    store = TableStore(str(tmp_path / "tables.sqlite3"))
+    store.ingest_csv(str(finance), "finance")
+    store.ingest_csv(str(hr), "hr")
+    yield store
+    store.close()
+
+
+def table_names(store, *departments):
+    return [table["table_name"] for table in store.tables_for_departments(list(departments))]
+
+
+def test_csv_is_loaded_into_a_typed_table(store):
+    [table] = store.tables_for_departments(["finance"])
+
+    assert table["row_count"] == 3
+    assert [(column["name"], column["type"]) for column in table["columns"]] == [("region", "TEXT"), ("revenue", "INTEGER")]
+    assert table["columns"][0]["values"] == ["north", "south", "west"]
+    assert 'Table "finance_finance_data" (3 rows' in TableStore.describe([table])
+
+
+def test_select_over_allowed_tables_runs(store):
+    [finance] = table_names(store, "finance")
+
+    columns, rows, truncated = store.execute(f'SELECT SUM(revenue) AS total FROM "{finance}"', [finance])
+
+    assert (columns, rows, truncated) == (["total"], [(425,)], False)
+
+
+def test_results_are_truncated_to_max_rows(store):
+    [finance] = table_names(store, "finance")
+
+    _, rows, truncated = store.execute(f'SELECT region FROM "{finance}" ORDER BY region', [finance], max_rows=2)
+
+    assert rows == [("north",), ("south",)] and truncated
+
+
+def test_tables_of_other_departments_are_denied(store):
+    [finance] = table_names(store, "finance")
+    [hr] = table_names(store, "hr")
+
+    with pytest.raises(sqlite3.DatabaseError):
+        store.execute(f'SELECT salary FROM "{hr}"', [finance])
+    with pytest.raises(sqlite3.DatabaseError):
+        store.execute(f'SELECT r.region FROM "{finance}" r JOIN "{hr}" h ON 1', [finance])
+    with pytest.raises(sqlite3.DatabaseError):
+        store.execute("SELECT * FROM _tables", [finance])
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM finance_finance_data",
+    "DROP TABLE finance_finance_data",
+    "SELECT 1; DELETE FROM finance_finance_data",
+    "PRAGMA table_info(finance_finance_data)",
+    "ATTACH DATABASE 'other.db' AS other",
+])
+def test_only_a_single_select_is_allowed(store, sql):
+    with pytest.raises(ValueError):
+        store.execute(sql, table_names(store, "finance"))
+
+
+def test_write_hidden_in_a_cte_is_denied(store):
+    [finance] = table_names(store, "finance")
+
+    with pytest.raises(sqlite3.DatabaseError):
+        store.execute(f'WITH x AS (SELECT 1) DELETE FROM "{finance}"', [finance])
+    assert store.execute(f'SELECT COUNT(*) FROM "{finance}"', [finance])[1] == [(3,)]
+
+
+def test_runaway_query_is_interrupted(store):
+    endless = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT MAX(i) FROM n"
+
+    with pytest.raises(sqlite3.DatabaseError):
+        store.execute(endless, [], timeout_seconds=0.05)
+    # The connection is usable again afterwards
+    assert store.execute("SELECT 1", [])[1] == [(1,)]
+
+
+def test_reloading_a_csv_replaces_its_table(store, tmp_path):
+    (tmp_path / "finance_data.csv").write_text("region,revenue\nnorth,1\n", encoding="utf-8")
+
+    store.ingest_csv(str(tmp_path / "finance_data.csv"), "finance")
+
+    [table] = store.tables_for_departments(["finance"])
+    assert table["row_count"] == 1
+    store.remove_csv(str(tmp_path / "finance_data.csv"))
+    assert store.tables_for_departments(["finance"]) == []
+
+
+def test_only_aggregate_questions_about_table_columns_are_tabular(store):
+    tables = store.tables_for_departments(["hr"])
+
+    assert is_tabular_question("What is the average salary by department?", tables)
+    assert is_tabular_question("How many employees have a salary above 6000?", tables)
+    assert not is_tabular_question("What is our leave policy?", tables)
+    assert not is_tabular_question("How many offices do we have?", tables)
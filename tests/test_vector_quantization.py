@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from app.services import vector_quantization
+from app.services.vector_quantization import Float16Quantizer, Int8Quantizer, ProductQuantizer, create_quantizer
+from app.services.vector_store import NumpyIndexBackend
+
+DIMENSIONS = 32
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fitted(quantizer, vectors):
+    quantizer.fit(vectors)
+    return quantizer, quantizer.encode(vectors)
+
+
+def recall(exact: np.ndarray, approximate: np.ndarray, k: int, candidates: int) -> float:
+    """Share of the exact top-k found in the approximate top-candidates, averaged over queries."""
+    hits = [
+        len(set(np.argsort(-row)[:k]) & set(np.argsort(-approx)[:candidates])) / k
+        for row, approx in zip(exact, approximate)
+    ]
+    return float(np.mean(hits))
+
+
+def test_create_quantizer_maps_modes():
+    assert create_quantizer("none") is None
+    assert isinstance(create_quantizer("float16"), Float16Quantizer)
+    assert isinstance(create_quantizer("int8"), Int8Quantizer)
+    assert create_quantizer("pq", pq_subvectors=4).subvectors == 4
+    with pytest.raises(ValueError):
+        create_quantizer("binary")
+
+
+@pytest.mark.parametrize("quantizer, dtype, width, tolerance", [
+    (Float16Quantizer(), np.float16, DIMENSIONS, 1e-2),
+    (Int8Quantizer(), np.uint8, DIMENSIONS, 5e-2),
+])
+def test_scalar_codes_score_close_to_exact_inner_products(quantizer, dtype, width, tolerance):
+    vectors, queries = unit_vectors(300), unit_vectors(5, seed=1)
+    quantizer, codes = fitted(quantizer, vectors)
+
+    assert codes.dtype == dtype and codes.shape == (300, width)
+    assert np.abs(quantizer.scores(queries, codes) - queries @ vectors.T).max() < tolerance
+
+
+def test_product_codes_take_one_byte_per_subvector_and_keep_the_ranking():
+    vectors, queries = unit_vectors(1000), unit_vectors(20, seed=1)
+    quantizer, codes = fitted(ProductQuantizer(subvectors=8), vectors)
+
+    assert codes.dtype == np.uint8 and codes.shape == (1000, 8)
+    assert quantizer.centroids.shape == (8, 256, DIMENSIONS // 8)
+    assert recall(queries @ vectors.T, quantizer.scores(queries, codes), k=5, candidates=50) >= 0.9
+
+
+def test_product_subvectors_divide_the_dimensions():
+    quantizer, codes = fitted(ProductQuantizer(subvectors=12), unit_vectors(300))
+
+    assert codes.shape[1] == 8
+
+
+def test_kmeans_falls_back_to_numpy(monkeypatch):
+    monkeypatch.setattr(vector_quantization, "faiss", None)
+    vectors, queries = unit_vectors(600), unit_vectors(20, seed=1)
+    quantizer, codes = fitted(ProductQuantizer(subvectors=8), vectors)
+
+    assert recall(queries @ vectors.T, quantizer.scores(queries, codes), k=5, candidates=50) >= 0.9
+
+
+def test_scores_are_the_same_across_blocks(monkeypatch):
+    vectors, queries = unit_vectors(100), unit_vectors(3, seed=1)
+    quantizer, codes = fitted(Int8Quantizer(), vectors)
+    whole = quantizer.scores(queries, codes)
+
+    monkeypatch.setattr(vector_quantization, "SCORE_BLOCK_ROWS", 7)
+
+    np.testing.assert_allclose(quantizer.scores(queries, codes), whole, atol=1e-6)
+
+
+@pytest.mark.parametrize("make", [Int8Quantizer, lambda: ProductQuantizer(subvectors=8)])
+def test_state_round_trip_restores_the_scores(make):
+    vectors, queries = unit_vectors(300), unit_vectors(3, seed=1)
+    quantizer, codes = fitted(make(), vectors)
+
+    restored = make()
+    restored.load_state({name: array.copy() for name, array in quantizer.state().items()})
+
+    np.testing.assert_array_equal(restored.encode(vectors), codes)
+    np.testing.assert_allclose(restored.scores(queries, codes), quantizer.scores(queries, codes), atol=1e-6)
+    assert restored.nbytes() == quantizer.nbytes() > 0
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8", "pq"])
+def test_quantized_index_rescoring_returns_exact_neighbours(tmp_path, mode):
+    vectors = unit_vectors(400)
+    index = NumpyIndexBackend("test", str(tmp_path), quantization=mode, pq_subvectors=8)
+    index.upsert([f"c{i}" for i in range(len(vectors))], vectors.tolist(), [{} for _ in vectors], ["" for _ in vectors])
+    index.persist()
+
+    for query in unit_vectors(5, seed=1):
+        exact = [f"c{row}" for row in np.argsort(-(vectors @ query))[:3]]
+        assert [doc.id for doc, _ in index.search(query.tolist(), 3)] == exact
+    assert index.memory_bytes() < vectors.nbytes